@@ -66,7 +66,7 @@ class MechContract:
         delivers = self.get_deliver_events(from_block)
         requests = self.get_request_events(from_block)
         undeleted_requests = []
-        deliver_req_ids = [deliver["args"]["requestId"] for deliver in delivers]
+        deliver_req_ids = {deliver["args"]["requestId"] for deliver in delivers}
 
         for request in requests:
             if request["args"]["requestId"] not in deliver_req_ids:
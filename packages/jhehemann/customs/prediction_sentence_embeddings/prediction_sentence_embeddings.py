@@ -260,6 +260,7 @@ def count_tokens(text: str, model: str) -> int:
 NUM_URLS_EXTRACT = 5
 MAX_TOTAL_TOKENS_CHAT_COMPLETION = 4000  # Set the limit for cost efficiency
 WORDS_PER_TOKEN_FACTOR = 0.75
+SPACY_MODEL = "en_core_web_md"
 EMBEDDING_MODEL = "text-embedding-3-large"
 MAX_EMBEDDING_TOKEN_INPUT = 8192
 EMBEDDING_SIZE = 1536
@@ -1398,8 +1399,12 @@ def run(**kwargs) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
         print(f"LLM TEMPERATURE: {temperature}")
 
         # Load the spacy model
-        download_spacy_model("en_core_web_md")
-        nlp = spacy.load("en_core_web_md")
+        model_registry = kwargs.get("model_registry")
+        if model_registry is not None:
+            nlp = model_registry.get_spacy(SPACY_MODEL)
+        else:
+            download_spacy_model(SPACY_MODEL)
+            nlp = spacy.load(SPACY_MODEL)
 
         # Get the LLM engine to be used
         engine = TOOL_TO_ENGINE[tool]
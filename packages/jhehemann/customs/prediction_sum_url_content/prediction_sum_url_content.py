@@ -127,6 +127,8 @@ def count_tokens(text: str, model: str) -> int:
 NUM_URLS_EXTRACT = 5
 MAX_TOTAL_TOKENS_CHAT_COMPLETION = 4096  # Set the limit for cost efficiency
 WORDS_PER_TOKEN_FACTOR = 0.75
+SPACY_MODEL = "en_core_web_sm"
+SENTENCE_TRANSFORMER_MODEL = "sentence-transformers/multi-qa-distilbert-cos-v1"
 DEFAULT_OPENAI_SETTINGS = {
     "max_compl_tokens": 200,
     "temperature": 0,
@@ -938,6 +940,7 @@ def extract_texts(
     event_question: str,
     max_words_per_url: int,
     nlp,
+    model_registry: Optional[Any] = None,
 ) -> List[str]:
     """
     Extract texts from a list of URLs using BERT and Spacy.
@@ -946,6 +949,8 @@ def extract_texts(
         urls (List[str]): List of URLs to extract text from.
         event_question (str): Event-related question for text extraction.
         max_words_per_url (int): Maximum number of words allowed to extract for each URL.
+        nlp: The spaCy NLP model.
+        model_registry: The registry of the models loaded by the worker, if any.
 
     Raises:
         ValueError: If the event date could not be extracted from the event question.
@@ -970,7 +975,10 @@ def extract_texts(
     event_date = extract_event_date(doc_question)
 
     # Initialize Sentence Transformer model
-    model = SentenceTransformer("sentence-transformers/multi-qa-distilbert-cos-v1")
+    if model_registry is not None:
+        model = model_registry.get_sentence_transformer(SENTENCE_TRANSFORMER_MODEL)
+    else:
+        model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
 
     # Create sentence embeddings for event question with Sentence Transformer
     query_emb = model.encode(event_question)
@@ -1036,6 +1044,7 @@ def fetch_additional_information(
     engine: str = "gpt-4o-2024-08-06",
     temperature: float = 1.0,
     max_compl_tokens: int = 500,
+    model_registry: Optional[Any] = None,
 ) -> str:
     """
     Get urls from a web search and extract relevant information based on an event question.
@@ -1049,6 +1058,7 @@ def fetch_additional_information(
         engine (str): The openai engine. Defaults to "gpt-3.5-turbo".
         temperature (float): The temperature parameter for the engine. Defaults to 1.0.
         max_compl_tokens (int): The maximum number of tokens for the engine's response.
+        model_registry: The registry of the models loaded by the worker, if any.
 
     Returns:
         str: The relevant information fetched from all the URLs concatenated.
@@ -1103,6 +1113,7 @@ def fetch_additional_information(
         event_question=event_question,
         max_words_per_url=max_words_per_url,
         nlp=nlp,
+        model_registry=model_registry,
     )
 
     # Join the texts and return
@@ -1145,7 +1156,11 @@ def run(**kwargs) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
         print(f"LLM TEMPERATURE: {temperature}")
 
         # Load the spacy model
-        nlp = spacy.load("en_core_web_sm")
+        model_registry = kwargs.get("model_registry")
+        if model_registry is not None:
+            nlp = model_registry.get_spacy(SPACY_MODEL)
+        else:
+            nlp = spacy.load(SPACY_MODEL)
 
         # Get the LLM engine to be used
         engine = kwargs.get("model", TOOL_TO_ENGINE[tool])
@@ -1180,6 +1195,7 @@ def run(**kwargs) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
                 max_add_words=max_add_words,
                 google_api_key=kwargs["api_keys"]["google_api_key"],
                 google_engine=kwargs["api_keys"]["google_engine_id"],
+                model_registry=model_registry,
             )
             if tool == "prediction-online-sum-url-content"
             else ""
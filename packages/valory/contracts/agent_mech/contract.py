@@ -18,18 +18,35 @@
 # ------------------------------------------------------------------------------
 
 """This module contains the dynamic_contribution contract definition."""
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Dict, List, Optional, cast
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
 
 from aea.common import JSONLike
 from aea.configurations.base import PublicId
 from aea.contracts.base import Contract
 from aea.crypto.base import LedgerApi
 from aea_ledger_ethereum import EthereumApi
+from eth_utils import event_abi_to_log_topic
 from web3 import Web3
 from web3.types import BlockIdentifier, TxReceipt
 
+from packages.valory.contracts.agent_mech.contract_cache import get_contract
+from packages.valory.contracts.agent_mech.rpc_pool import (
+    DEFAULT_RATE_LIMIT,
+    RpcPool,
+    get_rpc_pool,
+)
+from packages.valory.contracts.agent_mech.scan import (
+    BlockWindow,
+    DEFAULT_SCAN_WORKERS,
+    add_payments,
+    scan_block_windows,
+)
+
 
 PUBLIC_ID = PublicId.from_str("valory/agent_mech:0.1.0")
 
@@ -144,6 +161,113 @@ partial_abis = [
     ],
 ]
 
+# maps the topic of each variant of the Request and Deliver events to its abi,
+# so that the logs of all the variants can be fetched at once and decoded locally
+EVENT_TOPIC_TO_ABI: Dict[bytes, Dict[str, Any]] = {
+    event_abi_to_log_topic(event_abi): event_abi
+    for abi in partial_abis
+    for event_abi in abi
+}
+
+
+class EventDecoder:
+    """Decodes the logs of an event, with the types of its inputs parsed once."""
+
+    def __init__(self, event_abi: Dict[str, Any]) -> None:
+        """Parse the inputs of the event; the indexed ones are expected to be of static types."""
+        self.name = event_abi["name"]
+        inputs = event_abi["inputs"]
+        self._indexed = [(i["name"], i["type"]) for i in inputs if i["indexed"]]
+        self._data_names = [i["name"] for i in inputs if not i["indexed"]]
+        self._data_types = [i["type"] for i in inputs if not i["indexed"]]
+        self._addresses = [i["name"] for i in inputs if i["type"] == "address"]
+
+    def decode(self, codec: Any, log: Dict[str, Any]) -> Dict[str, Any]:
+        """Decode the arguments of a log of the event."""
+        topics = log["topics"][1:]
+        if len(topics) != len(self._indexed):
+            raise ValueError(
+                f"Expected {len(self._indexed)} indexed arguments, got {len(topics)}."
+            )
+        data = codec.decode(self._data_types, bytes(log["data"]))
+        args = dict(zip(self._data_names, data))
+        for (name, type_), topic in zip(self._indexed, topics):
+            (args[name],) = codec.decode([type_], bytes(topic))
+        for name in self._addresses:
+            args[name] = Web3.to_checksum_address(args[name])
+        return args
+
+
+EVENT_TOPIC_TO_DECODER: Dict[bytes, EventDecoder] = {
+    topic: EventDecoder(event_abi) for topic, event_abi in EVENT_TOPIC_TO_ABI.items()
+}
+
+
+DELIVER_WITH_NONCE_ABI = [
+    {
+        "inputs": [
+            {"internalType": "uint256", "name": "requestId", "type": "uint256"},
+            {
+                "internalType": "uint256",
+                "name": "requestIdWithNonce",
+                "type": "uint256",
+            },
+            {"internalType": "bytes", "name": "data", "type": "bytes"},
+        ],
+        "name": "deliver",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    }
+]
+DELIVER_MARKETPLACE_ABI = [
+    {
+        "inputs": [
+            {"internalType": "uint256", "name": "requestId", "type": "uint256"},
+            {"internalType": "bytes", "name": "requestData", "type": "bytes"},
+            {
+                "internalType": "address",
+                "name": "deliveryMechStakingInstance",
+                "type": "address",
+            },
+            {
+                "internalType": "uint256",
+                "name": "deliveryMechServiceId",
+                "type": "uint256",
+            },
+        ],
+        "name": "deliverMarketplace",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    }
+]
+
+# the runtime code of Multicall3, which is placed at the address of the sender of the delivers
+# for the duration of the simulation, so that all of them are simulated in a single call,
+# while keeping the sender of each of them unchanged
+MULTICALL3 = json.loads(
+    (Path(__file__).parent / "build" / "Multicall3.json").read_text(encoding="utf-8")
+)
+
+
+# the window of the log scans, shared by the scans of all the calls
+_block_window = BlockWindow()
+
+
+def get_undelivered(
+    requests: List[Dict[str, Any]], delivers: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Get the requests that have not been delivered, matching them by contract address and id in O(1)."""
+    delivered = {
+        (deliver["contract_address"], deliver["requestId"]) for deliver in delivers
+    }
+    return [
+        request
+        for request in requests
+        if (request["contract_address"], request["requestId"]) not in delivered
+    ]
+
 
 class MechOperation(Enum):
     """Operation types."""
@@ -157,6 +281,18 @@ class AgentMechContract(Contract):
 
     contract_id = PublicId.from_str("valory/agent_mech:0.1.0")
 
+    @classmethod
+    def get_instance(
+        cls, ledger_api: LedgerApi, contract_address: Optional[str] = None
+    ) -> Any:
+        """Get the instance of the contract, reusing the one built by a previous call."""
+        if contract_address is None:
+            return super().get_instance(ledger_api, contract_address)
+        contract_interface = cls.contract_interface[ledger_api.identifier]
+        return get_contract(
+            cast(EthereumApi, ledger_api), contract_address, contract_interface["abi"]
+        )
+
     @classmethod
     def get_raw_transaction(
         cls, ledger_api: LedgerApi, contract_address: str, **kwargs: Any
@@ -234,26 +370,9 @@ class AgentMechContract(Contract):
         if not isinstance(ledger_api, EthereumApi):
             raise ValueError(f"Only EthereumApi is supported, got {type(ledger_api)}")
 
-        deliver_with_nonce = [
-            {
-                "inputs": [
-                    {"internalType": "uint256", "name": "requestId", "type": "uint256"},
-                    {
-                        "internalType": "uint256",
-                        "name": "requestIdWithNonce",
-                        "type": "uint256",
-                    },
-                    {"internalType": "bytes", "name": "data", "type": "bytes"},
-                ],
-                "name": "deliver",
-                "outputs": [],
-                "stateMutability": "nonpayable",
-                "type": "function",
-            }
-        ]
         if request_id_nonce is not None:
-            contract_instance = ledger_api.api.eth.contract(
-                contract_address, abi=deliver_with_nonce
+            contract_instance = get_contract(
+                ledger_api, contract_address, DELIVER_WITH_NONCE_ABI
             )
             data = contract_instance.encodeABI(
                 fn_name="deliver",
@@ -270,6 +389,90 @@ class AgentMechContract(Contract):
         ).pop("data")
         return {"data": bytes.fromhex(data[2:]), "simulation_ok": simulation_ok}  # type: ignore
 
+    @classmethod
+    def get_batch_deliver_data(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        tasks: List[Dict[str, Any]],
+        mech_marketplace_address: str,
+        delivery_mech_staking_instance: str,
+        delivery_mech_service_id: int,
+        **kwargs: Any,
+    ) -> JSONLike:
+        """
+        Get the deliver txs of a batch of tasks, and simulate all of them in a single call.
+
+        :param ledger_api: LedgerApi object
+        :param contract_address: the address of the sender of the delivers, i.e., the safe
+        :param tasks: the done tasks to deliver
+        :param mech_marketplace_address: the address of the mech marketplace
+        :param delivery_mech_staking_instance: the staking instance
+        :param delivery_mech_service_id: the service id
+        :param kwargs: the keyword arguments
+        :return: the deliver txs, in the order of the tasks
+        """
+        ledger_api = cast(EthereumApi, ledger_api)
+
+        if not isinstance(ledger_api, EthereumApi):
+            raise ValueError(f"Only EthereumApi is supported, got {type(ledger_api)}")
+
+        txs = []
+        for task in tasks:
+            mech_address = task["mech_address"]
+            request_id = task["request_id"]
+            data = bytes.fromhex(task["task_result"])
+            if task.get("is_marketplace_mech", False):
+                marketplace_instance = get_contract(
+                    ledger_api, mech_marketplace_address, DELIVER_MARKETPLACE_ABI
+                )
+                marketplace_data = marketplace_instance.encodeABI(
+                    fn_name="deliverMarketplace",
+                    args=[
+                        request_id,
+                        data,
+                        delivery_mech_staking_instance,
+                        delivery_mech_service_id,
+                    ],
+                )
+                mech_instance = cls.get_instance(ledger_api, mech_address)
+                tx_data = mech_instance.encodeABI(
+                    fn_name="exec",
+                    args=[
+                        mech_marketplace_address,
+                        0,
+                        bytes.fromhex(marketplace_data[2:]),
+                        MechOperation.CALL.value,
+                        0,
+                    ],
+                )
+            elif task.get("request_id_nonce") is not None:
+                mech_instance = get_contract(
+                    ledger_api, mech_address, DELIVER_WITH_NONCE_ABI
+                )
+                tx_data = mech_instance.encodeABI(
+                    fn_name="deliver",
+                    args=[request_id, task["request_id_nonce"], data],
+                )
+            else:
+                mech_instance = cls.get_instance(ledger_api, mech_address)
+                tx_data = mech_instance.encodeABI(
+                    fn_name="deliver", args=[request_id, data]
+                )
+            txs.append((mech_address, tx_data))
+
+        simulations = cls.simulate_txs(ledger_api, contract_address, txs)
+        deliver_txs = [
+            {
+                "to": to,
+                "value": 0,
+                "data": bytes.fromhex(tx_data[2:]),
+                "simulation_ok": simulation_ok,
+            }
+            for (to, tx_data), simulation_ok in zip(txs, simulations)
+        ]
+        return {"data": deliver_txs}
+
     @classmethod
     def get_request_events(
         cls,
@@ -282,7 +485,7 @@ class AgentMechContract(Contract):
         ledger_api = cast(EthereumApi, ledger_api)
         all_entries = []
         for abi in partial_abis:
-            contract_instance = ledger_api.api.eth.contract(contract_address, abi=abi)
+            contract_instance = get_contract(ledger_api, contract_address, abi)
             entries = contract_instance.events.Request.create_filter(
                 fromBlock=from_block,
                 toBlock=to_block,
@@ -312,7 +515,7 @@ class AgentMechContract(Contract):
         ledger_api = cast(EthereumApi, ledger_api)
         all_entries = []
         for abi in partial_abis:
-            contract_instance = ledger_api.api.eth.contract(contract_address, abi=abi)
+            contract_instance = get_contract(ledger_api, contract_address, abi)
             entries = contract_instance.events.Deliver.create_filter(
                 fromBlock=from_block,
                 toBlock=to_block,
@@ -344,41 +547,187 @@ class AgentMechContract(Contract):
         return dict(event["args"])
 
     @classmethod
-    def get_undelivered_reqs(
+    def get_request_and_deliver_events(
         cls,
         ledger_api: LedgerApi,
-        contract_address: str,
+        contract_addresses: List[str],
         from_block: BlockIdentifier = "earliest",
         to_block: BlockIdentifier = "latest",
+        rpc_pool: Optional[RpcPool] = None,
+    ) -> JSONLike:
+        """
+        Get the Request and Deliver events emitted by the contracts, with a single `eth_getLogs` call.
+
+        :param ledger_api: LedgerApi object
+        :param contract_addresses: the addresses of the contracts whose events to get
+        :param from_block: the first block to scan
+        :param to_block: the last block to scan
+        :param rpc_pool: the pool of endpoints to make the call through; if None, the ledger api is used
+        :return: the requests and the delivers
+        """
+        ledger_api = cast(EthereumApi, ledger_api)
+        # the addresses of the logs are checksummed, map them back to the given ones
+        addresses = {address.lower(): address for address in contract_addresses}
+        params = {
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "address": [Web3.to_checksum_address(a) for a in contract_addresses],
+            "topics": [["0x" + topic.hex() for topic in EVENT_TOPIC_TO_ABI]],
+        }
+        if rpc_pool is None:
+            logs = ledger_api.api.eth.get_logs(params)
+        else:
+            logs = rpc_pool.call(lambda w3: w3.eth.get_logs(params))
+        requests, delivers = [], []
+        codec = ledger_api.api.codec
+        for log in logs:
+            decoder = EVENT_TOPIC_TO_DECODER.get(bytes(log["topics"][0]), None)
+            if decoder is None:
+                continue
+            try:
+                args = decoder.decode(codec, log)
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.warning(f"Could not decode log {log}: {e}")
+                continue
+            event = {
+                "tx_hash": log["transactionHash"].hex(),
+                "block_number": log["blockNumber"],
+                **args,
+                "contract_address": addresses.get(
+                    log["address"].lower(), log["address"]
+                ),
+            }
+            if decoder.name == "Request":
+                requests.append(event)
+            else:
+                delivers.append(event)
+        return {"requests": requests, "delivers": delivers}
+
+    @classmethod
+    def get_events_from_block(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        contract_addresses: List[str],
+        from_block: BlockIdentifier = "earliest",
         max_block_window: int = 1000,
+        to_block: BlockIdentifier = "latest",
         **kwargs: Any,
     ) -> JSONLike:
-        """Get the requests that are not delivered."""
+        """
+        Get the Request and Deliver events emitted by the contracts in a range of blocks.
+
+        Along with the events, the hashes of the parent of the first block and of the last block
+        deeper than the confirmation depth are returned, so that the caller can detect reorgs.
+        The reads are spread among the endpoints which have reached the last block to scan,
+        and the ones which served them have to agree on these hashes.
+
+        :param ledger_api: LedgerApi object
+        :param contract_address: the address of the contract
+        :param contract_addresses: the addresses of the contracts whose events to get
+        :param from_block: the first block to scan
+        :param max_block_window: the maximum number of blocks scanned per call
+        :param to_block: the last block to scan, capped to the latest one
+        :param kwargs: the keyword arguments, e.g., the `rpc_urls` of the endpoints to use
+            along with the one of the ledger api, and their `rpc_rate_limit`
+        :return: the requests, with the payment of the undelivered ones, the delivers,
+            the scanned blocks, and the block hashes
+        """
         if from_block == "earliest":
             from_block = 0
+        from_block = int(from_block)
+        ledger_api = cast(EthereumApi, ledger_api)
+        pool = get_rpc_pool(
+            ledger_api.api,
+            kwargs.get("rpc_urls", []),
+            kwargs.get("rpc_rate_limit", DEFAULT_RATE_LIMIT),
+        )
+        # the reads are spread among the endpoints which have reached the last block to scan,
+        # so that none of them is answered by an endpoint lagging behind it
+        current_block, rpc_pool = pool.synced(
+            None if to_block == "latest" else int(to_block)
+        )
+        last_block = current_block
+        if to_block != "latest":
+            last_block = min(int(to_block), current_block)
+
+        def fetch(start: int, end: int) -> List[Tuple[bool, Dict[str, Any]]]:
+            """Fetch the events of a window, tagging the requests."""
+            events = cls.get_request_and_deliver_events(
+                ledger_api, contract_addresses, start, end, rpc_pool
+            )
+            return [(True, request) for request in events["requests"]] + [
+                (False, deliver) for deliver in events["delivers"]
+            ]
+
+        def get_block_hash(block: int) -> Optional[str]:
+            """Get the hash of a block, checking that the endpoints which served the scan agree on it."""
+            if block < 0:
+                return None
+
+            def get_hash(w3: Web3) -> str:
+                """Get the hash of the block from an endpoint."""
+                return w3.eth.get_block(block)["hash"].hex()
+
+            served = rpc_pool.served
+            block_hash, endpoint = rpc_pool.call_with_endpoint(get_hash)
+            for other in served - {endpoint}:
+                other_hash = rpc_pool.subset([other]).call(get_hash)
+                if other_hash != block_hash:
+                    raise ValueError(
+                        f"The endpoints {endpoint.uri} and {other.uri} disagree on the hash "
+                        f"of block {block}: {block_hash} != {other_hash}."
+                    )
+            return block_hash
+
+        max_workers = kwargs.get("max_workers", DEFAULT_SCAN_WORKERS)
+        events = scan_block_windows(
+            fetch, from_block, last_block, _block_window, max_block_window, max_workers
+        )
+        requests = [event for is_request, event in events if is_request]
+        delivers = [event for is_request, event in events if not is_request]
+        # the payments are needed only to schedule the requests which are still undelivered
+        add_payments(
+            lambda tx_hash: rpc_pool.call(
+                lambda w3: w3.eth.get_transaction(tx_hash)["value"]
+            ),
+            get_undelivered(requests, delivers),
+            max_workers,
+        )
+        final_block = max(
+            min(last_block, current_block - kwargs.get("confirmation_depth", 0)),
+            from_block - 1,
+        )
+        return {
+            "requests": requests,
+            "delivers": delivers,
+            "from_block": from_block,
+            "to_block": last_block,
+            "parent_hash": get_block_hash(from_block - 1),
+            "final_block": final_block,
+            "final_hash": get_block_hash(final_block),
+        }
 
-        current_block = ledger_api.api.eth.block_number
-        requests, delivers = [], []
-        for from_block_batch in range(int(from_block), current_block, max_block_window):
-            to_block_batch = (from_block_batch + max_block_window) - 1
-            if to_block_batch >= current_block:
-                to_block_batch = "latest"
-            requests_batch: List[Dict[str, Any]] = cls.get_request_events(
-                ledger_api, contract_address, from_block_batch, to_block_batch
-            )["data"]
-            delivers_batch: List[Dict[str, Any]] = cls.get_deliver_events(
-                ledger_api, contract_address, from_block_batch, to_block_batch
-            )["data"]
-            requests.extend(requests_batch)
-            delivers.extend(delivers_batch)
-        pending_tasks: List[Dict[str, Any]] = []
-        for request in requests:
-            if request["requestId"] not in [
-                deliver["requestId"] for deliver in delivers
-            ]:
-                # store each requests in the pending_tasks list, make sure each req is stored once
-                pending_tasks.append(request)
-        return {"data": pending_tasks}
+    @classmethod
+    def get_undelivered_reqs(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        from_block: BlockIdentifier = "earliest",
+        to_block: BlockIdentifier = "latest",
+        max_block_window: int = 1000,
+        **kwargs: Any,
+    ) -> JSONLike:
+        """Get the requests that are not delivered."""
+        return cls.get_multiple_undelivered_reqs(
+            ledger_api,
+            contract_address,
+            [contract_address],
+            from_block,
+            max_block_window,
+            to_block,
+            **kwargs,
+        )
 
     @classmethod
     def get_multiple_undelivered_reqs(
@@ -388,16 +737,21 @@ class AgentMechContract(Contract):
         contract_addresses: List[str],
         from_block: BlockIdentifier = "earliest",
         max_block_window: int = 1000,
+        to_block: BlockIdentifier = "latest",
         **kwargs: Any,
     ) -> JSONLike:
         """Get the requests that are not delivered."""
-        pending_tasks: List[Dict[str, Any]] = []
-        for contract_address in contract_addresses:
-            pending_tasks_batch = cls.get_undelivered_reqs(
-                ledger_api, contract_address, from_block, max_block_window
-            ).get("data")
-            pending_tasks.extend(pending_tasks_batch)
-        return {"data": pending_tasks}
+        events = cls.get_events_from_block(
+            ledger_api,
+            contract_address,
+            contract_addresses,
+            from_block,
+            max_block_window,
+            to_block,
+            **kwargs,
+        )
+        requests, delivers = events["requests"], events["delivers"]
+        return {"data": get_undelivered(requests, delivers)}
 
     @classmethod
     def get_exec_tx_data(
@@ -473,8 +827,99 @@ class AgentMechContract(Contract):
                 }
             )
             simulation_ok = True
-        except Exception as e:
+        except Exception as e:  # pylint: disable=broad-except
             _logger.info(f"Simulation failed: {str(e)}")
             simulation_ok = False
 
         return dict(data=simulation_ok)
+
+    @classmethod
+    def simulate_txs(
+        cls,
+        ledger_api: EthereumApi,
+        sender_address: str,
+        txs: List[Tuple[str, str]],
+    ) -> List[bool]:
+        """
+        Simulate a batch of transactions of the same sender in a single call.
+
+        The code of Multicall3 is placed at the address of the sender for the duration of the call,
+        so that the sender of each of the transactions stays the same.
+        If the RPC does not support overriding the state, each transaction is simulated separately.
+
+        :param ledger_api: LedgerApi object
+        :param sender_address: the address of the sender of the transactions
+        :param txs: the address that each transaction is sent to, and its data
+        :return: whether the simulation of each transaction succeeded
+        """
+        if len(txs) == 0:
+            return []
+
+        sender_address = ledger_api.api.to_checksum_address(sender_address)
+        multicall = get_contract(ledger_api, None, MULTICALL3["abi"])
+        calls = [
+            (ledger_api.api.to_checksum_address(to), True, bytes.fromhex(data[2:]))
+            for to, data in txs
+        ]
+        try:
+            result = ledger_api.api.eth.call(
+                {
+                    "from": sender_address,
+                    "to": sender_address,
+                    "data": multicall.encodeABI(fn_name="aggregate3", args=[calls]),
+                },
+                "latest",
+                {sender_address: {"code": MULTICALL3["deployedBytecode"]}},
+            )
+            (results,) = ledger_api.api.codec.decode(["(bool,bytes)[]"], result)
+        except Exception as e:  # pylint: disable=broad-except
+            _logger.info(
+                f"Batched simulation failed: {str(e)}. Simulating each tx separately."
+            )
+            return [
+                cast(
+                    bool, cls.simulate_tx(ledger_api, to, sender_address, data)["data"]
+                )
+                for to, data in txs
+            ]
+
+        for (to, _), (success, _) in zip(txs, results):
+            if not success:
+                _logger.info(f"Simulation of the tx to {to} failed.")
+        return [success for success, _ in results]
+
+    @classmethod
+    def estimate_txs_gas(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        txs: List[Dict[str, Any]],
+    ) -> JSONLike:
+        """
+        Estimate the gas of a batch of transactions of the same sender, concurrently.
+
+        :param ledger_api: LedgerApi object
+        :param contract_address: the address of the sender of the transactions, i.e., the safe
+        :param txs: the transactions, with their `to`, `value` and `data`
+        :return: the gas of each transaction, or None if it could not be estimated
+        """
+        ledger_api = cast(EthereumApi, ledger_api)
+        sender_address = ledger_api.api.to_checksum_address(contract_address)
+
+        def estimate(tx: Dict[str, Any]) -> Optional[int]:
+            """Estimate the gas of a transaction."""
+            try:
+                return ledger_api.api.eth.estimate_gas(
+                    {
+                        "from": sender_address,
+                        "to": ledger_api.api.to_checksum_address(tx["to"]),
+                        "value": tx.get("value", 0),
+                        "data": tx.get("data", b""),
+                    }
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.info(f"Could not estimate the gas of the tx to {tx['to']}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=DEFAULT_SCAN_WORKERS) as executor:
+            return {"data": list(executor.map(estimate, txs))}
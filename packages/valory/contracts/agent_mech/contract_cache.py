@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a cache of the contract objects, shared by the calls of the contracts."""
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from aea_ledger_ethereum import EthereumApi
+from web3 import Web3
+
+
+# the contract objects built so far, for each web3 instance, keyed by their address and the hash of their abi
+_contracts: "WeakKeyDictionary[Web3, Dict[Tuple[Optional[str], str], Any]]" = (
+    WeakKeyDictionary()
+)
+# the hashes of the abis, keyed by their ids; the abis are kept, so that their ids are not reused
+_abi_hashes: Dict[int, Tuple[Any, str]] = {}
+_contracts_lock = threading.Lock()
+
+
+def _get_abi_hash(abi: Any) -> str:
+    """Get the hash of an abi which lives for the whole process, e.g., a module constant."""
+    entry = _abi_hashes.get(id(abi), None)
+    if entry is None:
+        abi_hash = hashlib.sha256(json.dumps(abi, sort_keys=True).encode()).hexdigest()
+        entry = _abi_hashes[id(abi)] = (abi, abi_hash)
+    return entry[1]
+
+
+def get_contract(ledger_api: EthereumApi, address: Optional[str], abi: Any) -> Any:
+    """Get a contract object, reusing the one built by a previous call with the same address and abi."""
+    w3 = ledger_api.api
+    with _contracts_lock:
+        contracts = _contracts.setdefault(w3, {})
+        key = (address, _get_abi_hash(abi))
+        contract = contracts.get(key, None)
+        if contract is None:
+            if address is None:
+                contract = w3.eth.contract(abi=abi)
+            else:
+                contract = w3.eth.contract(w3.to_checksum_address(address), abi=abi)
+            contracts[key] = contract
+    return contract
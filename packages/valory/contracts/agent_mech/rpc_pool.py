@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a pool of RPC endpoints for the read calls of the contracts."""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from web3 import Web3
+
+
+_logger = logging.getLogger("aea.packages.valory.contracts.agent_mech.rpc_pool")
+
+T = TypeVar("T")
+
+# the number of the latest calls of an endpoint its health is based on
+LATENCY_WINDOW = 100
+# a call is duplicated on the next endpoint once it is slower than this percentile of the latencies
+HEDGE_PERCENTILE = 0.95
+# the bounds of the delay after which a call is duplicated
+MIN_HEDGE_DELAY = 0.2
+MAX_HEDGE_DELAY = 5.0
+# the delay after which a call is duplicated, while the latencies of an endpoint are unknown
+DEFAULT_HEDGE_DELAY = 1.0
+# the weight of the latest call in the failure rate of an endpoint
+FAILURE_RATE_WEIGHT = 0.2
+# how much slower an endpoint is considered to be, for each failed call out of the latest ones
+FAILURE_PENALTY = 10.0
+DEFAULT_RATE_LIMIT = 10.0
+REQUEST_TIMEOUT = 30.0
+MAX_WORKERS = 16
+# the number of endpoints which have to reach a block for it to be scanned, so that the reads can fail over
+SYNC_QUORUM = 2
+
+
+def _get_block_number(w3: Web3) -> int:
+    """Get the latest block of an endpoint."""
+    return w3.eth.block_number
+
+
+class RpcEndpoint:
+    """An RPC endpoint, along with its health and its rate limit."""
+
+    def __init__(self, w3: Web3, rate_limit: float = DEFAULT_RATE_LIMIT) -> None:
+        """
+        Initialize the endpoint.
+
+        :param w3: the web3 instance connected to the endpoint
+        :param rate_limit: the maximum number of calls per second, with bursts of as many calls
+        """
+        self.w3 = w3
+        self._rate_limit = rate_limit
+        self._tokens = max(rate_limit, 1.0)
+        self._last_refill = time.monotonic()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._failure_rate = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def uri(self) -> str:
+        """Get the uri of the endpoint."""
+        return str(getattr(self.w3.provider, "endpoint_uri", self.w3.provider))
+
+    def acquire(self) -> None:
+        """Wait until the rate limit of the endpoint allows another call."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    max(self._rate_limit, 1.0),
+                    self._tokens + (now - self._last_refill) * self._rate_limit,
+                )
+                self._last_refill = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_time = (1.0 - self._tokens) / self._rate_limit
+            time.sleep(wait_time)
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Record the outcome of a call."""
+        with self._lock:
+            if ok:
+                self._latencies.append(latency)
+            self._failure_rate += FAILURE_RATE_WEIGHT * (
+                float(not ok) - self._failure_rate
+            )
+
+    def record_latency(self, latency: float) -> None:
+        """Record a lower bound of the latency of a call still in flight."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Get a percentile of the latencies of the latest successful calls, if any."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) == 0:
+            return None
+        return latencies[min(int(percentile * len(latencies)), len(latencies) - 1)]
+
+    @property
+    def score(self) -> float:
+        """Get the score of the endpoint; the lower, the healthier."""
+        median = self.latency_percentile(0.5)
+        # the endpoints without successful calls yet are tried first, so that their health gets known
+        latency = 0.0 if median is None else median
+        return (
+            latency * (1.0 + FAILURE_PENALTY * self._failure_rate) + self._failure_rate
+        )
+
+
+class RpcPool:
+    """
+    A pool of RPC endpoints, used for the read calls of the contracts.
+
+    Each call is sent to the healthiest endpoint. If it takes longer than a high percentile
+    of the latencies of that endpoint, it is duplicated on the next healthiest one, and the first
+    successful response is used. A failed call is retried on the other endpoints.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[RpcEndpoint],
+        hedge_percentile: float = HEDGE_PERCENTILE,
+        max_workers: int = MAX_WORKERS,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ) -> None:
+        """Initialize the pool."""
+        self.endpoints = list(endpoints)
+        self._hedge_percentile = hedge_percentile
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="rpc_pool"
+            )
+        self._executor = executor
+        # the endpoints which have answered the calls of the pool
+        self._served: Set[RpcEndpoint] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def served(self) -> Set[RpcEndpoint]:
+        """Get the endpoints which have answered the calls of the pool so far."""
+        with self._lock:
+            return set(self._served)
+
+    def subset(self, endpoints: Sequence[RpcEndpoint]) -> "RpcPool":
+        """
+        Get a pool of some of the endpoints of this pool, sharing its threads.
+
+        :param endpoints: the endpoints
+        :return: the pool of the endpoints
+        """
+        return RpcPool(endpoints, self._hedge_percentile, executor=self._executor)
+
+    def get_heads(self) -> Dict[RpcEndpoint, int]:
+        """
+        Get the latest block of each endpoint.
+
+        The endpoints are asked concurrently; the ones which fail, or which have not answered
+        by the hedge delay of the first one to answer, are left out.
+
+        :return: the latest block of each endpoint which answered
+        """
+        futures: Dict[Future, RpcEndpoint] = {}
+        for endpoint in self.endpoints:
+            future = self._executor.submit(
+                self._call_endpoint, endpoint, _get_block_number
+            )
+            futures[future] = endpoint
+        heads: Dict[RpcEndpoint, int] = {}
+        errors: List[BaseException] = []
+        pending: Set[Future] = set(futures)
+        deadline: Optional[float] = None
+        while pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0.0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if len(done) == 0:
+                break
+            for future in done:
+                endpoint = futures[future]
+                error = future.exception()
+                if error is not None:
+                    _logger.debug(f"Could not get the block of {endpoint.uri}: {error}")
+                    errors.append(error)
+                    continue
+                heads[endpoint] = future.result()
+                if deadline is None:
+                    deadline = time.monotonic() + self._hedge_delay(endpoint)
+        if len(heads) == 0:
+            _logger.info(f"Could not get the block of any endpoint: {errors[0]}")
+            raise errors[0]
+        return heads
+
+    def synced(
+        self, to_block: Optional[int] = None, quorum: int = SYNC_QUORUM
+    ) -> Tuple[int, "RpcPool"]:
+        """
+        Get the latest block, and a pool of the endpoints which have reached the block to scan up to.
+
+        The reads of a scan have to see the chain up to its last block, while the endpoints may lag
+        behind each other. So, they are spread among the endpoints which have reached that block,
+        where they can be hedged and retried. The latest block is the one reached by `quorum`
+        of the endpoints, or by all of them if fewer answer, so that the reads can fail over.
+
+        :param to_block: the block to scan up to, if earlier than the latest one
+        :param quorum: the number of endpoints which have to reach the latest block
+        :return: the latest block, and the pool of the endpoints which have reached the block to scan up to
+        """
+        heads = self.get_heads()
+        latest = sorted(heads.values(), reverse=True)[min(quorum, len(heads)) - 1]
+        last_block = latest if to_block is None else min(to_block, latest)
+        endpoints = [
+            endpoint
+            for endpoint in self.endpoints
+            if heads.get(endpoint, -1) >= last_block
+        ]
+        return latest, self.subset(endpoints)
+
+    def _hedge_delay(self, endpoint: RpcEndpoint) -> float:
+        """Get the delay after which a call to an endpoint is duplicated."""
+        latency = endpoint.latency_percentile(self._hedge_percentile)
+        if latency is None:
+            return DEFAULT_HEDGE_DELAY
+        return min(max(latency, MIN_HEDGE_DELAY), MAX_HEDGE_DELAY)
+
+    @staticmethod
+    def _call_endpoint(endpoint: RpcEndpoint, fn: Callable[[Web3], T]) -> T:
+        """Make a call to an endpoint, recording its outcome."""
+        endpoint.acquire()
+        start = time.monotonic()
+        try:
+            result = fn(endpoint.w3)
+        except Exception:
+            endpoint.record(time.monotonic() - start, ok=False)
+            raise
+        endpoint.record(time.monotonic() - start, ok=True)
+        return result
+
+    def call(self, fn: Callable[[Web3], T]) -> T:
+        """
+        Make a read call, hedging it across the endpoints.
+
+        :param fn: the call, given the web3 instance of the endpoint to use
+        :return: the result of the first successful call
+        """
+        result, _endpoint = self.call_with_endpoint(fn)
+        return result
+
+    def call_with_endpoint(self, fn: Callable[[Web3], T]) -> Tuple[T, RpcEndpoint]:
+        """
+        Make a read call, hedging it across the endpoints.
+
+        :param fn: the call, given the web3 instance of the endpoint to use
+        :return: the result of the first successful call, and the endpoint which made it
+        """
+        remaining = sorted(self.endpoints, key=lambda endpoint: endpoint.score)
+        in_flight: Dict[Future, RpcEndpoint] = {}
+        errors: List[BaseException] = []
+        start = time.monotonic()
+        while True:
+            if len(in_flight) == 0:
+                if len(remaining) == 0:
+                    _logger.info(f"The call failed on all the endpoints: {errors[0]}")
+                    raise errors[0]
+                endpoint = remaining.pop(0)
+                future = self._executor.submit(self._call_endpoint, endpoint, fn)
+                in_flight[future] = endpoint
+
+            # the oldest call in flight determines when to duplicate it
+            delay = None
+            if len(remaining) > 0:
+                delay = self._hedge_delay(next(iter(in_flight.values())))
+            done, _ = wait(in_flight, timeout=delay, return_when=FIRST_COMPLETED)
+            if len(done) == 0:
+                endpoint = remaining.pop(0)
+                _logger.debug(f"Hedging a slow call on {endpoint.uri}.")
+                future = self._executor.submit(self._call_endpoint, endpoint, fn)
+                in_flight[future] = endpoint
+                continue
+
+            for future in done:
+                endpoint = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    # the calls still in flight are at least as slow as this one,
+                    # so that their endpoints are not tried first by the next calls
+                    elapsed = time.monotonic() - start
+                    for slower in in_flight.values():
+                        slower.record_latency(elapsed)
+                    with self._lock:
+                        self._served.add(endpoint)
+                    return future.result(), endpoint
+                _logger.debug(f"The call failed on {endpoint.uri}: {error}")
+                errors.append(error)
+
+
+# the pools built so far, keyed by the id of the web3 instance of the agent, its urls and its rate limit;
+# the web3 instance of the agent is kept, so that its id is not reused
+_pools: Dict[Tuple[int, Tuple[str, ...], float], Tuple[Web3, RpcPool]] = {}
+_pools_lock = threading.Lock()
+
+
+def get_rpc_pool(
+    w3: Web3, rpc_urls: Sequence[str], rate_limit: float = DEFAULT_RATE_LIMIT
+) -> RpcPool:
+    """
+    Get the pool of the endpoint of the agent and of some more endpoints, shared by all the calls.
+
+    :param w3: the web3 instance of the agent, i.e., of its ledger api
+    :param rpc_urls: the urls of the additional endpoints
+    :param rate_limit: the maximum number of calls per second to each endpoint
+    :return: the pool
+    """
+    key = (id(w3), tuple(rpc_urls), rate_limit)
+    with _pools_lock:
+        entry = _pools.get(key, None)
+        if entry is None:
+            endpoints = [RpcEndpoint(w3, rate_limit)] + [
+                RpcEndpoint(
+                    Web3(
+                        Web3.HTTPProvider(
+                            url, request_kwargs={"timeout": REQUEST_TIMEOUT}
+                        )
+                    ),
+                    rate_limit,
+                )
+                for url in rpc_urls
+            ]
+            entry = _pools[key] = (w3, RpcPool(endpoints))
+    return entry[1]
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the scans of the events of ranges of blocks, in adaptive windows."""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+
+
+_logger = logging.getLogger("aea.packages.valory.contracts.agent_mech.scan")
+
+
+# the fragments of the errors returned by the RPCs when a window of blocks is too large to be scanned at once
+WINDOW_TOO_LARGE_ERRORS = (
+    "block range",
+    "blocks range",
+    "range too large",
+    "range is too large",
+    "query returned more than",
+    "response size",
+    "response too large",
+    "response is too large",
+    "timeout",
+    "timed out",
+)
+# the fragments of the errors returned by the RPCs when they are called too often
+RATE_LIMIT_ERRORS = ("429", "too many requests", "rate limit", "rate-limit")
+# the number of times a window is fetched again when the RPCs are called too often, and the first delay
+MAX_RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 1.0
+# a window is grown when it contains fewer events than this
+FEW_EVENTS = 100
+DEFAULT_SCAN_WORKERS = 4
+# the number of payments remembered, so that the requests scanned again are not looked up again
+PAYMENTS_CACHE_SIZE = 10_000
+
+# maps the hash of the transaction of a request to its payment
+_payments: "OrderedDict[str, int]" = OrderedDict()
+_payments_lock = threading.Lock()
+
+
+class BlockWindow:
+    """
+    The number of blocks scanned at once, adapted to the responses of the RPC.
+
+    The window is shared by the scans running concurrently, so it is resized relative to the
+    size of the scanned window, rather than to its current size: the windows of a batch which
+    all fail, or all succeed, resize it once.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the window; its size is set on first use."""
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, max_size: int) -> int:
+        """Get the size of the window, initializing it to the given maximum."""
+        with self._lock:
+            if self._size is None:
+                self._size = max_size
+            return min(self._size, max_size)
+
+    def grow(self, scanned_size: int, max_size: int) -> None:
+        """Double the window, as the response for a window of the given size was small."""
+        with self._lock:
+            size = cast(int, self._size)
+            if scanned_size >= size:
+                self._size = max(min(size * 2, max_size), size)
+
+    def shrink(self, scanned_size: int) -> None:
+        """Halve the window, as the RPC could not handle a window of the given size."""
+        with self._lock:
+            self._size = max(min(cast(int, self._size), scanned_size // 2), 1)
+
+
+def _matches(error: Exception, fragments: Tuple[str, ...]) -> bool:
+    """Check whether the message of an error contains any of some fragments."""
+    message = str(error).lower()
+    return any(fragment in message for fragment in fragments)
+
+
+def _is_window_too_large(error: Exception) -> bool:
+    """Check whether an error means that the window of blocks was too large."""
+    if isinstance(error, TimeoutError):
+        return True
+    return _matches(error, WINDOW_TOO_LARGE_ERRORS)
+
+
+def _fetch_with_backoff(
+    fetch: Callable[[int, int], List[Any]], start: int, end: int
+) -> List[Any]:
+    """Fetch the events of a window, backing off while the RPCs are called too often."""
+    attempt = 0
+    while True:
+        try:
+            return fetch(start, end)
+        except Exception as e:  # pylint: disable=broad-except
+            if attempt == MAX_RATE_LIMIT_RETRIES or not _matches(e, RATE_LIMIT_ERRORS):
+                raise
+            delay = RATE_LIMIT_BACKOFF * 2**attempt
+            _logger.info(f"Rate limited on blocks {start}-{end}, retrying in {delay}s.")
+            time.sleep(delay)
+            attempt += 1
+
+
+def scan_block_windows(
+    fetch: Callable[[int, int], List[Any]],
+    from_block: int,
+    to_block: int,
+    window: BlockWindow,
+    max_block_window: int,
+    max_workers: int = DEFAULT_SCAN_WORKERS,
+) -> List[Any]:
+    """
+    Fetch the events of a range of blocks, in windows fetched concurrently.
+
+    The window grows when the responses are small, up to the given maximum, and it is halved
+    and retried when the RPC reports that it is too large, e.g., because of too many results
+    or a timeout. A window is fetched again after a backoff when the RPCs are rate limited.
+
+    :param fetch: the function fetching the events of a window, given its first and last blocks.
+    :param from_block: the first block of the range.
+    :param to_block: the last block of the range.
+    :param window: the adaptive window size.
+    :param max_block_window: the maximum window size, which is also the initial one.
+    :param max_workers: the maximum number of windows fetched concurrently.
+    :return: the events, in the order of their windows.
+    """
+    results: Dict[int, List[Any]] = {}
+    retries: List[Tuple[int, int]] = []
+    next_block = from_block
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: Dict[Future, Tuple[int, int]] = {}
+        while next_block <= to_block or retries or futures:
+            while len(futures) < max_workers and (retries or next_block <= to_block):
+                if retries:
+                    start, end = retries.pop()
+                else:
+                    start = next_block
+                    end = min(start + window.get(max_block_window) - 1, to_block)
+                    next_block = end + 1
+                future = executor.submit(_fetch_with_backoff, fetch, start, end)
+                futures[future] = (start, end)
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, end = futures.pop(future)
+                try:
+                    events = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    if start == end or not _is_window_too_large(e):
+                        raise
+                    _logger.info(f"Blocks {start}-{end} could not be fetched: {e}")
+                    window.shrink(end - start + 1)
+                    middle = (start + end) // 2
+                    retries.extend([(middle + 1, end), (start, middle)])
+                    continue
+                if len(events) < FEW_EVENTS:
+                    window.grow(end - start + 1, max_block_window)
+                results[start] = events
+    return [event for start in sorted(results) for event in results[start]]
+
+
+def add_payments(
+    get_tx_value: Callable[[str], int],
+    requests: List[Dict[str, Any]],
+    max_workers: int = DEFAULT_SCAN_WORKERS,
+) -> None:
+    """
+    Add the payment of each request, i.e., the value in wei of the transaction which made it.
+
+    The requests paid in advance, or made through another contract, are seen as unpaid.
+    The payments are cached by the hash of their transaction, since it is final.
+
+    :param get_tx_value: the function getting the value of a transaction, given its hash.
+    :param requests: the requests, each with the hash of its transaction.
+    :param max_workers: the maximum number of transactions looked up concurrently.
+    """
+    tx_hashes = {req["tx_hash"] for req in requests}
+    with _payments_lock:
+        payments = {
+            tx_hash: _payments[tx_hash] for tx_hash in tx_hashes if tx_hash in _payments
+        }
+    unknown = [tx_hash for tx_hash in tx_hashes if tx_hash not in payments]
+    if unknown:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            payments.update(zip(unknown, executor.map(get_tx_value, unknown)))
+    with _payments_lock:
+        for tx_hash, payment in payments.items():
+            _payments[tx_hash] = payment
+            _payments.move_to_end(tx_hash)
+        while len(_payments) > PAYMENTS_CACHE_SIZE:
+            _payments.popitem(last=False)
+    for req in requests:
+        req["payment"] = payments[req["tx_hash"]]
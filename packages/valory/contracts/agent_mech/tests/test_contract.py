@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the scans of the events of the agent mechs."""
+
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+from packages.valory.contracts.agent_mech import contract
+from packages.valory.contracts.agent_mech.contract import AgentMechContract
+from packages.valory.contracts.agent_mech.rpc_pool import RpcEndpoint, RpcPool
+
+
+MECH = "0xmech"
+LATEST_BLOCK = 100
+# how long a stalled endpoint takes to answer
+STALL = 2.0
+
+
+def _event(request_id: int, block_number: int) -> Dict[str, Any]:
+    """Get an event."""
+    return {
+        "tx_hash": hex(block_number),
+        "contract_address": MECH,
+        "requestId": request_id,
+        "block_number": block_number,
+    }
+
+
+def _ids(events: List[Dict[str, Any]]) -> List[int]:
+    """Get the request ids of some events."""
+    return [event["requestId"] for event in events]
+
+
+REQUESTS = [_event(request_id, request_id * 10) for request_id in range(1, 10)]
+DELIVERS = [_event(request_id, request_id * 10 + 1) for request_id in range(1, 10, 2)]
+
+
+@pytest.fixture
+def ledger_api(monkeypatch: pytest.MonkeyPatch) -> Any:
+    """Get a ledger api whose chain has the events, without an RPC."""
+
+    def get_events(  # pylint: disable=too-many-arguments
+        cls: Any,
+        ledger_api: Any,
+        contract_addresses: List[str],
+        from_block: int,
+        to_block: int,
+        rpc_pool: Any = None,
+    ) -> Dict[str, Any]:
+        """Get the events of a range of blocks."""
+        return {
+            key: [
+                dict(e) for e in events if from_block <= e["block_number"] <= to_block
+            ]
+            for key, events in (("requests", REQUESTS), ("delivers", DELIVERS))
+        }
+
+    monkeypatch.setattr(
+        AgentMechContract, "get_request_and_deliver_events", classmethod(get_events)
+    )
+    eth = SimpleNamespace(
+        block_number=LATEST_BLOCK,
+        get_block=lambda block: {"hash": block.to_bytes(2, "big")},
+        # the requests pay ten times their block
+        get_transaction=lambda tx_hash: {"value": int(tx_hash, 16) * 10},
+    )
+    return SimpleNamespace(api=SimpleNamespace(provider="test", eth=eth))
+
+
+class _Eth:
+    """The eth api of an endpoint, whose chain has the events."""
+
+    def __init__(self, head: int) -> None:
+        """Initialize the api; the windows starting in some ranges of blocks fail, or stall."""
+        self.block_number = head
+        self.fork = ""
+        self.failing = range(0)
+        self.stalling = range(0)
+        self.scanned: List[int] = []
+
+    def get_logs(self, from_block: int, to_block: int) -> Dict[str, Any]:
+        """Get the events of a range of blocks."""
+        self.scanned.append(from_block)
+        if from_block in self.failing:
+            raise ConnectionError("the endpoint is down")
+        if from_block in self.stalling:
+            time.sleep(STALL)
+        return {
+            key: [
+                dict(e) for e in events if from_block <= e["block_number"] <= to_block
+            ]
+            for key, events in (("requests", REQUESTS), ("delivers", DELIVERS))
+        }
+
+    def get_block(self, block: int) -> Dict[str, Any]:
+        """Get a block, whose hash depends on the fork of the endpoint."""
+        return {"hash": f"{self.fork}{block}".encode()}
+
+    @staticmethod
+    def get_transaction(tx_hash: str) -> Dict[str, Any]:
+        """Get a transaction."""
+        return {"value": 0}
+
+
+@pytest.fixture
+def endpoints(monkeypatch: pytest.MonkeyPatch) -> Dict[str, _Eth]:
+    """Get the eth apis of the endpoints of a pool, used by the scans instead of an RPC."""
+    eths = {
+        "first": _Eth(LATEST_BLOCK),
+        "second": _Eth(LATEST_BLOCK),
+        "lagging": _Eth(LATEST_BLOCK // 2),
+    }
+    pool = RpcPool(
+        [
+            RpcEndpoint(SimpleNamespace(provider=name, eth=eth), rate_limit=1000.0)  # type: ignore
+            for name, eth in eths.items()
+        ]
+    )
+
+    def get_events(  # pylint: disable=too-many-arguments
+        cls: Any,
+        ledger_api: Any,
+        contract_addresses: List[str],
+        from_block: int,
+        to_block: int,
+        rpc_pool: Any = None,
+    ) -> Dict[str, Any]:
+        """Get the events of a range of blocks, through the pool."""
+        return rpc_pool.call(lambda w3: w3.eth.get_logs(from_block, to_block))
+
+    monkeypatch.setattr(
+        AgentMechContract, "get_request_and_deliver_events", classmethod(get_events)
+    )
+    monkeypatch.setattr(contract, "get_rpc_pool", lambda *args: pool)
+    return eths
+
+
+def _scan(from_block: int = 0) -> Dict[str, Any]:
+    """Scan the blocks up to the latest one, through the pool of the endpoints."""
+    ledger_api = SimpleNamespace(api=None)
+    return AgentMechContract.get_events_from_block(
+        ledger_api, MECH, [MECH], from_block, 8, confirmation_depth=10  # type: ignore
+    )
+
+
+class TestAgentMechContract:
+    """Test the scans of the events of the agent mechs."""
+
+    def test_get_events_from_block(self, ledger_api: Any) -> None:
+        """Test that the blocks are scanned up to the latest one, with the hashes of the final blocks."""
+        scan = AgentMechContract.get_events_from_block(
+            ledger_api, MECH, [MECH], 15, max_block_window=8, confirmation_depth=10
+        )
+        assert _ids(scan["requests"]) == _ids(REQUESTS[1:])
+        assert _ids(scan["delivers"]) == _ids(DELIVERS[1:])
+        assert (scan["from_block"], scan["to_block"]) == (15, LATEST_BLOCK)
+        assert scan["parent_hash"] == (14).to_bytes(2, "big").hex()
+        assert scan["final_block"] == LATEST_BLOCK - 10
+        assert scan["final_hash"] == (LATEST_BLOCK - 10).to_bytes(2, "big").hex()
+
+    def test_get_events_up_to_block(self, ledger_api: Any) -> None:
+        """Test that the blocks are scanned up to the given block, which is final if deep enough."""
+        scan = AgentMechContract.get_events_from_block(
+            ledger_api, MECH, [MECH], 0, 8, 45, confirmation_depth=10
+        )
+        assert _ids(scan["requests"]) == _ids(REQUESTS[:4])
+        assert scan["to_block"] == 45
+        assert scan["final_block"] == 45
+
+    def test_get_undelivered_reqs(self, ledger_api: Any) -> None:
+        """Test that the undelivered requests are those without a Deliver event up to the block."""
+        undelivered = AgentMechContract.get_undelivered_reqs(
+            ledger_api, MECH, 0, to_block=50, max_block_window=8
+        )["data"]
+        # the request of block 50 is delivered in block 51
+        assert [request["requestId"] for request in undelivered] == [2, 4, 5]
+
+    def test_payments_of_undelivered_reqs(self, ledger_api: Any) -> None:
+        """Test that the undelivered requests carry the value of their transaction as their payment."""
+        scan = AgentMechContract.get_events_from_block(
+            ledger_api, MECH, [MECH], 0, 8, 50
+        )
+        payments = {
+            request["requestId"]: request.get("payment", None)
+            for request in scan["requests"]
+        }
+        # the delivered requests are not looked up
+        assert payments == {1: None, 2: 200, 3: None, 4: 400, 5: 500}
+
+
+class TestScanEndpoints:
+    """Test the endpoints which the scans of the events are made through."""
+
+    def test_scan_fails_over(self, endpoints: Dict[str, _Eth]) -> None:
+        """Test that a scan fails over to the other synced endpoints, when one of them fails mid-scan."""
+        endpoints["first"].failing = range(40, LATEST_BLOCK + 1)
+        scan = _scan()
+        assert _ids(scan["requests"]) == _ids(REQUESTS)
+        assert scan["to_block"] == LATEST_BLOCK
+        assert scan["final_hash"] == str(LATEST_BLOCK - 10).encode().hex()
+        # the lagging endpoint has not reached the scanned blocks
+        assert endpoints["lagging"].scanned == []
+
+    def test_scan_hedges_a_stalled_endpoint(self, endpoints: Dict[str, _Eth]) -> None:
+        """Test that a scan does not wait for an endpoint which stalls mid-scan."""
+        endpoints["first"].stalling = range(40, LATEST_BLOCK + 1)
+        start = time.monotonic()
+        scan = _scan()
+        assert time.monotonic() - start < STALL
+        assert _ids(scan["requests"]) == _ids(REQUESTS)
+
+    def test_endpoints_disagree_on_the_hashes(self, endpoints: Dict[str, _Eth]) -> None:
+        """Test that a scan is discarded when the endpoints which served it are on different forks."""
+        endpoints["first"].failing = range(40, LATEST_BLOCK + 1)
+        endpoints["second"].failing = range(40)
+        endpoints["second"].fork = "fork"
+        with pytest.raises(ValueError, match="disagree"):
+            _scan()
+
+
+class TestEstimateTxsGas:
+    """Test the estimation of the gas of a batch of txs."""
+
+    def test_estimate_txs_gas(self) -> None:
+        """Test that the txs are estimated as sent by the safe, and that the failures are None."""
+        senders = []
+
+        def estimate_gas(tx: Dict[str, Any]) -> int:
+            """Estimate the gas of a tx, which fails for the txs to 0xbad."""
+            senders.append(tx["from"])
+            if tx["to"] == "0xbad":
+                raise ValueError("execution reverted")
+            return 21_000 + len(tx["data"])
+
+        api = SimpleNamespace(
+            to_checksum_address=lambda address: address,
+            eth=SimpleNamespace(estimate_gas=estimate_gas),
+        )
+        txs = [{"to": "0xa", "data": b"12"}, {"to": "0xbad"}, {"to": "0xb", "value": 1}]
+        estimates = AgentMechContract.estimate_txs_gas(
+            SimpleNamespace(api=api), "0xsafe", txs
+        )
+        assert estimates == {"data": [21_002, None, 21_000]}
+        assert senders == ["0xsafe"] * 3
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the pool of RPC endpoints."""
+
+import time
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+from packages.valory.contracts.agent_mech.rpc_pool import (
+    MIN_HEDGE_DELAY,
+    RpcEndpoint,
+    RpcPool,
+)
+
+
+class _Eth:
+    """The eth api of an endpoint."""
+
+    def __init__(self, w3: Any, head: int) -> None:
+        """Initialize the api."""
+        self._w3 = w3
+        self._head = head
+
+    @property
+    def block_number(self) -> int:
+        """Get the latest block."""
+        _call(self._w3)
+        return self._head
+
+
+def _endpoint(
+    name: str, delay: float = 0.0, fail: bool = False, head: int = 0
+) -> RpcEndpoint:
+    """Get an endpoint, whose calls take some time and possibly fail."""
+    w3 = SimpleNamespace(provider=name, name=name, delay=delay, fail=fail)
+    w3.eth = _Eth(w3, head)
+    return RpcEndpoint(w3, rate_limit=100.0)  # type: ignore
+
+
+def _call(w3: Any) -> str:
+    """Make a call, returning the name of the endpoint."""
+    time.sleep(w3.delay)
+    if w3.fail:
+        raise ConnectionError(w3.name)
+    return w3.name
+
+
+class TestRpcPool:
+    """Test the pool of RPC endpoints."""
+
+    def test_slow_call_is_hedged(self) -> None:
+        """Test that a call slower than usual is duplicated on the next endpoint."""
+        slow, fast = _endpoint("slow", delay=2.0), _endpoint("fast")
+        # the slow endpoint is usually fast, so it is tried first
+        for _ in range(10):
+            slow.record(MIN_HEDGE_DELAY / 10, ok=True)
+            fast.record(MIN_HEDGE_DELAY, ok=True)
+        pool = RpcPool([slow, fast])
+        start = time.monotonic()
+        result, endpoint = pool.call_with_endpoint(_call)
+        assert (result, endpoint) == ("fast", fast)
+        assert time.monotonic() - start < 1.0
+        # the call still in flight is at least as slow as the hedged one
+        assert slow.latency_percentile(1.0) >= MIN_HEDGE_DELAY  # type: ignore
+
+    def test_failed_call_is_retried(self) -> None:
+        """Test that a failed call is retried on the other endpoints."""
+        bad, good = _endpoint("bad", fail=True), _endpoint("good")
+        pool = RpcPool([bad, good])
+        assert pool.call(_call) == "good"
+        assert pool.call(_call) == "good"
+        assert bad.score > good.score
+
+    def test_all_endpoints_fail(self) -> None:
+        """Test that the first error is raised when the call fails on all the endpoints."""
+        pool = RpcPool([_endpoint("first", fail=True), _endpoint("second", fail=True)])
+        with pytest.raises(ConnectionError):
+            pool.call(_call)
+
+    def test_subset(self) -> None:
+        """Test that a subset of a pool only uses its endpoints, and shares the threads of its pool."""
+        first, second = _endpoint("first"), _endpoint("second")
+        pool = RpcPool([first, second])
+        subset = pool.subset([second])
+        assert subset.endpoints == [second]
+        assert [subset.call(_call) for _ in range(3)] == ["second"] * 3
+        assert subset.served == {second}
+        assert pool.served == set()
+        assert subset._executor is pool._executor  # pylint: disable=protected-access
+
+    def test_heads(self) -> None:
+        """Test that the endpoints which fail, or are slow to report their latest block, are left out."""
+        fast, slow = _endpoint("fast", head=10), _endpoint("slow", delay=2.0, head=12)
+        failing = _endpoint("failing", fail=True, head=12)
+        pool = RpcPool([fast, slow, failing])
+        start = time.monotonic()
+        assert pool.get_heads() == {fast: 10}
+        assert time.monotonic() - start < 2.0
+
+    def test_all_heads_fail(self) -> None:
+        """Test that the first error is raised when no endpoint reports its latest block."""
+        pool = RpcPool([_endpoint("first", fail=True), _endpoint("second", fail=True)])
+        with pytest.raises(ConnectionError):
+            pool.get_heads()
+
+    @pytest.mark.parametrize(
+        "to_block, latest, synced",
+        [
+            (None, 11, ["first", "second"]),
+            (10, 11, ["first", "second", "third"]),
+            (12, 11, ["first", "second"]),
+        ],
+    )
+    def test_synced(self, to_block: Any, latest: int, synced: List[str]) -> None:
+        """Test that the reads are spread among the endpoints which have reached the block to scan up to."""
+        pool = RpcPool(
+            [
+                _endpoint("first", head=12),
+                _endpoint("second", head=11),
+                _endpoint("third", head=10),
+            ]
+        )
+        block, synced_pool = pool.synced(to_block)
+        assert block == latest
+        assert [endpoint.uri for endpoint in synced_pool.endpoints] == synced
+
+    def test_synced_single_endpoint(self) -> None:
+        """Test that the latest block of a single endpoint is used, when the others do not answer."""
+        pool = RpcPool([_endpoint("first", head=12), _endpoint("down", fail=True)])
+        block, synced_pool = pool.synced()
+        assert block == 12
+        assert [endpoint.uri for endpoint in synced_pool.endpoints] == ["first"]
+
+    def test_rate_limit(self) -> None:
+        """Test that the calls to an endpoint are rate limited, with bursts of the limit."""
+        endpoint = RpcEndpoint(SimpleNamespace(provider="e"), rate_limit=20.0)  # type: ignore
+        start = time.monotonic()
+        for _ in range(30):
+            endpoint.acquire()
+        assert time.monotonic() - start >= 0.4
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the scans of the block windows."""
+
+from typing import List, Tuple
+
+import pytest
+
+from packages.valory.contracts.agent_mech import scan
+from packages.valory.contracts.agent_mech.scan import (
+    BlockWindow,
+    FEW_EVENTS,
+    MAX_RATE_LIMIT_RETRIES,
+    add_payments,
+    scan_block_windows,
+)
+
+
+class TestScanBlockWindows:
+    """Test the scans of the block windows."""
+
+    def test_blocks_are_scanned_once_and_in_order(self) -> None:
+        """Test that every block is scanned once, and the events are in the order of the blocks."""
+        windows: List[Tuple[int, int]] = []
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fetch the blocks of a window."""
+            windows.append((start, end))
+            return list(range(start, end + 1))
+
+        window = BlockWindow()
+        assert scan_block_windows(fetch, 5, 104, window, 10) == list(range(5, 105))
+        assert sum(end - start + 1 for start, end in windows) == 100
+        # the responses are small, but the window does not grow past its maximum
+        assert window.get(100) == 10
+
+    def test_window_shrinks(self) -> None:
+        """Test that a window which is too large is halved and scanned again."""
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fetch the blocks of a window, failing on the large ones."""
+            if end - start >= 4:
+                raise ValueError("query returned more than 10000 results")
+            return [start] * FEW_EVENTS
+
+        window = BlockWindow()
+        events = scan_block_windows(fetch, 0, 15, window, 16)
+        assert events == [block for block in range(0, 16, 4) for _ in range(FEW_EVENTS)]
+        # the responses are not small, so the window is not grown again
+        assert window.get(16) < 16
+
+    def test_window_grows_up_to_its_maximum(self) -> None:
+        """Test that a window which has shrunk grows back while the responses are small."""
+        window = BlockWindow()
+        assert window.get(16) == 16
+        window.shrink(16)
+        window.grow(8, 16)
+        window.grow(16, 16)
+        assert window.get(16) == 16
+
+    def test_concurrent_windows_resize_once(self) -> None:
+        """Test that the windows scanned concurrently resize the shared window once."""
+        window = BlockWindow()
+        window.get(16)
+        for _ in range(4):
+            window.shrink(16)
+        assert window.get(16) == 8
+        for _ in range(4):
+            window.grow(8, 16)
+        assert window.get(16) == 16
+        # a window smaller than the current one, e.g., the last of a range, does not grow it
+        window.shrink(16)
+        window.grow(3, 16)
+        assert window.get(16) == 8
+
+    def test_rate_limits_are_retried(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a rate limited window is fetched again after a backoff, without shrinking."""
+        monkeypatch.setattr(scan.time, "sleep", lambda delay: None)
+        calls: List[Tuple[int, int]] = []
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fetch the blocks of a window, rate limited on the first call."""
+            calls.append((start, end))
+            if len(calls) == 1:
+                raise ValueError("429 Client Error: Too Many Requests")
+            return list(range(start, end + 1))
+
+        window = BlockWindow()
+        assert scan_block_windows(fetch, 0, 15, window, 16) == list(range(16))
+        assert calls == [(0, 15), (0, 15)]
+        assert window.get(16) == 16
+
+    def test_rate_limits_are_raised_eventually(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Test that a window which stays rate limited is not shrunk, but raised."""
+        monkeypatch.setattr(scan.time, "sleep", lambda delay: None)
+        calls: List[Tuple[int, int]] = []
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fail to fetch a window, as the rate limit is exceeded."""
+            calls.append((start, end))
+            raise ValueError("rate limit exceeded")
+
+        with pytest.raises(ValueError, match="rate limit"):
+            scan_block_windows(fetch, 0, 15, BlockWindow(), 16)
+        assert calls == [(0, 15)] * (MAX_RATE_LIMIT_RETRIES + 1)
+
+    def test_other_errors_are_raised(self) -> None:
+        """Test that the errors unrelated to the size of the window are raised."""
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fail to fetch a window."""
+            raise ValueError("invalid address")
+
+        with pytest.raises(ValueError, match="invalid address"):
+            scan_block_windows(fetch, 0, 15, BlockWindow(), 16)
+
+    def test_empty_range(self) -> None:
+        """Test that an empty range is not scanned."""
+
+        def fetch(start: int, end: int) -> List[int]:
+            """Fail if called."""
+            raise AssertionError("no window should be fetched")
+
+        assert scan_block_windows(fetch, 10, 9, BlockWindow(), 16) == []
+
+
+class TestAddPayments:
+    """Test the payments of the requests."""
+
+    def test_payments_are_looked_up_once(self) -> None:
+        """Test that the payment of each transaction is looked up once, and then cached."""
+        lookups: List[str] = []
+
+        def get_tx_value(tx_hash: str) -> int:
+            """Get the value of a transaction."""
+            lookups.append(tx_hash)
+            return int(tx_hash, 16)
+
+        requests = [{"tx_hash": "0xa1"}, {"tx_hash": "0xa2"}, {"tx_hash": "0xa1"}]
+        add_payments(get_tx_value, requests)
+        assert [request["payment"] for request in requests] == [0xA1, 0xA2, 0xA1]
+        assert sorted(lookups) == ["0xa1", "0xa2"]
+
+        rescanned = [{"tx_hash": "0xa2"}]
+        add_payments(get_tx_value, rescanned)
+        assert rescanned[0]["payment"] == 0xA2
+        assert len(lookups) == 2
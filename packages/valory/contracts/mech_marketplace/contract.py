@@ -19,17 +19,34 @@
 
 """This module contains the dynamic_contribution contract definition."""
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Dict, List, Optional, Set, cast
 
 from aea.common import JSONLike
 from aea.configurations.base import PublicId
 from aea.contracts.base import Contract
 from aea.crypto.base import LedgerApi
 from aea_ledger_ethereum import EthereumApi
-from web3 import Web3
+from eth_utils import event_abi_to_log_topic
 from web3.types import BlockIdentifier, TxReceipt
 
+# the marketplace depends on the agent mech contract for its contract cache, its pool of RPC endpoints
+# and its scans, so that the reads of the two contracts share the endpoints, along with their health
+# and their rate limits, and the cache of the contract objects
+from packages.valory.contracts.agent_mech.contract_cache import get_contract
+from packages.valory.contracts.agent_mech.rpc_pool import (
+    DEFAULT_RATE_LIMIT,
+    RpcPool,
+    get_rpc_pool,
+)
+from packages.valory.contracts.agent_mech.scan import (
+    BlockWindow,
+    DEFAULT_SCAN_WORKERS,
+    add_payments,
+    scan_block_windows,
+)
+
 
 PUBLIC_ID = PublicId.from_str("valory/agent_mech:0.1.0")
 
@@ -39,27 +56,82 @@ _logger = logging.getLogger(
 
 
 BATCH_PRIORITY_PASSED_DATA = {
-  "abi": [
-    {
-      "inputs": [
+    "abi": [
         {
-          "internalType": "contract IMechMarketplace",
-          "name": "_marketplace",
-          "type": "address"
-        },
-        {
-          "internalType": "uint256[]",
-          "name": "_requestIds",
-          "type": "uint256[]"
+            "inputs": [
+                {
+                    "internalType": "contract IMechMarketplace",
+                    "name": "_marketplace",
+                    "type": "address",
+                },
+                {
+                    "internalType": "uint256[]",
+                    "name": "_requestIds",
+                    "type": "uint256[]",
+                },
+            ],
+            "stateMutability": "nonpayable",
+            "type": "constructor",
         }
-      ],
-      "stateMutability": "nonpayable",
-      "type": "constructor"
-    }
-  ],
-  "bytecode": "0x608060405234801561001057600080fd5b5060405161078c38038061078c8339818101604052810190610032919061046d565b60008151905060008167ffffffffffffffff811115610054576100536102f4565b5b6040519080825280602002602001820160405280156100825781602001602082028036833780820191505090505b5090506000805b8381101561018d5760008673ffffffffffffffffffffffffffffffffffffffff1663cb261bec8784815181106100c2576100c16104c9565b5b60200260200101516040518263ffffffff1660e01b81526004016100e69190610507565b608060405180830381865afa158015610103573d6000803e3d6000fd5b505050506040513d601f19601f820116820180604052508101906101279190610607565b9050806060015163ffffffff1642106101815785828151811061014d5761014c6104c9565b5b6020026020010151848481518110610168576101676104c9565b5b6020026020010181815250508261017e90610663565b92505b81600101915050610089565b5060008167ffffffffffffffff8111156101aa576101a96102f4565b5b6040519080825280602002602001820160405280156101d85781602001602082028036833780820191505090505b50905060005b8281101561022b578381815181106101f9576101f86104c9565b5b6020026020010151828281518110610214576102136104c9565b5b6020026020010181815250508060010190506101de565b5060008160405160200161023f9190610769565b60405160208183030381529060405290506020810180590381f35b6000604051905090565b600080fd5b600080fd5b600073ffffffffffffffffffffffffffffffffffffffff82169050919050565b60006102998261026e565b9050919050565b60006102ab8261028e565b9050919050565b6102bb816102a0565b81146102c657600080fd5b50565b6000815190506102d8816102b2565b92915050565b600080fd5b6000601f19601f8301169050919050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052604160045260246000fd5b61032c826102e3565b810181811067ffffffffffffffff8211171561034b5761034a6102f4565b5b80604052505050565b600061035e61025a565b905061036a8282610323565b919050565b600067ffffffffffffffff82111561038a576103896102f4565b5b602082029050602081019050919050565b600080fd5b6000819050919050565b6103b3816103a0565b81146103be57600080fd5b50565b6000815190506103d0816103aa565b92915050565b60006103e96103e48461036f565b610354565b9050808382526020820190506020840283018581111561040c5761040b61039b565b5b835b81811015610435578061042188826103c1565b84526020840193505060208101905061040e565b5050509392505050565b600082601f830112610454576104536102de565b5b81516104648482602086016103d6565b91505092915050565b6000806040838503121561048457610483610264565b5b6000610492858286016102c9565b925050602083015167ffffffffffffffff8111156104b3576104b2610269565b5b6104bf8582860161043f565b9150509250929050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052603260045260246000fd5b610501816103a0565b82525050565b600060208201905061051c60008301846104f8565b92915050565b600080fd5b6105308161028e565b811461053b57600080fd5b50565b60008151905061054d81610527565b92915050565b600063ffffffff82169050919050565b61056c81610553565b811461057757600080fd5b50565b60008151905061058981610563565b92915050565b6000608082840312156105a5576105a4610522565b5b6105af6080610354565b905060006105bf8482850161053e565b60008301525060206105d38482850161053e565b60208301525060406105e78482850161053e565b60408301525060606105fb8482850161057a565b60608301525092915050565b60006080828403121561061d5761061c610264565b5b600061062b8482850161058f565b91505092915050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052601160045260246000fd5b600061066e826103a0565b91507fffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff82036106a05761069f610634565b5b600182019050919050565b600081519050919050565b600082825260208201905092915050565b6000819050602082019050919050565b6106e0816103a0565b82525050565b60006106f283836106d7565b60208301905092915050565b6000602082019050919050565b6000610716826106ab565b61072081856106b6565b935061072b836106c7565b8060005b8381101561075c57815161074388826106e6565b975061074e836106fe565b92505060018101905061072f565b5085935050505092915050565b60006020820190508181036000830152610783818461070b565b90509291505056fe",
+    ],
+    "bytecode": "0x608060405234801561001057600080fd5b5060405161078c38038061078c8339818101604052810190610032919061046d565b60008151905060008167ffffffffffffffff811115610054576100536102f4565b5b6040519080825280602002602001820160405280156100825781602001602082028036833780820191505090505b5090506000805b8381101561018d5760008673ffffffffffffffffffffffffffffffffffffffff1663cb261bec8784815181106100c2576100c16104c9565b5b60200260200101516040518263ffffffff1660e01b81526004016100e69190610507565b608060405180830381865afa158015610103573d6000803e3d6000fd5b505050506040513d601f19601f820116820180604052508101906101279190610607565b9050806060015163ffffffff1642106101815785828151811061014d5761014c6104c9565b5b6020026020010151848481518110610168576101676104c9565b5b6020026020010181815250508261017e90610663565b92505b81600101915050610089565b5060008167ffffffffffffffff8111156101aa576101a96102f4565b5b6040519080825280602002602001820160405280156101d85781602001602082028036833780820191505090505b50905060005b8281101561022b578381815181106101f9576101f86104c9565b5b6020026020010151828281518110610214576102136104c9565b5b6020026020010181815250508060010190506101de565b5060008160405160200161023f9190610769565b60405160208183030381529060405290506020810180590381f35b6000604051905090565b600080fd5b600080fd5b600073ffffffffffffffffffffffffffffffffffffffff82169050919050565b60006102998261026e565b9050919050565b60006102ab8261028e565b9050919050565b6102bb816102a0565b81146102c657600080fd5b50565b6000815190506102d8816102b2565b92915050565b600080fd5b6000601f19601f8301169050919050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052604160045260246000fd5b61032c826102e3565b810181811067ffffffffffffffff8211171561034b5761034a6102f4565b5b80604052505050565b600061035e61025a565b905061036a8282610323565b919050565b600067ffffffffffffffff82111561038a576103896102f4565b5b602082029050602081019050919050565b600080fd5b6000819050919050565b6103b3816103a0565b81146103be57600080fd5b50565b6000815190506103d0816103aa565b92915050565b60006103e96103e48461036f565b610354565b9050808382526020820190506020840283018581111561040c5761040b61039b565b5b835b81811015610435578061042188826103c1565b84526020840193505060208101905061040e565b5050509392505050565b600082601f830112610454576104536102de565b5b81516104648482602086016103d6565b91505092915050565b6000806040838503121561048457610483610264565b5b6000610492858286016102c9565b925050602083015167ffffffffffffffff8111156104b3576104b2610269565b5b6104bf8582860161043f565b9150509250929050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052603260045260246000fd5b610501816103a0565b82525050565b600060208201905061051c60008301846104f8565b92915050565b600080fd5b6105308161028e565b811461053b57600080fd5b50565b60008151905061054d81610527565b92915050565b600063ffffffff82169050919050565b61056c81610553565b811461057757600080fd5b50565b60008151905061058981610563565b92915050565b6000608082840312156105a5576105a4610522565b5b6105af6080610354565b905060006105bf8482850161053e565b60008301525060206105d38482850161053e565b60208301525060406105e78482850161053e565b60408301525060606105fb8482850161057a565b60608301525092915050565b60006080828403121561061d5761061c610264565b5b600061062b8482850161058f565b91505092915050565b7f4e487b7100000000000000000000000000000000000000000000000000000000600052601160045260246000fd5b600061066e826103a0565b91507fffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff82036106a05761069f610634565b5b600182019050919050565b600081519050919050565b600082825260208201905092915050565b6000819050602082019050919050565b6106e0816103a0565b82525050565b60006106f283836106d7565b60208301905092915050565b6000602082019050919050565b6000610716826106ab565b61072081856106b6565b935061072b836106c7565b8060005b8381101561075c57815161074388826106e6565b975061074e836106fe565b92505060018101905061072f565b5085935050505092915050565b60006020820190508181036000830152610783818461070b565b90509291505056fe",
 }
 
+# the creation code of the BatchPriorityData contract, decoded once
+BATCH_PRIORITY_PASSED_BYTECODE = bytes.fromhex(
+    BATCH_PRIORITY_PASSED_DATA["bytecode"][2:]
+)
+
+
+# the maximum number of requests whose priority is checked in a single call
+PRIORITY_CHECK_CHUNK_SIZE = 100
+
+
+# the windows of the log scans of the requests and of the delivers, shared by the scans of all the calls;
+# they are kept apart, since the density of the two events differs
+_request_window = BlockWindow()
+_deliver_window = BlockWindow()
+
+# maps each marketplace to the ids of its undelivered requests whose priority has passed,
+# which is final, so they do not need to be checked again
+_priority_passed_request_ids: Dict[str, Set[int]] = {}
+
+
+def get_undelivered(
+    requests: List[Dict[str, Any]], delivers: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Get the requests that have not been delivered, matching them by id in O(1)."""
+    delivered = {deliver["requestId"] for deliver in delivers}
+    return [request for request in requests if request["requestId"] not in delivered]
+
+
+def get_events(  # pylint: disable=too-many-arguments
+    ledger_api: EthereumApi,
+    contract_instance: Any,
+    event_name: str,
+    from_block: BlockIdentifier,
+    to_block: BlockIdentifier,
+    rpc_pool: Optional[RpcPool] = None,
+) -> List[Any]:
+    """Get the events of a contract with an `eth_getLogs` call, through a pool of endpoints if one is given."""
+    event = contract_instance.events[event_name]()
+    event_abi = next(
+        abi
+        for abi in contract_instance.abi
+        if abi["type"] == "event" and abi["name"] == event_name
+    )
+    params = {
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "address": contract_instance.address,
+        "topics": ["0x" + event_abi_to_log_topic(event_abi).hex()],
+    }
+    if rpc_pool is None:
+        logs = ledger_api.api.eth.get_logs(params)
+    else:
+        logs = rpc_pool.call(lambda w3: w3.eth.get_logs(params))
+    return [event.process_log(log) for log in logs]
+
 
 class MechOperation(Enum):
     """Operation types."""
@@ -73,6 +145,18 @@ class MechMarketplaceContract(Contract):
 
     contract_id = PublicId.from_str("valory/mech_marketplace:0.1.0")
 
+    @classmethod
+    def get_instance(
+        cls, ledger_api: LedgerApi, contract_address: Optional[str] = None
+    ) -> Any:
+        """Get the instance of the contract, reusing the one built by a previous call."""
+        if contract_address is None:
+            return super().get_instance(ledger_api, contract_address)
+        contract_interface = cls.contract_interface[ledger_api.identifier]
+        return get_contract(
+            cast(EthereumApi, ledger_api), contract_address, contract_interface["abi"]
+        )
+
     @classmethod
     def get_raw_transaction(
         cls, ledger_api: LedgerApi, contract_address: str, **kwargs: Any
@@ -157,7 +241,6 @@ class MechMarketplaceContract(Contract):
                 delivery_mech_staking_instance,
                 delivery_mech_service_id,
             ],
-
         )
 
         simulation_ok = cls.simulate_tx(
@@ -172,14 +255,19 @@ class MechMarketplaceContract(Contract):
         contract_address: str,
         from_block: BlockIdentifier = "earliest",
         to_block: BlockIdentifier = "latest",
+        rpc_pool: Optional[RpcPool] = None,
     ) -> JSONLike:
-        """Get the Request events emitted by the contract."""
+        """Get the Request events emitted by the contract, through a pool of endpoints if one is given."""
         ledger_api = cast(EthereumApi, ledger_api)
         contract_instance = cls.get_instance(ledger_api, contract_address)
-        entries = contract_instance.events.MarketplaceRequest.create_filter(
-            fromBlock=from_block,
-            toBlock=to_block,
-        ).get_all_entries()
+        entries = get_events(
+            ledger_api,
+            contract_instance,
+            "MarketplaceRequest",
+            from_block,
+            to_block,
+            rpc_pool,
+        )
 
         request_events = list(
             {
@@ -199,14 +287,19 @@ class MechMarketplaceContract(Contract):
         contract_address: str,
         from_block: BlockIdentifier = "earliest",
         to_block: BlockIdentifier = "latest",
+        rpc_pool: Optional[RpcPool] = None,
     ) -> JSONLike:
-        """Get the Deliver events emitted by the contract."""
+        """Get the Deliver events emitted by the contract, through a pool of endpoints if one is given."""
         ledger_api = cast(EthereumApi, ledger_api)
         contract_instance = cls.get_instance(ledger_api, contract_address)
-        entries = contract_instance.events.MarketplaceDeliver.create_filter(
-            fromBlock=from_block,
-            toBlock=to_block,
-        ).get_all_entries()
+        entries = get_events(
+            ledger_api,
+            contract_instance,
+            "MarketplaceDeliver",
+            from_block,
+            to_block,
+            rpc_pool,
+        )
 
         request_events = list(
             {
@@ -233,20 +326,17 @@ class MechMarketplaceContract(Contract):
         event, *_ = contract_instance.events.Request().processReceipt(tx_receipt)
         return dict(event["args"])
 
-
     @classmethod
     def has_priority_passed(
         cls,
         ledger_api: LedgerApi,
         contract_address: str,
         request_ids: List[int],
+        rpc_pool: Optional[RpcPool] = None,
     ) -> Dict[str, Any]:
-        """Check the priority of the requests."""
+        """Check the priority of the requests, through a pool of endpoints if one is given."""
         # BatchPriorityData contract is a special contract used specifically for checking if the requests have passed
         # the priority timeout. It is not deployed anywhere, nor it needs to be deployed
-        batch_workable_contract = ledger_api.api.eth.contract(
-            abi=BATCH_PRIORITY_PASSED_DATA["abi"], bytecode=BATCH_PRIORITY_PASSED_DATA["bytecode"]
-        )
 
         # Encode the input data (constructor params)
         encoded_input_data = ledger_api.api.codec.encode_abi(
@@ -254,12 +344,16 @@ class MechMarketplaceContract(Contract):
         )
 
         # Concatenate the bytecode with the encoded input data to create the contract creation code
-        contract_creation_code = batch_workable_contract.bytecode + encoded_input_data
+        contract_creation_code = BATCH_PRIORITY_PASSED_BYTECODE + encoded_input_data
 
         # Call the function with the contract creation code
         # Note that we are not sending any transaction, we are just calling the function
         # This is a special contract creation code that will return some result
-        encoded_strategies = ledger_api.api.eth.call({"data": contract_creation_code})
+        tx = {"data": contract_creation_code}
+        if rpc_pool is None:
+            encoded_strategies = ledger_api.api.eth.call(tx)
+        else:
+            encoded_strategies = rpc_pool.call(lambda w3: w3.eth.call(tx))
 
         # Decode the raw response
         # the decoding returns a Tuple with a single element so we need to access the first element of the tuple,
@@ -268,6 +362,47 @@ class MechMarketplaceContract(Contract):
         )[0]
         return dict(request_ids=request_ids)
 
+    @classmethod
+    def get_priority_passed_request_ids(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: str,
+        request_ids: List[int],
+        chunk_size: int = PRIORITY_CHECK_CHUNK_SIZE,
+        max_workers: int = DEFAULT_SCAN_WORKERS,
+        rpc_pool: Optional[RpcPool] = None,
+    ) -> Set[int]:
+        """
+        Get the ids of the requests whose priority has passed.
+
+        Only the requests which are not already known to have passed their priority are checked,
+        in chunks checked concurrently, so that the calls stay within the gas and calldata limits.
+
+        :param ledger_api: LedgerApi object
+        :param contract_address: the address of the marketplace
+        :param request_ids: the ids of the undelivered requests
+        :param chunk_size: the maximum number of requests checked per call
+        :param max_workers: the maximum number of concurrent calls
+        :param rpc_pool: the pool of endpoints to make the calls through; if None, the ledger api is used
+        :return: the ids of the requests whose priority has passed
+        """
+        passed = _priority_passed_request_ids.setdefault(contract_address, set())
+        # forget the requests that have been delivered since
+        passed.intersection_update(request_ids)
+        unknown = [request_id for request_id in request_ids if request_id not in passed]
+        chunks = [
+            unknown[i : i + chunk_size] for i in range(0, len(unknown), chunk_size)
+        ]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for passed_chunk in executor.map(
+                    lambda chunk: cls.has_priority_passed(
+                        ledger_api, contract_address, chunk, rpc_pool
+                    )["request_ids"],
+                    chunks,
+                ):
+                    passed.update(passed_chunk)
+        return set(passed)
 
     @classmethod
     def get_undelivered_reqs(
@@ -279,38 +414,78 @@ class MechMarketplaceContract(Contract):
         max_block_window: int = 1000,
         **kwargs: Any,
     ) -> JSONLike:
-        """Get the requests that are not delivered."""
+        """
+        Get the requests that are not delivered.
+
+        :param ledger_api: LedgerApi object
+        :param contract_address: the address of the marketplace
+        :param from_block: the first block to scan
+        :param to_block: the last block to scan, capped to the latest one
+        :param max_block_window: the maximum number of blocks scanned per call
+        :param kwargs: the keyword arguments, e.g., the `rpc_urls` of the endpoints to use
+            along with the one of the ledger api, and their `rpc_rate_limit`
+        :return: the undelivered requests whose priority has passed, along with their payment
+        """
         if from_block == "earliest":
             from_block = 0
 
-        current_block = ledger_api.api.eth.block_number
-        requests, delivers = [], []
-        for from_block_batch in range(int(from_block), current_block, max_block_window):
-            to_block_batch = (from_block_batch + max_block_window) - 1
-            if to_block_batch >= current_block:
-                to_block_batch = "latest"
-            requests_batch: List[Dict[str, Any]] = cls.get_request_events(
-                ledger_api, contract_address, from_block_batch, to_block_batch
-            )["data"]
-            delivers_batch: List[Dict[str, Any]] = cls.get_deliver_events(
-                ledger_api, contract_address, from_block_batch, to_block_batch
-            )["data"]
-            requests.extend(requests_batch)
-            delivers.extend(delivers_batch)
-        pending_tasks: List[Dict[str, Any]] = []
-        for request in requests:
-            if request["requestId"] not in [
-                deliver["requestId"] for deliver in delivers
-            ]:
-                # store each requests in the pending_tasks list, make sure each req is stored once
-                pending_tasks.append(request)
+        ledger_api = cast(EthereumApi, ledger_api)
+        pool = get_rpc_pool(
+            ledger_api.api,
+            kwargs.get("rpc_urls", []),
+            kwargs.get("rpc_rate_limit", DEFAULT_RATE_LIMIT),
+        )
+        # the reads are spread among the endpoints which have reached the last block to scan,
+        # so that none of them is answered by an endpoint lagging behind it
+        current_block, rpc_pool = pool.synced(
+            None if to_block == "latest" else int(to_block)
+        )
+        if to_block != "latest":
+            current_block = min(int(to_block), current_block)
+        max_workers = kwargs.get("max_workers", DEFAULT_SCAN_WORKERS)
+        requests: List[Dict[str, Any]] = scan_block_windows(
+            lambda start, end: cls.get_request_events(
+                ledger_api, contract_address, start, end, rpc_pool
+            )["data"],
+            int(from_block),
+            current_block,
+            _request_window,
+            max_block_window,
+            max_workers,
+        )
+        delivers: List[Dict[str, Any]] = scan_block_windows(
+            lambda start, end: cls.get_deliver_events(
+                ledger_api, contract_address, start, end, rpc_pool
+            )["data"],
+            int(from_block),
+            current_block,
+            _deliver_window,
+            max_block_window,
+            max_workers,
+        )
+        pending_tasks = get_undelivered(requests, delivers)
 
         request_ids = [req["requestId"] for req in pending_tasks]
-        eligible_request_ids = cls.has_priority_passed(ledger_api, contract_address, request_ids).pop("request_ids")
-        pending_tasks = [req for req in pending_tasks if req["requestId"] in eligible_request_ids]
+        eligible_request_ids = cls.get_priority_passed_request_ids(
+            ledger_api,
+            contract_address,
+            request_ids,
+            kwargs.get("priority_check_chunk_size", PRIORITY_CHECK_CHUNK_SIZE),
+            kwargs.get("max_workers", DEFAULT_SCAN_WORKERS),
+            rpc_pool,
+        )
+        pending_tasks = [
+            req for req in pending_tasks if req["requestId"] in eligible_request_ids
+        ]
+        add_payments(
+            lambda tx_hash: rpc_pool.call(
+                lambda w3: w3.eth.get_transaction(tx_hash)["value"]
+            ),
+            pending_tasks,
+            max_workers,
+        )
         return {"data": pending_tasks}
 
-
     @classmethod
     def simulate_tx(
         cls,
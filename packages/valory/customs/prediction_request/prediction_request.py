@@ -635,8 +635,11 @@ def fetch_additional_information(
     return additional_information, counter_callback
 
 
-def load_model(vocab: str) -> Language:
+def load_model(vocab: str, model_registry: Optional[Any] = None) -> Language:
     """Utilize spaCy to load the model and download it if it is not already available."""
+    if model_registry is not None:
+        # reuse the model already loaded by the worker
+        return model_registry.get_spacy(vocab)
     try:
         return spacy.load(vocab)
     except OSError:
@@ -677,12 +680,17 @@ def calc_sentence_scores(
     return sentence_scores
 
 
-def summarize(text: str, compression_factor: float, vocab: str) -> str:
+def summarize(
+    text: str,
+    compression_factor: float,
+    vocab: str,
+    model_registry: Optional[Any] = None,
+) -> str:
     """Summarize the given text, retaining the given compression factor."""
     if not text:
         raise ValueError("Cannot summarize empty text!")
 
-    nlp = load_model(vocab)
+    nlp = load_model(vocab, model_registry)
     doc = nlp(text)
     word_frequencies = calc_word_frequencies(doc)
     sentence_tokens = list(doc.sents)
@@ -771,7 +779,10 @@ def run(**kwargs) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], Any]:
 
         if additional_information and tool == "prediction-online-summarized-info":
             additional_information = summarize(
-                additional_information, compression_factor, vocab
+                additional_information,
+                compression_factor,
+                vocab,
+                kwargs.get("model_registry"),
             )
         # TODO: Get adjust_additional_information working for Claude
         # additional_information = adjust_additional_information(
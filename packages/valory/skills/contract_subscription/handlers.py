@@ -22,8 +22,9 @@
 
 import json
 import time
-from typing import Any
+from typing import Any, Dict, Set
 
+from eth_utils import event_abi_to_log_topic
 from web3 import Web3
 from web3.types import TxReceipt
 
@@ -47,18 +48,22 @@ class WebSocketHandler(BaseWebSocketHandler):
     SUPPORTED_PROTOCOL = WebsocketClientMessage.protocol_id
     w3: Web3 = None
     contract = None
+    request_topics: Set[str] = set()
 
     def __init__(self, **kwargs: Any) -> None:
         """Initialize the handler."""
         self.websocket_provider = kwargs.pop("websocket_provider")
         self.contract_to_monitor = kwargs.pop("contract_to_monitor")
+        # the number of blocks after which a processed block is considered final
+        self.confirmation_depth = kwargs.pop("confirmation_depth", 0)
         super().__init__(**kwargs)
 
     def setup(self) -> None:
         """Implement the setup."""
         super().setup()
 
-        self.context.shared_state[JOB_QUEUE] = []
+        # the queue may have already been set up by the skill consuming it
+        self.context.shared_state.setdefault(JOB_QUEUE, [])
         self.context.shared_state[DISCONNECTION_POINT] = None
         self._last_processed_block = None
 
@@ -74,6 +79,11 @@ class WebSocketHandler(BaseWebSocketHandler):
             Web3.HTTPProvider(self.websocket_provider)
         )
         self.contract = self.w3.eth.contract(address=self.contract_to_monitor, abi=abi)
+        self.request_topics = {
+            Web3.to_hex(event_abi_to_log_topic(event_abi))
+            for event_abi in abi
+            if event_abi.get("type") == "event" and event_abi["name"] == "Request"
+        }
 
     def handle(self, message: WebsocketClientMessage) -> None:
         """Handle message."""
@@ -81,10 +91,16 @@ class WebSocketHandler(BaseWebSocketHandler):
         if self.context.shared_state[WEBSOCKET_SUBSCRIPTION_STATUS][
             message.subscription_id
         ] in (SubscriptionStatus.UNSUBSCRIBED, SubscriptionStatus.SUBSCRIBING):
+            disconnection_point = self._last_processed_block
+            if disconnection_point is not None:
+                # the blocks which are not final yet are fetched again, as they may have been reorged
+                disconnection_point = max(
+                    disconnection_point - self.confirmation_depth, 0
+                )
             self.context.logger.info(
-                f"Setting disconnection point to {self._last_processed_block}"
+                f"Setting disconnection point to {disconnection_point}"
             )
-            self.context.shared_state[DISCONNECTION_POINT] = self._last_processed_block
+            self.context.shared_state[DISCONNECTION_POINT] = disconnection_point
 
     def handle_recv(self, message: WebsocketClientMessage) -> None:
         """Handler `RECV` performative"""
@@ -107,8 +123,14 @@ class WebSocketHandler(BaseWebSocketHandler):
             self.context.logger.info(f"Received response: {data}")
             return
 
+        log = data["params"]["result"]
+        if log.get("removed", False):
+            # the log has been removed by a reorg
+            self._remove_job(log)
+            return
+
         self.context.logger.info("Extracting data")
-        tx_hash = data["params"]["result"]["transactionHash"]
+        tx_hash = log["transactionHash"]
         no_args = True
         limit = 0
         while no_args and limit < 10:
@@ -127,6 +149,20 @@ class WebSocketHandler(BaseWebSocketHandler):
             self.context.shared_state[JOB_QUEUE].append(event_args)
             self.context.logger.info(f"Added job to queue: {event_args}")
 
+    def _remove_job(self, log: Dict[str, Any]) -> None:
+        """Remove the job of a Request log from the queue, if it has not been picked up yet."""
+        if log["topics"][0] not in self.request_topics:
+            return
+        # the request id is the first non-indexed argument of all the variants of the event
+        request_id = int(log["data"][2:66], 16)
+        self.context.logger.info(f"Request {request_id} has been removed by a reorg.")
+        queue = self.context.shared_state[JOB_QUEUE]
+        if isinstance(queue, list):
+            queue[:] = [job for job in queue if job.get("requestId") != request_id]
+        else:
+            # the queue is the scheduler of the pending tasks, keyed by request id
+            queue.remove(request_id)
+
     def _get_tx_args(self, tx_hash: str) -> Any:
         """Get the transaction arguments."""
         try:
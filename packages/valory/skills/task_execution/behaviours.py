@@ -19,12 +19,11 @@
 
 """This package contains the implementation of ."""
 import json
-import threading
+import os
 import time
-from asyncio import Future
-from concurrent.futures import ProcessPoolExecutor
-from concurrent.futures.process import BrokenProcessPool
-from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, cast
 
 from aea.helpers.cid import to_v1
 from aea.mail.base import EnvelopeContext
@@ -55,17 +54,28 @@ from packages.valory.skills.task_execution.utils.benchmarks import TokenCounterC
 from packages.valory.skills.task_execution.utils.cost_calculation import (
     get_cost_for_done_task,
 )
+from packages.valory.skills.task_execution.utils.done_tasks import DoneTaskStore
+from packages.valory.skills.task_execution.utils.event_store import EventStore
 from packages.valory.skills.task_execution.utils.ipfs import (
     ComponentPackageLoader,
     get_ipfs_file_hash,
     to_multihash,
 )
+from packages.valory.skills.task_execution.utils.journal import TaskJournal
+from packages.valory.skills.task_execution.utils.model_registry import preload_models
+from packages.valory.skills.task_execution.utils.request_index import RequestIndex
+from packages.valory.skills.task_execution.utils.result_cache import (
+    ResultCache,
+    get_cache_key,
+)
+from packages.valory.skills.task_execution.utils.scheduler import TaskScheduler
 from packages.valory.skills.task_execution.utils.task import AnyToolAsTask
+from packages.valory.skills.task_execution.utils.tool_cache import ToolCache
+from packages.valory.skills.task_execution.utils.worker_pool import WorkerPool
 
 
 PENDING_TASKS = "pending_tasks"
 DONE_TASKS = "ready_tasks"
-DONE_TASKS_LOCK = "lock"
 GNOSIS_CHAIN = "gnosis"
 
 LEDGER_API_ADDRESS = str(LEDGER_CONNECTION_PUBLIC_ID)
@@ -77,17 +87,40 @@ class TaskExecutionBehaviour(SimpleBehaviour):
     def __init__(self, **kwargs: Any):
         """Initialise the agent."""
         super().__init__(**kwargs)
-        # we only want to execute one task at a time, for the time being
-        self._executor = ProcessPoolExecutor(max_workers=1)
-        self._executing_task: Optional[Dict[str, Any]] = None
+        self._executor: Optional[WorkerPool] = None
+        # maps the request id to the task being executed
+        self._executing_tasks: Dict[int, Dict[str, Any]] = {}
+        self._async_results: Dict[int, Future] = {}
+        self._invalid_requests: Set[int] = set()
         self._tools_to_file_hash: Dict[str, str] = {}
         self._all_tools: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
-        self._inflight_tool_req: Optional[str] = None
-        self._done_task: Optional[Dict[str, Any]] = None
+        # the file hashes of the tool packages being downloaded
+        self._inflight_tool_reqs: Set[str] = set()
+        self._tool_cache: Optional[ToolCache] = None
         self._last_polling: Optional[float] = None
-        self._invalid_request = False
-        self._async_result: Optional[Future] = None
+        # the nonces of the polling requests in flight
+        self._polling_reqs: Set[str] = set()
+        # the request ids of the tasks whose data is being fetched from IPFS
+        self._fetching_tasks: Set[int] = set()
+        # the valid data of the pending tasks, fetched ahead of their execution
+        self._prefetched_tasks: Dict[int, Dict[str, Any]] = {}
+        # the new tasks whose data is being fetched, so that they are pushed in the lane of their tool
+        self._arriving_tasks: Dict[int, Dict[str, Any]] = {}
+        self._result_cache: Optional[ResultCache] = None
         self._keychain: Optional[KeyChain] = None
+        self._journal: Optional[TaskJournal] = None
+        self._event_store: Optional[EventStore] = None
+        self._request_index: Optional[RequestIndex] = None
+        # the version of the index of the requests which has been journaled
+        self._journaled_index_version = 0
+        # the request ids of the done tasks which have not been delivered yet
+        self._undelivered_tasks: Set[int] = set()
+        # maps the request id to the number of failed attempts to store the result of the task
+        self._store_attempts: Dict[int, int] = {}
+        # maps the request id to the time of the next attempt to store the result of the task
+        self._store_retries: Dict[
+            int, Tuple[float, Dict[str, Any], Dict[str, Any]]
+        ] = {}
 
     def setup(self) -> None:
         """Implement the setup."""
@@ -98,18 +131,40 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             for value in values
         }
         self._keychain = KeyChain(self.params.api_keys)
+        self._event_store = EventStore(self.params.confirmation_depth)
+        self._request_index = RequestIndex(self.params.from_block_range)
+        if self.params.result_cache_size > 0:
+            self._result_cache = ResultCache(self.params.result_cache_size)
+        if self.params.tools_cache_dir is not None:
+            self._tool_cache = ToolCache(
+                os.path.join(self.context.data_dir, self.params.tools_cache_dir)
+            )
+            self._load_cached_tools()
+        if self.params.task_journal_path is not None:
+            self._journal = TaskJournal(
+                os.path.join(self.context.data_dir, self.params.task_journal_path)
+            )
+            self._restore_from_journal()
+        self._executor = self._create_executor()
+        if self._all_tools_loaded and self.params.preload_models:
+            self._start_workers()
+
+    def teardown(self) -> None:
+        """Implement the task teardown."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._journal is not None:
+            self._journal.close()
 
     def act(self) -> None:
         """Implement the act."""
+        self._journal_delivered_tasks()
+        self._retry_store_task_results()
         self._download_tools()
         self._execute_task()
+        self._prefetch_tasks()
         self._check_for_new_reqs()
 
-    @property
-    def done_tasks_lock(self) -> threading.Lock:
-        """Get done_tasks_lock."""
-        return self.context.shared_state[DONE_TASKS_LOCK]
-
     @property
     def params(self) -> Params:
         """Get the parameters."""
@@ -123,86 +178,225 @@ class TaskExecutionBehaviour(SimpleBehaviour):
     def count_timeout(self, request_id: int) -> None:
         """Increase the timeout for a request."""
         self.request_id_to_num_timeouts[request_id] += 1
+        if self._journal is not None:
+            self._journal.record_timeout(
+                request_id, self.request_id_to_num_timeouts[request_id]
+            )
 
     def timeout_limit_reached(self, request_id: int) -> bool:
         """Check if the timeout limit has been reached."""
         return self.params.timeout_limit <= self.request_id_to_num_timeouts[request_id]
 
     @property
-    def pending_tasks(self) -> List[Dict[str, Any]]:
+    def event_store(self) -> EventStore:
+        """Get the store of the events of the mechs."""
+        return cast(EventStore, self._event_store)
+
+    @property
+    def request_index(self) -> RequestIndex:
+        """Get the index of the undelivered mech requests."""
+        return cast(RequestIndex, self._request_index)
+
+    @property
+    def pending_tasks(self) -> TaskScheduler:
         """Get pending_tasks."""
         return self.context.shared_state[PENDING_TASKS]
 
     @property
-    def done_tasks(self) -> List[Dict[str, Any]]:
+    def done_tasks(self) -> DoneTaskStore:
         """Get done_tasks."""
         return self.context.shared_state[DONE_TASKS]
 
+    def _restore_from_journal(self) -> None:
+        """Resume from the state recorded in the journal, before the agent was stopped."""
+        state = cast(TaskJournal, self._journal).load()
+        if state.from_block is not None:
+            # no need to rescan the past blocks, the requests are in the journal
+            self.params.from_block = state.from_block
+        self.event_store.final_block = state.final_block
+        self.event_store.final_hash = state.final_hash
+        if state.request_index is not None:
+            self.request_index.restore(state.request_index)
+            self._journaled_index_version = self.request_index.version
+        self.request_id_to_num_timeouts.update(state.timeouts)
+        for task in state.pending.values():
+            self._schedule_new_task(task)
+        # the results of these tasks are already stored on IPFS, they only need to be delivered
+        self.done_tasks.extend(state.stored.values())
+        self._undelivered_tasks = set(state.stored)
+        self.context.logger.info(
+            f"Restored {len(state.pending)} pending and {len(state.stored)} undelivered tasks "
+            f"from the journal, monitoring new reqs from block {self.params.from_block}."
+        )
+
+    def _journal_delivered_tasks(self) -> None:
+        """Record the done tasks which have been removed from the shared state, i.e., delivered."""
+        if self._journal is None or not self._undelivered_tasks:
+            return
+        undelivered = {task["request_id"] for task in self.done_tasks.snapshot()}
+        for req_id in self._undelivered_tasks - undelivered:
+            self._journal.record_delivered(req_id)
+        self._undelivered_tasks &= undelivered
+
+    def _set_from_block(self, from_block: int) -> None:
+        """Set the block from which to monitor for new requests."""
+        self.params.from_block = from_block
+        if self._journal is not None:
+            self._journal.record_from_block(from_block)
+
     def _should_poll(self) -> bool:
         """If we should poll the contract."""
         if self._last_polling is None:
             return True
         return self._last_polling + self.params.polling_interval <= time.time()
 
-    def _is_executing_task_ready(self) -> bool:
+    def _is_executing_task_ready(self, req_id: int) -> bool:
         """Check if the executing task is ready."""
-        if self._executing_task is None or self._async_result is None:
+        async_result = self._async_results.get(req_id, None)
+        if async_result is None:
             return False
-        return self._async_result.done()
+        return async_result.done()
 
-    def _has_executing_task_timed_out(self) -> bool:
+    def _has_executing_task_timed_out(self, req_id: int) -> bool:
         """Check if the executing task timed out."""
-        if self._executing_task is None:
-            return False
-        timeout_deadline = self._executing_task.get("timeout_deadline", None)
+        timeout_deadline = self._executing_tasks[req_id].get("timeout_deadline", None)
         if timeout_deadline is None:
             return False
         return timeout_deadline <= time.time()
 
-    def _get_executing_task_result(self) -> Any:
+    def _get_executing_task_result(self, req_id: int) -> Any:
         """Get the executing task result."""
-        if self._executing_task is None:
-            raise ValueError("Executing task is None")
-        if self._invalid_request:
+        if req_id in self._invalid_requests:
             return None
         try:
-            async_result = cast(Future, self._async_result)
-            return async_result.result()
+            async_result = self._async_results[req_id]
+            task_result = async_result.result()
         except Exception as e:  # pylint: disable=broad-except
             self.context.logger.error(
                 "Exception raised while executing task: {}".format(str(e))
             )
             return None
+        if self.params.warm_tool_workers:
+            task_result, load_stats = task_result
+            self._log_worker_stats(req_id, load_stats)
+        return task_result
+
+    def _log_worker_stats(self, req_id: int, load_stats: Dict[str, Any]) -> None:
+        """Log the load statistics reported by a warm worker, including its totals."""
+        pid = load_stats["pid"]
+        start_type = "warm" if load_stats["is_warm"] else "cold"
+        self.context.logger.info(
+            f"Tool for request {req_id} was loaded ({start_type} start) by worker {pid} "
+            f"in {load_stats['load_time']:.3f}s. Worker totals: "
+            f"{load_stats['cold_starts']} cold starts in {load_stats['cold_start_time']:.3f}s, "
+            f"{load_stats['warm_starts']} warm starts in {load_stats['warm_start_time']:.3f}s."
+        )
 
     def _download_tools(self) -> None:
-        """Download tools."""
-        if self._inflight_tool_req is not None:
-            # there already is a req in flight
+        """Download the tools that are neither loaded nor being downloaded, all at once."""
+        if self._all_tools_loaded:
             return
-        if len(self._tools_to_file_hash) == len(self._all_tools):
-            # we already have all the tools
-            return
-        for tool, file_hash in self._tools_to_file_hash.items():
-            if tool in self._all_tools:
+        for file_hash, tools in self.params.file_hash_to_tools.items():
+            if file_hash in self._inflight_tool_reqs:
+                continue
+            if all(tool in self._all_tools for tool in tools):
                 continue
-            # read one at a time
             ipfs_msg, message = self._build_ipfs_get_file_req(file_hash)
-            self._inflight_tool_req = tool
-            self.send_message(ipfs_msg, message, self._handle_get_tool)
-            return
+            self._inflight_tool_reqs.add(file_hash)
+            self.send_message(
+                ipfs_msg,
+                message,
+                partial(self._handle_get_tool, file_hash),
+                partial(self._handle_get_tool_error, file_hash),
+            )
 
-    def _handle_get_tool(self, message: IpfsMessage, dialogue: Dialogue) -> None:
+    def _handle_get_tool(
+        self, file_hash: str, message: IpfsMessage, dialogue: Dialogue
+    ) -> None:
         """Handle get tool response"""
-        component_yaml, tool_py, callable_method = ComponentPackageLoader.load(
-            message.files
+        self._inflight_tool_reqs.discard(file_hash)
+        if self._tool_cache is not None:
+            try:
+                self._tool_cache.put(file_hash, message.files)
+            except (OSError, ValueError) as e:
+                self.context.logger.warning(
+                    f"Could not cache the tool package {file_hash}: {e}"
+                )
+        self._add_tool_package(file_hash, message.files)
+        if self._executor is not None and self._all_tools_loaded:
+            self._on_all_tools_loaded()
+
+    def _handle_get_tool_error(
+        self, file_hash: str, message: IpfsMessage, dialogue: Dialogue
+    ) -> None:
+        """Handle an error while downloading a tool; it is requested again on the next act."""
+        self.context.logger.warning(f"Could not download the tool package {file_hash}.")
+        self._inflight_tool_reqs.discard(file_hash)
+
+    def _load_cached_tools(self) -> None:
+        """Load the tools that are already present in the tool cache."""
+        if self._tool_cache is None:
+            return
+        for file_hash in self.params.file_hash_to_tools:
+            files = self._tool_cache.get(file_hash)
+            if files is None:
+                continue
+            try:
+                self._add_tool_package(file_hash, files)
+            except ValueError as e:
+                self.context.logger.warning(
+                    f"Invalid cached tool package {file_hash}, it will be downloaded again: {e}"
+                )
+                continue
+            self.context.logger.info(f"Loaded tool package {file_hash} from the cache.")
+
+    def _add_tool_package(self, file_hash: str, files: Dict[str, str]) -> None:
+        """Add the tools of a package."""
+        component_yaml, tool_py, callable_method = ComponentPackageLoader.load(files)
+        for tool in self.params.file_hash_to_tools[file_hash]:
+            self._all_tools[tool] = tool_py, callable_method, component_yaml
+
+    @property
+    def _all_tools_loaded(self) -> bool:
+        """Whether all the tools have been loaded."""
+        return len(self._tools_to_file_hash) == len(self._all_tools)
+
+    def _on_all_tools_loaded(self) -> None:
+        """Handle all the tools being loaded."""
+        self.context.logger.info("All the tools have been loaded.")
+        if self.params.preload_models:
+            # all the tools are known, restart the workers so that they preload their models
+            self._restart_executor()
+            self._start_workers()
+
+    def _get_model_specs(self) -> List[Dict[str, str]]:
+        """Get the models required by the downloaded tools, as declared in their component.yaml."""
+        model_specs: List[Dict[str, str]] = []
+        for *_, component_yaml in self._all_tools.values():
+            for spec in component_yaml.get("models", []):
+                if spec not in model_specs:
+                    model_specs.append(spec)
+        return model_specs
+
+    def _create_executor(self) -> WorkerPool:
+        """Create an executor, whose workers preload the models of the tools if configured to."""
+        model_specs = self._get_model_specs() if self.params.preload_models else []
+        if not model_specs:
+            return WorkerPool(max_workers=self.params.max_workers)
+        self.context.logger.info(f"Workers will preload the models: {model_specs}")
+        return WorkerPool(
+            max_workers=self.params.max_workers,
+            initializer=preload_models,
+            initargs=(model_specs,),
         )
-        tool_req = cast(str, self._inflight_tool_req)
-        self._all_tools[tool_req] = tool_py, callable_method, component_yaml
-        self._inflight_tool_req = None
+
+    def _start_workers(self) -> None:
+        """Start all the workers of the executor, instead of waiting for the first tasks to do so."""
+        cast(WorkerPool, self._executor).start()
 
     def _populate_from_block(self) -> None:
         """Populate from_block"""
-        ledger_api_msg, _ = self.context.ledger_dialogues.create(
+        ledger_api_msg, dialogue = self.context.ledger_dialogues.create(
             performative=LedgerApiMessage.Performative.GET_STATE,
             callable="get_block",
             kwargs=LedgerApiMessage.Kwargs(dict(block_identifier="latest")),
@@ -210,13 +404,18 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             ledger_id=self.context.default_ledger_id,
             args=(),
         )
-        self.context.outbox.put_message(message=ledger_api_msg)
-        self.params.in_flight_req = True
+        self._send_polling_message(ledger_api_msg, dialogue, self._handle_get_block)
+
+    def _handle_get_block(self, message: LedgerApiMessage, dialogue: Dialogue) -> None:
+        """Handle the latest block, from which to start monitoring for requests."""
+        self._polling_reqs.discard(dialogue.dialogue_label.dialogue_reference[0])
+        block_number = message.state.body["number"]
+        self._set_from_block(block_number - self.params.from_block_range)
 
     def _check_for_new_reqs(self) -> None:
         """Check for new reqs."""
-        if self.params.in_flight_req or not self._should_poll():
-            # do nothing if there is an in flight request
+        if self._polling_reqs or not self._should_poll():
+            # do nothing if there is a polling request in flight
             # or if we should not poll yet
             return
 
@@ -224,11 +423,133 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             # set the initial from block
             self._populate_from_block()
             return
+        if self.event_store.final_block is None:
+            self.event_store.final_block = self.params.from_block - 1
         self._check_undelivered_reqs()
         self._check_undelivered_reqs_marketplace()
-        self.params.in_flight_req = True
         self._last_polling = time.time()
 
+    def _send_polling_message(
+        self, msg: Message, dialogue: Dialogue, callback: Callable
+    ) -> None:
+        """Send a polling request, which is tracked until it gets a response."""
+        self._polling_reqs.add(dialogue.dialogue_label.dialogue_reference[0])
+        self.send_message(msg, dialogue, callback, self._handle_polling_error)
+
+    def _handle_polling_error(self, message: Message, dialogue: Dialogue) -> None:
+        """Handle a failed polling request; polling is retried on the next interval."""
+        self._polling_reqs.discard(dialogue.dialogue_label.dialogue_reference[0])
+
+    def _handle_undelivered_reqs(
+        self, message: ContractApiMessage, dialogue: Dialogue
+    ) -> None:
+        """Handle get undelivered reqs."""
+        self._polling_reqs.discard(dialogue.dialogue_label.dialogue_reference[0])
+        reqs = message.state.body.get("data", [])
+        if len(reqs) == 0:
+            return
+
+        # the responses of the mech and the marketplace polls may arrive in any order
+        from_block = max(
+            cast(int, self.params.from_block),
+            max([req["block_number"] for req in reqs]) + 1,
+        )
+        self._push_new_reqs(reqs)
+        # the requests are journaled before the block, so that none is skipped on restart
+        self._set_from_block(from_block)
+        self.context.logger.info(
+            f"Monitoring new reqs from block {self.params.from_block}"
+        )
+
+    def _push_new_reqs(self, reqs: List[Dict[str, Any]]) -> None:
+        """Push the new requests that are assigned to this agent to the pending tasks."""
+        self.context.logger.info(f"Received {len(reqs)} new requests.")
+        reqs = [
+            req
+            for req in reqs
+            if req["block_number"] % self.params.num_agents == self.params.agent_index
+        ]
+        self.context.logger.info(f"Processing only {len(reqs)} of the new requests.")
+        done_req_ids = {task["request_id"] for task in self.done_tasks.snapshot()}
+        for req in reqs:
+            req_id = req["requestId"]
+            if (
+                req_id in self._executing_tasks
+                or req_id in done_req_ids
+                or req_id in self.pending_tasks
+                or req_id in self._arriving_tasks
+            ):
+                continue
+            if self._journal is not None:
+                self._journal.record_pending(req_id, req)
+            self._schedule_new_task(req)
+
+    def _schedule_new_task(self, req: Dict[str, Any]) -> None:
+        """Fetch the data of a new task, so that it is pushed in the lane of its tool."""
+        self._arriving_tasks[req["requestId"]] = req
+        self._fetch_task(req)
+
+    def _handle_request_events(
+        self, message: ContractApiMessage, dialogue: Dialogue
+    ) -> None:
+        """Handle the Request and Deliver events of the mechs since the last final block."""
+        self._polling_reqs.discard(dialogue.dialogue_label.dialogue_reference[0])
+        body = message.state.body
+        delta = self.event_store.apply(body)
+        if delta is None:
+            self.context.logger.warning(
+                f"Discarded the events of blocks {body['from_block']}-{body['to_block']}, "
+                f"scanning again from block {self.event_store.cursor}."
+            )
+            return
+        self.request_index.revert(delta.reverted_requests)
+        for req in delta.reverted_requests:
+            self.context.logger.info(
+                f"Request {req['requestId']} has been removed by a reorg."
+            )
+            self._drop_pending_task(req["requestId"])
+        reopened_reqs = self.request_index.reopen(delta.reverted_delivers)
+        for deliver in delta.reverted_delivers:
+            self.context.logger.warning(
+                f"The delivery of request {deliver['requestId']} has been removed by a reorg."
+            )
+        if len(reopened_reqs) < len(delta.reverted_delivers):
+            self.context.logger.warning(
+                f"Only {len(reopened_reqs)} of the {len(delta.reverted_delivers)} requests "
+                "whose delivery has been removed are known, the rest of them are not queued again."
+            )
+        reqs = reopened_reqs + self.request_index.apply(
+            delta.requests, delta.delivers, body["to_block"]
+        )
+        for deliver in delta.delivers:
+            # the request has been delivered by someone else before being executed
+            if self._drop_pending_task(deliver["requestId"]):
+                self.context.logger.info(
+                    f"Request {deliver['requestId']} is already delivered."
+                )
+        if reqs:
+            self._push_new_reqs(reqs)
+        if self._journal is not None:
+            # the requests are journaled before the final block, so that none is skipped on restart
+            if self.request_index.version != self._journaled_index_version:
+                self._journal.record_request_index(self.request_index.snapshot())
+                self._journaled_index_version = self.request_index.version
+            self._journal.record_final_block(
+                cast(int, self.event_store.final_block), self.event_store.final_hash
+            )
+
+    def _drop_pending_task(self, req_id: int) -> bool:
+        """Drop a task that no longer needs to be executed, if it is pending."""
+        if (
+            self.pending_tasks.remove(req_id) is None
+            and self._arriving_tasks.pop(req_id, None) is None
+        ):
+            return False
+        self._prefetched_tasks.pop(req_id, None)
+        if self._journal is not None:
+            self._journal.record_delivered(req_id)
+        return True
+
     def _check_undelivered_reqs(self) -> None:
         """Check for undelivered mech reqs."""
         target_mechs = [
@@ -236,29 +557,34 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             for mech, config in self.params.mech_to_config.items()
             if not config.is_marketplace_mech
         ]
-        contract_api_msg, _ = self.context.contract_dialogues.create(
+        contract_api_msg, dialogue = self.context.contract_dialogues.create(
             performative=ContractApiMessage.Performative.GET_STATE,
             contract_address=self.params.agent_mech_contract_addresses[0],
             contract_id=str(AgentMechContract.contract_id),
-            callable="get_multiple_undelivered_reqs",
+            callable="get_events_from_block",
             kwargs=ContractApiMessage.Kwargs(
                 dict(
-                    from_block=self.params.from_block,
+                    from_block=self.event_store.cursor,
                     chain_id=GNOSIS_CHAIN,
                     contract_addresses=target_mechs,
                     max_block_window=self.params.max_block_window,
+                    confirmation_depth=self.params.confirmation_depth,
+                    rpc_urls=self.params.rpc_urls,
+                    rpc_rate_limit=self.params.rpc_rate_limit,
                 )
             ),
             counterparty=LEDGER_API_ADDRESS,
             ledger_id=self.context.default_ledger_id,
         )
-        self.context.outbox.put_message(message=contract_api_msg)
+        self._send_polling_message(
+            contract_api_msg, dialogue, self._handle_request_events
+        )
 
     def _check_undelivered_reqs_marketplace(self) -> None:
         """Check for undelivered mech reqs."""
         if not self.params.use_mech_marketplace:
             return
-        contract_api_msg, _ = self.context.contract_dialogues.create(
+        contract_api_msg, dialogue = self.context.contract_dialogues.create(
             performative=ContractApiMessage.Performative.GET_STATE,
             contract_address=self.params.mech_marketplace_address,
             contract_id=str(MechMarketplaceContract.contract_id),
@@ -269,50 +595,102 @@ class TaskExecutionBehaviour(SimpleBehaviour):
                     my_mech=self._get_designated_marketplace_mech_address(),
                     chain_id=GNOSIS_CHAIN,
                     max_block_window=self.params.max_block_window,
+                    rpc_urls=self.params.rpc_urls,
+                    rpc_rate_limit=self.params.rpc_rate_limit,
                 )
             ),
             counterparty=LEDGER_API_ADDRESS,
             ledger_id=self.context.default_ledger_id,
         )
-        self.context.outbox.put_message(message=contract_api_msg)
+        self._send_polling_message(
+            contract_api_msg, dialogue, self._handle_undelivered_reqs
+        )
 
     def _execute_task(self) -> None:
         """Execute tasks."""
-        # check if there is a task already executing
-        if self.params.in_flight_req:
-            # there is an in flight request
-            return
+        # collect the results of the workers, replacing the ones that died
+        cast(WorkerPool, self._executor).poll()
 
-        if self._executing_task is not None:
-            if self._is_executing_task_ready() or self._invalid_request:
-                task_result = self._get_executing_task_result()
-                self._handle_done_task(task_result)
-            elif self._has_executing_task_timed_out():
-                self._handle_timeout_task()
-            return
+        # check the tasks that are already executing
+        for req_id in list(self._executing_tasks.keys()):
+            if self._executing_tasks[req_id].get("is_storing", False):
+                # the result of the task is being stored
+                continue
+            if (
+                self._is_executing_task_ready(req_id)
+                or req_id in self._invalid_requests
+            ):
+                task_result = self._get_executing_task_result(req_id)
+                self._cache_task_result(req_id, task_result)
+                self._handle_done_task(req_id, task_result)
+            elif self._has_executing_task_timed_out(req_id):
+                self._handle_timeout_task(req_id)
 
-        if len(self.pending_tasks) == 0:
-            # not tasks (requests) to execute
+        if not self._all_tools_loaded:
+            # the tools are still being downloaded
             return
 
-        # create new task
-        task_data = self.pending_tasks.pop(0)
-        self.context.logger.info(f"Preparing task with data: {task_data}")
-        self._executing_task = task_data
+        # create new tasks, while there are free workers
+        while (
+            self._num_running_tasks < self.params.max_workers
+            and len(self.pending_tasks) > 0
+        ):
+            task_data = self.pending_tasks.pop()
+            req_id = task_data["requestId"]
+            self.context.logger.info(f"Preparing task with data: {task_data}")
+            self._executing_tasks[req_id] = task_data
+            if req_id in self._prefetched_tasks:
+                self._process_task_data(req_id, self._prefetched_tasks.pop(req_id))
+            elif req_id not in self._fetching_tasks:
+                self._fetch_task(task_data)
+            # otherwise, the task is processed as soon as its data is prefetched
+
+    @property
+    def _num_running_tasks(self) -> int:
+        """Get the number of tasks occupying a worker, or about to."""
+        return sum(
+            1
+            for req_id, task in self._executing_tasks.items()
+            if not task.get("is_storing", False)
+            and req_id not in self._invalid_requests
+        )
+
+    def _prefetch_tasks(self) -> None:
+        """Fetch the data of the next pending tasks, while the current ones are executing."""
+        for task_data in self.pending_tasks.peek(self.params.prefetch_size):
+            req_id = task_data["requestId"]
+            if req_id in self._fetching_tasks or req_id in self._prefetched_tasks:
+                continue
+            self._fetch_task(task_data)
+
+    def _fetch_task(self, task_data: Dict[str, Any]) -> None:
+        """Fetch the data of a task from IPFS."""
+        req_id = task_data["requestId"]
+        self._fetching_tasks.add(req_id)
         task_data_ = task_data["data"]
         ipfs_hash = get_ipfs_file_hash(task_data_)
-        self.context.logger.info(f"IPFS hash: {ipfs_hash}")
+        self.context.logger.info(f"IPFS hash for request {req_id}: {ipfs_hash}")
         ipfs_msg, message = self._build_ipfs_get_file_req(ipfs_hash)
-        self.send_message(ipfs_msg, message, self._handle_get_task)
+        self.send_message(
+            ipfs_msg,
+            message,
+            partial(self._handle_get_task, req_id),
+            partial(self._handle_get_task_error, req_id),
+        )
 
     def send_message(
-        self, msg: Message, dialogue: Dialogue, callback: Callable
+        self,
+        msg: Message,
+        dialogue: Dialogue,
+        callback: Callable,
+        error_callback: Optional[Callable] = None,
     ) -> None:
         """Send message."""
         self.context.outbox.put_message(message=msg)
         nonce = dialogue.dialogue_label.dialogue_reference[0]
         self.params.req_to_callback[nonce] = callback
-        self.params.in_flight_req = True
+        if error_callback is not None:
+            self.params.req_to_error_callback[nonce] = error_callback
 
     def _get_designated_marketplace_mech_address(self) -> str:
         """Get the designated mech address."""
@@ -322,10 +700,10 @@ class TaskExecutionBehaviour(SimpleBehaviour):
 
         raise ValueError("No marketplace mech address found")
 
-    def _handle_done_task(self, task_result: Any) -> None:
+    def _handle_done_task(self, req_id: int, task_result: Any) -> None:
         """Handle done tasks"""
-        executing_task = cast(Dict[str, Any], self._executing_task)
-        req_id = executing_task.get("requestId", None)
+        executing_task = self._executing_tasks[req_id]
+        executing_task["is_storing"] = True
         request_id_nonce = executing_task.get("requestIdWithNonce", None)
         mech_address = (
             executing_task.get("contract_address", None)
@@ -336,7 +714,7 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         tool_params = executing_task.get("params", None)
         response = {"requestId": req_id, "result": "Invalid response"}
         task_executor = self.context.agent_address
-        self._done_task = {
+        done_task = {
             "request_id": req_id,
             "mech_address": mech_address,
             "task_executor_address": task_executor,
@@ -361,48 +739,55 @@ class TaskExecutionBehaviour(SimpleBehaviour):
                 "cost_dict": cost_dict,
                 "metadata": metadata,
             }
-            self._done_task["transaction"] = transaction
+            done_task["transaction"] = transaction
 
             # update the keychain, it's possible that rotations happened
             # we want to use the most up-to-date key priority
             self._keychain = keychain
 
         self.context.logger.info(f"Task result for request {req_id}: {task_result}")
+        self._store_task_result(req_id, response, done_task)
+
+    def _store_task_result(
+        self, req_id: int, response: Dict[str, Any], done_task: Dict[str, Any]
+    ) -> None:
+        """Store the result of a task on IPFS."""
         msg, dialogue = self._build_ipfs_store_file_req(
             {str(req_id): json.dumps(response)}
         )
-        self.send_message(msg, dialogue, self._handle_store_response)
+        self.send_message(
+            msg,
+            dialogue,
+            partial(self._handle_store_response, req_id, done_task),
+            partial(self._handle_store_error, req_id, response, done_task),
+        )
 
     def _restart_executor(self) -> None:
         """Restarts the executor."""
-        self._executor.shutdown(wait=False)
+        cast(WorkerPool, self._executor).shutdown()
         # create a new executor
-        self._executor = ProcessPoolExecutor(max_workers=1)
+        self._executor = self._create_executor()
 
-    def _handle_timeout_task(self) -> None:
+    def _handle_timeout_task(self, req_id: int) -> None:
         """Handle timeout tasks"""
-        executing_task = cast(Dict[str, Any], self._executing_task)
-        req_id = executing_task.get("requestId", None)
+        executing_task = self._executing_tasks[req_id]
         self.count_timeout(req_id)
         self.context.logger.info(f"Task timed out for request {req_id}")
         self.context.logger.info(
             f"Task {req_id} has timed out {self.request_id_to_num_timeouts[req_id]} times"
         )
-        async_result = cast(Future, self._async_result)
-        async_result.cancel()
-
-        # we restart the executor in case of a timeout.
-        # we do this because its possible the .cancel() call above is not respected
-        # by the executor. Since we only have 1 process running at a time, this would
-        # mean that the task being executed next would be queued. We want to avoid this.
-        self._restart_executor()
+        async_result = self._async_results.pop(req_id)
+        if cast(WorkerPool, self._executor).cancel(async_result):
+            # the task was running, only the worker executing it has been replaced
+            self.context.logger.info(f"Killed the worker executing task {req_id}")
 
         # check if we can add the task to the end of the queue
         if not self.timeout_limit_reached(req_id):
-            # added to end of queue
-            self.context.logger.info(f"Adding task {req_id} to the end of the queue")
-            self.pending_tasks.append(executing_task)
-            self._executing_task = None
+            # reschedule the task, it keeps its priority and deadline
+            self.context.logger.info(f"Rescheduling task {req_id}")
+            executing_task.pop("timeout_deadline", None)
+            self.pending_tasks.push(executing_task)
+            del self._executing_tasks[req_id]
             return None
 
         self.context.logger.info(
@@ -415,11 +800,55 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             None,
             None,
         )
-        self._handle_done_task(task_result)
+        self._handle_done_task(req_id, task_result)
 
-    def _handle_get_task(self, message: IpfsMessage, dialogue: Dialogue) -> None:
+    def _handle_get_task(
+        self, req_id: int, message: IpfsMessage, dialogue: Dialogue
+    ) -> None:
         """Handle the response from ipfs for a task request."""
-        task_data = [json.loads(content) for content in message.files.values()][0]
+        self._fetching_tasks.discard(req_id)
+        try:
+            task_data = [json.loads(content) for content in message.files.values()][0]
+        except (json.JSONDecodeError, IndexError):
+            task_data = None
+
+        is_data_valid = self._is_task_data_valid(task_data)
+        arriving_task = self._arriving_tasks.pop(req_id, None)
+        if arriving_task is not None:
+            # schedule the task fairly among the tasks of its tool; the invalid ones are rejected below
+            lane = task_data["tool"] if is_data_valid else None
+            self.pending_tasks.push(arriving_task, lane)
+
+        if req_id in self._executing_tasks:
+            self._process_task_data(req_id, task_data)
+        elif req_id not in self.pending_tasks:
+            # the task has been dropped meanwhile, e.g., it has been delivered by someone else
+            return
+        elif is_data_valid:
+            self._prefetched_tasks[req_id] = task_data
+            # now that the tool of the task is known, schedule it fairly among the tool's tasks
+            self.pending_tasks.set_lane(req_id, task_data["tool"])
+        else:
+            # reject the task early, without waiting for a free worker
+            self._reject_pending_task(req_id, task_data)
+
+    def _is_task_data_valid(self, task_data: Any) -> bool:
+        """Check whether the data of a task are valid and refer to a known tool."""
+        return (
+            isinstance(task_data, dict)
+            and "prompt" in task_data
+            and task_data.get("tool", None) in self._tools_to_file_hash
+        )
+
+    def _reject_pending_task(self, req_id: int, task_data: Any) -> None:
+        """Reject a pending task whose data are invalid."""
+        pending_task = self.pending_tasks.remove(req_id)
+        if pending_task is not None:
+            self._executing_tasks[req_id] = pending_task
+            self._process_task_data(req_id, task_data)
+
+    def _process_task_data(self, req_id: int, task_data: Any) -> None:
+        """Process the data of an executing task, submitting it if they are valid."""
         is_data_valid = (
             task_data
             and isinstance(task_data, dict)
@@ -427,49 +856,96 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             and "tool" in task_data
         )  # pylint: disable=C0301
         if is_data_valid and task_data["tool"] in self._tools_to_file_hash:
-            self._prepare_task(task_data)
+            self._prepare_task(req_id, task_data)
         elif is_data_valid:
             tool = task_data["tool"]
-            executing_task = cast(Dict[str, Any], self._executing_task)
-            executing_task["tool"] = tool
+            self._executing_tasks[req_id]["tool"] = tool
             self.context.logger.warning(f"Tool {tool} is not valid.")
-            self._invalid_request = True
+            self._invalid_requests.add(req_id)
         else:
             self.context.logger.warning("Data for task is not valid.")
-            self._invalid_request = True
+            self._invalid_requests.add(req_id)
+
+    def _handle_get_task_error(
+        self, req_id: int, message: IpfsMessage, dialogue: Dialogue
+    ) -> None:
+        """Handle an error while fetching the data of a task."""
+        self.context.logger.warning(f"Could not fetch the data of task {req_id}.")
+        self._fetching_tasks.discard(req_id)
+        arriving_task = self._arriving_tasks.pop(req_id, None)
+        if arriving_task is not None:
+            # schedule the task without its tool, its data are fetched again when it is executed
+            self.pending_tasks.push(arriving_task)
+            return
+        if req_id not in self._executing_tasks:
+            # the task was being prefetched, it is fetched again when it is executed
+            return
+        self.count_timeout(req_id)
+        if self.timeout_limit_reached(req_id):
+            self._invalid_requests.add(req_id)
+            return
+        # reschedule the task, to fetch it again
+        self.pending_tasks.push(self._executing_tasks.pop(req_id))
 
     def _submit_task(self, fn: Any, *args: Any, **kwargs: Any) -> Future:
         """Submit a task."""
-        try:
-            return self._executor.submit(fn, *args, **kwargs)  # type: ignore
-        except BrokenProcessPool:
-            self.context.logger.warning("Executor is broken. Restarting...")
-            # restart the executor
-            self._restart_executor()
-            # try to run the task again
-            return self._executor.submit(fn, *args, **kwargs)  # type: ignore
+        return cast(WorkerPool, self._executor).submit(fn, *args, **kwargs)
 
-    def _prepare_task(self, task_data: Dict[str, Any]) -> None:
+    def _prepare_task(self, req_id: int, task_data: Dict[str, Any]) -> None:
         """Prepare the task."""
         tool_task = AnyToolAsTask()
         tool_py, callable_method, component_yaml = self._all_tools[task_data["tool"]]
         tool_params = component_yaml.get("params", {})
+        model = task_data.get("model", tool_params.get("default_model", None))
+        executing_task = self._executing_tasks[req_id]
+        executing_task["tool"] = task_data["tool"]
+        executing_task["model"] = model
+        executing_task["params"] = tool_params
+        if self._result_cache is not None:
+            tool_hash = self._tools_to_file_hash[task_data["tool"]]
+            cache_key = get_cache_key(tool_hash, model, task_data)
+            cached_result = self._result_cache.get(cache_key)
+            if cached_result is not None:
+                self.context.logger.info(f"Using the cached result for task {req_id}")
+                deliver_msg, prompt, transaction = cached_result
+                # a cached result costs nothing
+                task_result = (
+                    deliver_msg,
+                    prompt,
+                    transaction,
+                    TokenCounterCallback(),
+                    self._keychain,
+                )
+                self._handle_done_task(req_id, task_result)
+                return
+            executing_task["cache_key"] = cache_key
+
         task_data["tool_py"] = tool_py
         task_data["callable_method"] = callable_method
         task_data["api_keys"] = self._keychain
         task_data["counter_callback"] = TokenCounterCallback()
-        task_data["model"] = task_data.get(
-            "model", tool_params.get("default_model", None)
-        )
-        future = self._submit_task(tool_task.execute, **task_data)
-        executing_task = cast(Dict[str, Any], self._executing_task)
+        task_data["model"] = model
+        execute = tool_task.execute
+        if self.params.warm_tool_workers:
+            task_data["tool_hash"] = self._tools_to_file_hash[task_data["tool"]]
+            execute = tool_task.execute_warm
+        future = self._submit_task(execute, **task_data)
         executing_task["timeout_deadline"] = time.time() + self.params.task_deadline
-        executing_task["tool"] = task_data["tool"]
-        executing_task["model"] = task_data.get(
-            "model", tool_params.get("default_model", None)
+        self._async_results[req_id] = future
+
+    def _cache_task_result(self, req_id: int, task_result: Any) -> None:
+        """Cache the result of a task, if it succeeded and the cache is enabled."""
+        cache_key = self._executing_tasks[req_id].get("cache_key", None)
+        if self._result_cache is None or cache_key is None:
+            return
+        if task_result is None or len(task_result) != 5 or task_result[0] is None:
+            return
+        deliver_msg, prompt, transaction, *_ = task_result
+        tool = self._executing_tasks[req_id]["tool"]
+        ttl = self.params.tool_to_result_cache_ttl.get(
+            tool, self.params.result_cache_ttl
         )
-        executing_task["params"] = tool_params
-        self._async_result = cast(Optional[Future], future)
+        self._result_cache.put(cache_key, (deliver_msg, prompt, transaction), ttl)
 
     def _build_ipfs_message(
         self,
@@ -521,13 +997,15 @@ class TaskExecutionBehaviour(SimpleBehaviour):
         )
         return message, dialogue
 
-    def _handle_store_response(self, message: IpfsMessage, dialogue: Dialogue) -> None:
+    def _handle_store_response(
+        self,
+        req_id: int,
+        done_task: Dict[str, Any],
+        message: IpfsMessage,
+        dialogue: Dialogue,
+    ) -> None:
         """Handle the response from ipfs for a store response request."""
-        executing_task = cast(Dict[str, Any], self._executing_task)
-        req_id, sender = (
-            executing_task["requestId"],
-            executing_task["sender"],
-        )
+        sender = self._executing_tasks[req_id]["sender"]
         ipfs_hash = to_v1(message.ipfs_hash)
         self.context.logger.info(
             f"Response for request {req_id} stored on IPFS with hash {ipfs_hash}."
@@ -537,7 +1015,6 @@ class TaskExecutionBehaviour(SimpleBehaviour):
             request_id=str(req_id),
             data=ipfs_hash,
         )
-        done_task = cast(Dict[str, Any], self._done_task)
         task_result = to_multihash(ipfs_hash)
         cost = get_cost_for_done_task(done_task)
         self.context.logger.info(f"Cost for task {req_id}: {cost}")
@@ -550,13 +1027,59 @@ class TaskExecutionBehaviour(SimpleBehaviour):
 
         done_task["is_marketplace_mech"] = mech_config.is_marketplace_mech
         done_task["task_result"] = task_result
+        # the delivers of the most valuable tasks are prioritized when they are split
+        done_task["cost"] = cost
         # add to done tasks, in thread safe way
-        with self.done_tasks_lock:
-            self.done_tasks.append(done_task)
-        # reset tasks
-        self._executing_task = None
-        self._done_task = None
-        self._invalid_request = False
+        self.done_tasks.append(done_task)
+        if self._journal is not None:
+            self._journal.record_stored(req_id, done_task)
+            self._undelivered_tasks.add(req_id)
+        self._reset_task(req_id)
+
+    def _reset_task(self, req_id: int) -> None:
+        """Forget a task which is no longer executing."""
+        del self._executing_tasks[req_id]
+        self._async_results.pop(req_id, None)
+        self._invalid_requests.discard(req_id)
+        self._prefetched_tasks.pop(req_id, None)
+        self._store_attempts.pop(req_id, None)
+
+    def _handle_store_error(  # pylint: disable=too-many-arguments
+        self,
+        req_id: int,
+        response: Dict[str, Any],
+        done_task: Dict[str, Any],
+        message: IpfsMessage,
+        dialogue: Dialogue,
+    ) -> None:
+        """Handle an error while storing the result of a task, by storing it again after a backoff."""
+        attempts = self._store_attempts.get(req_id, 0) + 1
+        self._store_attempts[req_id] = attempts
+        if attempts > self.params.store_retry_limit:
+            # the task stays pending in the journal, if any, so it is executed again on restart
+            self.context.logger.error(
+                f"Could not store the result of task {req_id} after {attempts} attempts. "
+                "Dropping the task."
+            )
+            self._reset_task(req_id)
+            return
+        backoff = self.params.store_retry_backoff * 2 ** (attempts - 1)
+        self.context.logger.warning(
+            f"Could not store the result of task {req_id}. Retrying in {backoff:.1f}s..."
+        )
+        self._store_retries[req_id] = (time.time() + backoff, response, done_task)
+
+    def _retry_store_task_results(self) -> None:
+        """Store again the results of the tasks whose backoff has elapsed."""
+        if not self._store_retries:
+            return
+        now = time.time()
+        for req_id, (retry_at, response, done_task) in list(
+            self._store_retries.items()
+        ):
+            if retry_at <= now:
+                del self._store_retries[req_id]
+                self._store_task_result(req_id, response, done_task)
 
     def send_data_via_acn(
         self,
@@ -18,10 +18,11 @@
 # ------------------------------------------------------------------------------
 
 """This package contains a scaffold of a handler."""
-import threading
-from typing import Any, Dict, List, cast
+import math
+from typing import Any, Dict, Tuple, cast
 
 from aea.protocols.base import Message
+from aea.protocols.dialogue.base import Dialogues
 from aea.skills.base import Handler
 
 from packages.valory.connections.ledger.connection import (
@@ -32,6 +33,8 @@ from packages.valory.protocols.contract_api import ContractApiMessage
 from packages.valory.protocols.ipfs import IpfsMessage
 from packages.valory.protocols.ledger_api import LedgerApiMessage
 from packages.valory.skills.task_execution.models import Params
+from packages.valory.skills.task_execution.utils.done_tasks import DoneTaskStore
+from packages.valory.skills.task_execution.utils.scheduler import TaskScheduler
 
 
 PENDING_TASKS = "pending_tasks"
@@ -64,6 +67,33 @@ class BaseHandler(Handler):
         """Teardown the handler."""
         self.context.logger.info(f"{self.__class__.__name__}: teardown called.")
 
+    def handle_response(
+        self, message: Message, dialogues: Dialogues, is_error: bool = False
+    ) -> None:
+        """
+        Pass a response to the callback of the request that it answers.
+
+        Each request is tracked independently by the nonce of its dialogue,
+        so any number of requests of any kind can be in flight at the same time.
+
+        :param message: the response.
+        :param dialogues: the dialogues of the response's protocol.
+        :param is_error: whether the response is an error.
+        """
+        dialogue = dialogues.update(message)
+        if dialogue is None:
+            self.context.logger.warning(
+                f"Could not match the response to a request: {message}"
+            )
+            return
+        nonce = dialogue.dialogue_label.dialogue_reference[0]
+        callback = self.params.req_to_callback.pop(nonce, None)
+        error_callback = self.params.req_to_error_callback.pop(nonce, None)
+        if is_error:
+            callback = error_callback
+        if callback is not None:
+            callback(message, dialogue)
+
     def on_message_handled(self, _message: Message) -> None:
         """Callback after a message has been handled."""
         self.params.request_count += 1
@@ -99,18 +129,13 @@ class IpfsHandler(BaseHandler):
         """
         self.context.logger.info(f"Received message: {message}")
         ipfs_msg = cast(IpfsMessage, message)
-        if ipfs_msg.performative == IpfsMessage.Performative.ERROR:
+        is_error = ipfs_msg.performative == IpfsMessage.Performative.ERROR
+        if is_error:
             self.context.logger.warning(
                 f"IPFS Message performative not recognized: {ipfs_msg.performative}"
             )
-            self.params.in_flight_req = False
-            return
 
-        dialogue = self.context.ipfs_dialogues.update(ipfs_msg)
-        nonce = dialogue.dialogue_label.dialogue_reference[0]
-        callback = self.params.req_to_callback.pop(nonce)
-        callback(ipfs_msg, dialogue)
-        self.params.in_flight_req = False
+        self.handle_response(ipfs_msg, self.context.ipfs_dialogues, is_error)
         self.on_message_handled(message)
 
 
@@ -121,15 +146,35 @@ class ContractHandler(BaseHandler):
 
     def setup(self) -> None:
         """Setup the contract handler."""
-        self.context.shared_state[PENDING_TASKS] = []
-        self.context.shared_state[DONE_TASKS] = []
-        self.context.shared_state[DONE_TASKS_LOCK] = threading.Lock()
+        self.context.shared_state[PENDING_TASKS] = TaskScheduler(
+            self._get_task_priority
+        )
+        done_tasks = DoneTaskStore()
+        self.context.shared_state[DONE_TASKS] = done_tasks
+        self.context.shared_state[DONE_TASKS_LOCK] = done_tasks.lock
         super().setup()
 
-    @property
-    def pending_tasks(self) -> List[Dict[str, Any]]:
-        """Get pending_tasks."""
-        return self.context.shared_state[PENDING_TASKS]
+    def _get_task_priority(self, task: Dict[str, Any]) -> Tuple[int, int, float]:
+        """
+        Get the priority, the payment and the deadline of a task.
+
+        Marketplace requests go before the legacy mech requests, since their delivery is time-bound.
+        Among the requests of the same kind, the better paid ones go first.
+        The older a request, the closer its deadline.
+
+        :param task: the task.
+        :return: the priority, the payment and the deadline of the task.
+        """
+        is_marketplace_request = (
+            self.params.use_mech_marketplace
+            and task.get("contract_address", None)
+            == self.params.mech_marketplace_address
+        )
+        return (
+            int(is_marketplace_request),
+            task.get("payment", 0),
+            task.get("block_number", math.inf),
+        )
 
     def handle(self, message: Message) -> None:
         """
@@ -139,36 +184,18 @@ class ContractHandler(BaseHandler):
         """
         self.context.logger.info(f"Received message: {message}")
         contract_api_msg = cast(ContractApiMessage, message)
-        if contract_api_msg.performative != ContractApiMessage.Performative.STATE:
+        is_error = (
+            contract_api_msg.performative != ContractApiMessage.Performative.STATE
+        )
+        if is_error:
             self.context.logger.warning(
                 f"Contract API Message performative not recognized: {contract_api_msg.performative}"
             )
-            self.params.in_flight_req = False
-            return
 
-        body = contract_api_msg.state.body
-        self._handle_get_undelivered_reqs(body)
-        self.params.in_flight_req = False
-        self.on_message_handled(message)
-
-    def _handle_get_undelivered_reqs(self, body: Dict[str, Any]) -> None:
-        """Handle get undelivered reqs."""
-        reqs = body.get("data", [])
-        if len(reqs) == 0:
-            return
-
-        self.params.from_block = max([req["block_number"] for req in reqs]) + 1
-        self.context.logger.info(f"Received {len(reqs)} new requests.")
-        reqs = [
-            req
-            for req in reqs
-            if req["block_number"] % self.params.num_agents == self.params.agent_index
-        ]
-        self.context.logger.info(f"Processing only {len(reqs)} of the new requests.")
-        self.pending_tasks.extend(reqs)
-        self.context.logger.info(
-            f"Monitoring new reqs from block {self.params.from_block}"
+        self.handle_response(
+            contract_api_msg, self.context.contract_dialogues, is_error
         )
+        self.on_message_handled(message)
 
 
 class LedgerHandler(BaseHandler):
@@ -184,14 +211,11 @@ class LedgerHandler(BaseHandler):
         """
         self.context.logger.info(f"Received message: {message}")
         ledger_api_msg = cast(LedgerApiMessage, message)
-        if ledger_api_msg.performative != LedgerApiMessage.Performative.STATE:
+        is_error = ledger_api_msg.performative != LedgerApiMessage.Performative.STATE
+        if is_error:
             self.context.logger.warning(
                 f"Ledger API Message performative not recognized: {ledger_api_msg.performative}"
             )
-            self.params.in_flight_req = False
-            return
 
-        block_number = ledger_api_msg.state.body["number"]
-        self.params.from_block = block_number - self.params.from_block_range
-        self.params.in_flight_req = False
+        self.handle_response(ledger_api_msg, self.context.ledger_dialogues, is_error)
         self.on_message_handled(message)
@@ -58,9 +58,10 @@ class Params(Model):
             "agent_mech_contract_addresses must be set!",
         )
 
-        self.in_flight_req: bool = False
         self.from_block: Optional[int] = None
+        # the callbacks of the requests in flight, keyed by the nonce of their dialogue
         self.req_to_callback: Dict[str, Callable] = {}
+        self.req_to_error_callback: Dict[str, Callable] = {}
         self.api_keys: Dict = self._nested_list_todict_workaround(
             kwargs, "api_keys_json"
         )
@@ -72,6 +73,34 @@ class Params(Model):
         )
         self.polling_interval = kwargs.get("polling_interval", 30.0)
         self.task_deadline = kwargs.get("task_deadline", 240.0)
+        # the number of tasks that can be executed concurrently
+        self.max_workers: int = kwargs.get("max_workers", 1)
+        enforce(self.max_workers > 0, "max_workers must be a positive integer!")
+        # whether the workers should keep the tools loaded between tasks
+        self.warm_tool_workers: bool = kwargs.get("warm_tool_workers", False)
+        # whether the workers should preload the models declared by the tools
+        self.preload_models: bool = kwargs.get("preload_models", False)
+        # the directory of the on-disk tool cache, relative to the data dir; None disables the cache
+        self.tools_cache_dir: Optional[str] = kwargs.get("tools_cache_dir", None)
+        # the number of pending tasks whose data are fetched again ahead of their execution,
+        # when they could not be fetched on the arrival of the tasks
+        self.prefetch_size: int = kwargs.get("prefetch_size", 0)
+        enforce(self.prefetch_size >= 0, "prefetch_size must not be negative!")
+        # the maximum number of tool results to cache; 0 disables the cache
+        self.result_cache_size: int = kwargs.get("result_cache_size", 0)
+        # the seconds for which a tool result is cached, unless overridden for the tool
+        self.result_cache_ttl: float = kwargs.get("result_cache_ttl", 300.0)
+        self.tool_to_result_cache_ttl: Dict[str, float] = {
+            tool: float(ttl)
+            for tool, ttl in kwargs.get("tool_to_result_cache_ttl_json", [])
+        }
+        # the journal of the tasks, relative to the data dir; if None, the tasks are not journaled
+        self.task_journal_path: Optional[str] = kwargs.get("task_journal_path", None)
+        # the number of times the storage of a task result is retried, before the task is dropped
+        self.store_retry_limit: int = kwargs.get("store_retry_limit", 5)
+        enforce(self.store_retry_limit >= 0, "store_retry_limit must not be negative!")
+        # the seconds before the first retry of a storage, doubled on every retry
+        self.store_retry_backoff: float = kwargs.get("store_retry_backoff", 2.0)
         self.num_agents = kwargs.get("num_agents", None)
         self.request_count: int = 0
         self.cleanup_freq = kwargs.get("cleanup_freq", 50)
@@ -84,6 +113,16 @@ class Params(Model):
         enforce(self.timeout_limit is not None, "timeout_limit must be set!")
         self.max_block_window = kwargs.get("max_block_window", None)
         enforce(self.max_block_window is not None, "max_block_window must be set!")
+        # the number of blocks after which the events of the mechs are considered final
+        self.confirmation_depth: int = kwargs.get("confirmation_depth", 0)
+        enforce(
+            self.confirmation_depth >= 0, "confirmation_depth must not be negative!"
+        )
+        # the urls of the endpoints used to look for requests, along with the one of the ledger connection
+        self.rpc_urls: List[str] = kwargs.get("rpc_urls", [])
+        # the maximum number of calls per second to each endpoint
+        self.rpc_rate_limit: float = kwargs.get("rpc_rate_limit", 10.0)
+        enforce(self.rpc_rate_limit > 0, "rpc_rate_limit must be positive!")
         # maps the request id to the number of times it has timed out
         self.request_id_to_num_timeouts: Dict[int, int] = defaultdict(lambda: 0)
         self.mech_to_config: Dict[str, MechConfig] = self._parse_mech_configs(kwargs)
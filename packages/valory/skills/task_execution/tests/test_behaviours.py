@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""Tests for the behaviours of the task execution skill."""
+
+# pylint: disable=protected-access
+
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest import mock
+
+import pytest
+
+from packages.valory.skills.task_execution.behaviours import (
+    DONE_TASKS,
+    PENDING_TASKS,
+    TaskExecutionBehaviour,
+)
+from packages.valory.skills.task_execution.utils.done_tasks import DoneTaskStore
+from packages.valory.skills.task_execution.utils.scheduler import TaskScheduler
+
+
+def _req(req_id: int) -> Dict[str, Any]:
+    """Get a request, made in a block matching its id."""
+    return {"requestId": req_id, "block_number": req_id, "data": b""}
+
+
+def _files(task_data: Any) -> Any:
+    """Get a response of IPFS with the data of a task."""
+    return SimpleNamespace(files={"metadata.json": json.dumps(task_data)})
+
+
+@pytest.fixture
+def behaviour() -> TaskExecutionBehaviour:
+    """Get a behaviour which does not fetch the data of the tasks."""
+    context = mock.MagicMock()
+    context.shared_state = {PENDING_TASKS: TaskScheduler(), DONE_TASKS: DoneTaskStore()}
+    context.params = SimpleNamespace(num_agents=1, agent_index=0)
+    behaviour = TaskExecutionBehaviour(name="task_execution", skill_context=context)
+    behaviour._tools_to_file_hash = {"a": "hash_a", "b": "hash_b"}
+    behaviour._fetch_task = mock.MagicMock()  # type: ignore
+    return behaviour
+
+
+def _drain(scheduler: TaskScheduler) -> List[int]:
+    """Pop all the tasks of a scheduler."""
+    req_ids = []
+    while len(scheduler) > 0:
+        req_ids.append(scheduler.pop()["requestId"])
+    return req_ids
+
+
+class TestNewTasks:
+    """Test the scheduling of the new tasks."""
+
+    def test_tasks_are_pushed_in_the_lane_of_their_tool(
+        self, behaviour: TaskExecutionBehaviour
+    ) -> None:
+        """Test that the new tasks are pushed once their tool is known, so that the tools are served fairly."""
+        behaviour._push_new_reqs([_req(1), _req(2), _req(3)])
+        assert behaviour._fetch_task.call_count == 3  # type: ignore
+        assert len(behaviour.pending_tasks) == 0
+
+        for req_id, tool in ((1, "a"), (2, "a"), (3, "b")):
+            behaviour._handle_get_task(
+                req_id, _files({"prompt": "prompt", "tool": tool}), mock.MagicMock()
+            )
+        # a burst of requests for one tool does not delay the requests for the others
+        assert _drain(behaviour.pending_tasks) == [1, 3, 2]
+        assert set(behaviour._prefetched_tasks) == {1, 2, 3}
+
+    def test_duplicate_tasks_are_not_fetched(
+        self, behaviour: TaskExecutionBehaviour
+    ) -> None:
+        """Test that the tasks which are arriving or pending are not scheduled again."""
+        behaviour._push_new_reqs([_req(1)])
+        behaviour._push_new_reqs([_req(1)])
+        behaviour._handle_get_task(
+            1, _files({"prompt": "prompt", "tool": "a"}), mock.MagicMock()
+        )
+        behaviour._push_new_reqs([_req(1)])
+        assert behaviour._fetch_task.call_count == 1  # type: ignore
+        assert len(behaviour.pending_tasks) == 1
+
+    def test_tasks_whose_data_cannot_be_fetched(
+        self, behaviour: TaskExecutionBehaviour
+    ) -> None:
+        """Test that the tasks whose data cannot be fetched are pushed without their tool."""
+        behaviour._push_new_reqs([_req(1)])
+        behaviour._handle_get_task_error(1, mock.MagicMock(), mock.MagicMock())
+        assert _drain(behaviour.pending_tasks) == [1]
+        assert 1 not in behaviour._prefetched_tasks
+
+    def test_tasks_with_invalid_data_are_rejected(
+        self, behaviour: TaskExecutionBehaviour
+    ) -> None:
+        """Test that the tasks of an unknown tool are rejected as soon as their data arrive."""
+        behaviour._push_new_reqs([_req(1)])
+        behaviour._handle_get_task(
+            1, _files({"prompt": "prompt", "tool": "unknown"}), mock.MagicMock()
+        )
+        assert len(behaviour.pending_tasks) == 0
+        assert 1 in behaviour._invalid_requests
+
+    def test_dropped_tasks_are_not_pushed(
+        self, behaviour: TaskExecutionBehaviour
+    ) -> None:
+        """Test that a task delivered by someone else while its data are fetched is not pushed."""
+        behaviour._push_new_reqs([_req(1)])
+        assert behaviour._drop_pending_task(1)
+        behaviour._handle_get_task(
+            1, _files({"prompt": "prompt", "tool": "a"}), mock.MagicMock()
+        )
+        assert len(behaviour.pending_tasks) == 0
+        assert 1 not in behaviour._prefetched_tasks
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the store of the done tasks."""
+
+from typing import Any, Dict
+
+from packages.valory.skills.task_execution.utils.done_tasks import DoneTaskStore
+
+
+def _task(mech_address: str, request_id: int) -> Dict[str, Any]:
+    """Get a done task."""
+    return {"mech_address": mech_address, "request_id": request_id}
+
+
+class TestDoneTaskStore:
+    """Test the store of the done tasks."""
+
+    def test_append_and_remove(self) -> None:
+        """Test that the tasks are keyed by their mech and their request id."""
+        store = DoneTaskStore()
+        store.append(_task("0xa", 1))
+        store.extend([_task("0xb", 1), _task("0xa", 2)])
+        assert len(store) == 3
+        assert ("0xb", 1) in store
+        assert store.get(("0xa", 2)) == _task("0xa", 2)
+        assert store.remove([_task("0xa", 1), _task("0xc", 1)]) == 1
+        assert [store.key(task) for task in store] == [("0xb", 1), ("0xa", 2)]
+
+    def test_version(self) -> None:
+        """Test that every change bumps the version, even when the size does not change."""
+        store = DoneTaskStore()
+        store.append(_task("0xa", 1))
+        version = store.version
+        store.remove([_task("0xa", 1)])
+        store.append(_task("0xa", 2))
+        assert len(store) == 1
+        assert store.version == version + 2
+        store.remove([_task("0xa", 3)])
+        assert store.version == version + 2
+
+    def test_snapshot_is_shared_until_changed(self) -> None:
+        """Test that the snapshots are cached until the store changes."""
+        store = DoneTaskStore()
+        store.append(_task("0xa", 1))
+        snapshot = store.snapshot()
+        assert store.snapshot() is snapshot
+        store.append(_task("0xa", 2))
+        assert store.snapshot() is not snapshot
+        assert len(store.snapshot()) == 2
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the store of the events of the mechs."""
+
+from typing import Any, Dict, List, Optional
+
+from packages.valory.skills.task_execution.utils.event_store import EventStore
+
+
+MECH = "0xmech"
+
+
+def _event(request_id: int, block_number: int) -> Dict[str, Any]:
+    """Get an event."""
+    return {
+        "contract_address": MECH,
+        "requestId": request_id,
+        "block_number": block_number,
+    }
+
+
+def _scan(  # pylint: disable=too-many-arguments
+    from_block: int,
+    to_block: int,
+    depth: int,
+    parent_hash: Optional[str],
+    requests: List[Dict[str, Any]],
+    delivers: Optional[List[Dict[str, Any]]] = None,
+    fork: str = "",
+) -> Dict[str, Any]:
+    """Get a scan, whose block hashes depend on the fork."""
+    final_block = max(to_block - depth, from_block - 1)
+    return {
+        "requests": requests,
+        "delivers": delivers or [],
+        "from_block": from_block,
+        "to_block": to_block,
+        "parent_hash": parent_hash,
+        "final_block": final_block,
+        "final_hash": f"{fork}{final_block}",
+    }
+
+
+class TestEventStore:
+    """Test the store of the events of the mechs."""
+
+    def test_new_events(self) -> None:
+        """Test that the events are reported once, even if their blocks are scanned again."""
+        store = EventStore(confirmation_depth=2, final_block=-1)
+        delta = store.apply(_scan(0, 10, 2, None, [_event(1, 9)], [_event(0, 5)]))
+        assert delta is not None
+        assert delta.requests == [_event(1, 9)]
+        assert delta.delivers == [_event(0, 5)]
+        assert store.cursor == 9
+
+        delta = store.apply(_scan(9, 12, 2, "8", [_event(1, 9), _event(2, 12)]))
+        assert delta is not None
+        assert delta.requests == [_event(2, 12)]
+        assert delta.reverted_requests == []
+
+    def test_shallow_reorg_is_reverted(self) -> None:
+        """Test that the provisional events which disappear are reverted."""
+        store = EventStore(confirmation_depth=2, final_block=-1)
+        store.apply(_scan(0, 10, 2, None, [_event(1, 9), _event(2, 10)]))
+        delta = store.apply(_scan(9, 11, 2, "8", [_event(1, 9)]))
+        assert delta is not None
+        assert delta.requests == []
+        assert delta.reverted_requests == [_event(2, 10)]
+
+    def test_outdated_scans_are_discarded(self) -> None:
+        """Test that the scans not starting at the cursor, or lagging behind, are discarded."""
+        store = EventStore(confirmation_depth=2, final_block=-1)
+        store.apply(_scan(0, 10, 2, None, []))
+        assert store.apply(_scan(0, 11, 2, None, [])) is None
+        assert store.apply(_scan(9, 9, 2, "8", [])) is None
+
+    def test_deep_reorg_rewinds(self) -> None:
+        """Test that a reorg deeper than the confirmation depth rewinds to a known final block."""
+        store = EventStore(confirmation_depth=2, final_block=-1)
+        store.apply(_scan(0, 10, 2, None, [_event(1, 4)]))
+        store.apply(_scan(9, 12, 2, "8", [_event(2, 9)], [_event(1, 9)]))
+        assert store.cursor == 11
+
+        # the blocks from 9 have been replaced, so the parent hash of the scan is not the known one
+        assert store.apply(_scan(11, 14, 2, "10b", [], fork="b")) is None
+        assert store.cursor == 9
+        assert store.final_hash == "8"
+
+        delta = store.apply(_scan(9, 14, 2, "8", [], fork="b"))
+        assert delta is not None
+        assert delta.reverted_requests == [_event(2, 9)]
+        assert delta.reverted_delivers == [_event(1, 9)]
+        assert store.cursor == 13
+
+    def test_deep_reorg_without_known_hash(self) -> None:
+        """Test that a rewind past the known hashes takes the hash of the block from the next scan."""
+        store = EventStore(confirmation_depth=2, final_block=10, final_hash="10")
+        assert store.apply(_scan(11, 14, 2, "10b", [], fork="b")) is None
+        assert store.cursor == 9
+        assert store.final_hash is None
+        assert store.apply(_scan(9, 14, 2, "8b", [], fork="b")) is not None
+        assert store.final_hash == "b12"
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""Tests for the handlers of the task execution skill."""
+
+# pylint: disable=protected-access
+
+import math
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest import mock
+
+from packages.valory.skills.task_execution.handlers import ContractHandler
+from packages.valory.skills.task_execution.utils.scheduler import TaskScheduler
+
+
+MARKETPLACE = "0xmarketplace"
+
+
+def _req(
+    req_id: int, block_number: int, payment: int, contract_address: str = "0xmech"
+) -> Dict[str, Any]:
+    """Get a request."""
+    return {
+        "requestId": req_id,
+        "block_number": block_number,
+        "payment": payment,
+        "contract_address": contract_address,
+    }
+
+
+def _handler() -> ContractHandler:
+    """Get a contract handler, with the marketplace in use."""
+    context = mock.MagicMock()
+    context.params = SimpleNamespace(
+        use_mech_marketplace=True, mech_marketplace_address=MARKETPLACE
+    )
+    return ContractHandler(name="contract_handler", skill_context=context)
+
+
+class TestTaskPriority:
+    """Test the priority of the tasks."""
+
+    def test_priority(self) -> None:
+        """Test the priority, the payment and the deadline of the tasks."""
+        handler = _handler()
+        assert handler._get_task_priority(_req(1, 10, 5)) == (0, 5, 10)
+        assert handler._get_task_priority(_req(2, 10, 5, MARKETPLACE)) == (1, 5, 10)
+        assert handler._get_task_priority({"requestId": 3}) == (0, 0, math.inf)
+
+    def test_order(self) -> None:
+        """Test that the marketplace requests go first, then the better paid ones, then the older ones."""
+        scheduler = TaskScheduler(_handler()._get_task_priority)
+        for req in (
+            _req(1, 10, 0),
+            _req(2, 11, 100),
+            _req(3, 12, 0, MARKETPLACE),
+            _req(4, 9, 100),
+        ):
+            scheduler.push(req)
+        req_ids: List[int] = []
+        while len(scheduler) > 0:
+            req_ids.append(scheduler.pop()["requestId"])
+        assert req_ids == [3, 4, 2, 1]
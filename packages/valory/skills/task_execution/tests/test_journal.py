@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the journal of the tasks."""
+
+from pathlib import Path
+
+from packages.valory.skills.task_execution.utils.journal import TaskJournal
+
+
+def _count_rows(journal: TaskJournal) -> int:
+    """Count the rows of a journal."""
+    return journal._conn.execute(  # pylint: disable=protected-access
+        "SELECT COUNT(*) FROM journal"
+    ).fetchone()[0]
+
+
+class TestTaskJournal:
+    """Test the journal of the tasks."""
+
+    def test_replay(self, tmp_path: Path) -> None:
+        """Test that the state is restored from the journal."""
+        path = str(tmp_path / "journal.db")
+        journal = TaskJournal(path)
+        journal.record_from_block(10)
+        journal.record_final_block(8, "0x08")
+        journal.record_pending(1, {"requestId": 1, "data": b"\x01"})
+        journal.record_pending(2, {"requestId": 2})
+        journal.record_pending(3, {"requestId": 3})
+        journal.record_timeout(1, 2)
+        journal.record_stored(2, {"request_id": 2})
+        journal.record_delivered(3)
+        journal.close()
+
+        state = TaskJournal(path).load()
+        assert state.from_block == 10
+        assert (state.final_block, state.final_hash) == (8, "0x08")
+        assert state.pending == {1: {"requestId": 1, "data": b"\x01"}}
+        assert state.timeouts == {1: 2}
+        assert state.stored == {2: {"request_id": 2}}
+
+    def test_compaction(self, tmp_path: Path) -> None:
+        """Test that the journal is compacted into the current state."""
+        path = str(tmp_path / "journal.db")
+        journal = TaskJournal(path, compaction_threshold=5)
+        for req_id in range(10):
+            journal.record_pending(req_id, {"requestId": req_id})
+            journal.record_delivered(req_id)
+        journal.record_pending(10, {"requestId": 10})
+        assert _count_rows(journal) <= 5
+        journal.close()
+        assert TaskJournal(path).load().pending == {10: {"requestId": 10}}
+
+    def test_request_index_is_replaced(self, tmp_path: Path) -> None:
+        """Test that only the latest snapshot of the request index is kept."""
+        path = str(tmp_path / "journal.db")
+        journal = TaskJournal(path)
+        journal.record_request_index({"open": [{"requestId": 1}], "delivered": []})
+        journal.record_request_index({"open": [], "delivered": [{"requestId": 1}]})
+        assert _count_rows(journal) == 1
+        journal.close()
+        state = TaskJournal(path).load()
+        assert state.request_index == {"open": [], "delivered": [{"requestId": 1}]}
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the index of the undelivered requests."""
+
+from typing import Any, Dict
+
+from packages.valory.skills.task_execution.utils.request_index import RequestIndex
+
+
+MECH = "0xmech"
+
+
+def _event(request_id: int, block_number: int) -> Dict[str, Any]:
+    """Get an event."""
+    return {
+        "contract_address": MECH,
+        "requestId": request_id,
+        "block_number": block_number,
+    }
+
+
+class TestRequestIndex:
+    """Test the index of the undelivered requests."""
+
+    def test_apply(self) -> None:
+        """Test that only the new undelivered requests are returned."""
+        index = RequestIndex(max_age=100)
+        new = index.apply([_event(1, 1), _event(2, 2)], [_event(2, 3)], 10)
+        assert new == [_event(1, 1)]
+        assert (MECH, 1) in index
+        assert index.apply([], [_event(1, 11)], 11) == []
+        assert len(index) == 0
+
+    def test_old_requests_are_dropped(self) -> None:
+        """Test that the requests older than the maximum age are dropped."""
+        index = RequestIndex(max_age=10)
+        index.apply([_event(1, 1), _event(2, 5)], [], 5)
+        index.apply([], [], 14)
+        assert (MECH, 1) not in index
+        assert (MECH, 2) in index
+
+    def test_revert(self) -> None:
+        """Test that the requests rolled back by a reorg are removed."""
+        index = RequestIndex(max_age=100)
+        index.apply([_event(1, 1)], [], 10)
+        index.revert([_event(1, 1)])
+        assert len(index) == 0
+
+    def test_reopen(self) -> None:
+        """Test that the requests whose delivery is rolled back by a reorg are open again."""
+        index = RequestIndex(max_age=100)
+        index.apply([_event(1, 1)], [], 10)
+        index.apply([], [_event(1, 5)], 11)
+        assert index.reopen([_event(1, 5), _event(2, 5)]) == [_event(1, 1)]
+        assert (MECH, 1) in index
+        assert index.reopen([_event(1, 5)]) == []
+
+    def test_snapshot_round_trip(self) -> None:
+        """Test that an index is restored from its snapshot."""
+        index = RequestIndex(max_age=100)
+        index.apply([_event(1, 1), _event(2, 2)], [_event(2, 3)], 10)
+        version = index.version
+        restored = RequestIndex(max_age=100)
+        restored.restore(index.snapshot())
+        assert restored.snapshot() == index.snapshot()
+        assert restored.reopen([_event(2, 3)]) == [_event(2, 2)]
+        index.apply([], [], 10)
+        assert index.version == version
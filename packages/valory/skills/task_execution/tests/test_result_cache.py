@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the cache of the tool results."""
+
+import time
+from unittest import mock
+
+from packages.valory.skills.task_execution.utils.result_cache import (
+    ResultCache,
+    get_cache_key,
+)
+
+
+class TestGetCacheKey:
+    """Test the cache keys of the requests."""
+
+    def test_whitespace_is_normalized(self) -> None:
+        """Test that prompts differing only in whitespace share the key."""
+        key = get_cache_key("hash", "model", {"prompt": "a  b\n", "tool": "t"})
+        assert key == get_cache_key("hash", "model", {"prompt": " a b", "nonce": "1"})
+
+    def test_params_are_part_of_the_key(self) -> None:
+        """Test that the params, the model and the tool hash are part of the key."""
+        key = get_cache_key("hash", "model", {"prompt": "a"})
+        assert key != get_cache_key("hash", "model", {"prompt": "a", "temperature": 1})
+        assert key != get_cache_key("hash", "other", {"prompt": "a"})
+        assert key != get_cache_key("other", "model", {"prompt": "a"})
+
+
+class TestResultCache:
+    """Test the cache of the tool results."""
+
+    def test_lru_eviction(self) -> None:
+        """Test that the least recently used results are evicted."""
+        cache = ResultCache(2)
+        cache.put("a", 1, ttl=60)
+        cache.put("b", 2, ttl=60)
+        assert cache.get("a") == 1
+        cache.put("c", 3, ttl=60)
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_expiry(self) -> None:
+        """Test that the results expire after their ttl."""
+        cache = ResultCache(2)
+        cache.put("a", 1, ttl=10)
+        now = time.time()
+        with mock.patch("time.time", return_value=now + 11):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_disabled(self) -> None:
+        """Test that nothing is cached with no size or no ttl."""
+        cache = ResultCache(0)
+        cache.put("a", 1, ttl=10)
+        assert len(cache) == 0
+        cache = ResultCache(1)
+        cache.put("a", 1, ttl=0)
+        assert len(cache) == 0
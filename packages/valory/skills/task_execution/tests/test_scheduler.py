@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the scheduler of the pending tasks."""
+
+import random
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from packages.valory.skills.task_execution.utils.scheduler import TaskScheduler
+
+
+def _task(
+    req_id: int,
+    tool: str = "tool",
+    priority: int = 0,
+    deadline: float = 0.0,
+    payment: int = 0,
+) -> Dict[str, Any]:
+    """Get a task."""
+    return {
+        "requestId": req_id,
+        "tool": tool,
+        "priority": priority,
+        "deadline": deadline,
+        "payment": payment,
+    }
+
+
+def _priority(task: Dict[str, Any]) -> Tuple[int, int, float]:
+    """Get the priority, the payment and the deadline of a task."""
+    return task["priority"], task["payment"], task["deadline"]
+
+
+def _drain(scheduler: TaskScheduler) -> List[int]:
+    """Pop all the tasks of a scheduler."""
+    req_ids = []
+    while len(scheduler) > 0:
+        req_ids.append(scheduler.pop()["requestId"])
+    return req_ids
+
+
+class TestTaskScheduler:
+    """Test the scheduler of the pending tasks."""
+
+    def test_order(self) -> None:
+        """Test that the tasks are popped by priority, then deadline, then arrival."""
+        scheduler = TaskScheduler(_priority)
+        scheduler.push(_task(1, deadline=2.0))
+        scheduler.push(_task(2, deadline=1.0))
+        scheduler.push(_task(3, priority=1, deadline=3.0))
+        scheduler.push(_task(4, deadline=1.0))
+        assert _drain(scheduler) == [3, 2, 4, 1]
+
+    def test_payment_order(self) -> None:
+        """Test that, among the tasks of the same priority, the better paid ones go first."""
+        scheduler = TaskScheduler(_priority)
+        scheduler.push(_task(1, deadline=1.0, payment=10))
+        scheduler.push(_task(2, deadline=2.0, payment=20))
+        scheduler.push(_task(3, priority=1, deadline=3.0))
+        scheduler.push(_task(4, deadline=0.0, payment=10))
+        assert _drain(scheduler) == [3, 2, 4, 1]
+
+    def test_dedup(self) -> None:
+        """Test that a pending request is not pushed twice."""
+        scheduler = TaskScheduler(_priority)
+        assert scheduler.push(_task(1))
+        assert not scheduler.push(_task(1))
+        assert len(scheduler) == 1
+        assert 1 in scheduler
+
+    def test_lanes_are_served_fairly(self) -> None:
+        """Test that a burst of tasks of one tool does not starve the other tools."""
+        scheduler = TaskScheduler(_priority)
+        for req_id in range(4):
+            scheduler.push(_task(req_id, tool="a"))
+        scheduler.push(_task(4, tool="b"))
+        assert _drain(scheduler)[:3] == [0, 4, 1]
+
+    def test_remove_and_set_lane(self) -> None:
+        """Test removing a task and moving it to another lane."""
+        scheduler = TaskScheduler(_priority)
+        for req_id in range(3):
+            scheduler.push(_task(req_id, tool="a"))
+        assert scheduler.remove(1)["requestId"] == 1  # type: ignore
+        assert scheduler.remove(1) is None
+        scheduler.set_lane(2, "b")
+        assert _drain(scheduler) == [0, 2]
+
+    def test_pop_empty(self) -> None:
+        """Test popping from an empty scheduler."""
+        with pytest.raises(IndexError):
+            TaskScheduler().pop()
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_peek_matches_pop(self, seed: int) -> None:
+        """Test that peeking returns the tasks in the order in which they are popped."""
+        rng = random.Random(seed)
+        scheduler = TaskScheduler(_priority)
+        num_tasks = 0
+        for _ in range(100):
+            action = rng.random()
+            if action < 0.6:
+                task = _task(
+                    num_tasks,
+                    rng.choice("abc"),
+                    rng.randint(0, 2),
+                    rng.random(),
+                    rng.randint(0, 2),
+                )
+                scheduler.push(task)
+                num_tasks += 1
+            elif action < 0.75 and len(scheduler) > 0:
+                scheduler.pop()
+            elif action < 0.85 and num_tasks > 0:
+                scheduler.remove(rng.randrange(num_tasks))
+            elif num_tasks > 0:
+                scheduler.set_lane(rng.randrange(num_tasks), rng.choice("abcd"))
+        num_peeked = rng.randint(0, 20)
+        peeked = [task["requestId"] for task in scheduler.peek(num_peeked)]
+        assert peeked == _drain(scheduler)[:num_peeked]
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the cache of the tool packages."""
+
+from pathlib import Path
+
+import pytest
+
+from packages.valory.skills.task_execution.utils.tool_cache import (
+    MANIFEST_FILENAME,
+    ToolCache,
+)
+
+
+class TestToolCache:
+    """Test the cache of the tool packages."""
+
+    def test_put_and_get(self, tmp_path: Path) -> None:
+        """Test that a package is stored and read back."""
+        cache = ToolCache(str(tmp_path))
+        files = {"component.yaml": "name: tool", "tool/tool.py": "x = 1"}
+        assert cache.get("hash") is None
+        cache.put("hash", files)
+        assert cache.get("hash") == files
+        assert [path.name for path in tmp_path.iterdir()] == ["hash"]
+        assert (tmp_path / "hash" / MANIFEST_FILENAME).is_file()
+
+    def test_put_does_not_overwrite(self, tmp_path: Path) -> None:
+        """Test that a cached package is never overwritten, since its hash identifies its content."""
+        cache = ToolCache(str(tmp_path))
+        cache.put("hash", {"tool.py": "x = 1"})
+        cache.put("hash", {"tool.py": "x = 2"})
+        assert cache.get("hash") == {"tool.py": "x = 1"}
+
+    def test_corrupted_package_is_dropped(self, tmp_path: Path) -> None:
+        """Test that a package whose files do not match its manifest is dropped."""
+        cache = ToolCache(str(tmp_path))
+        cache.put("hash", {"tool.py": "x = 1"})
+        (tmp_path / "hash" / "tool.py").write_text("x = ")
+        assert cache.get("hash") is None
+        assert not (tmp_path / "hash").exists()
+        cache.put("hash", {"tool.py": "x = 1"})
+        assert cache.get("hash") == {"tool.py": "x = 1"}
+
+    def test_package_without_manifest_is_dropped(self, tmp_path: Path) -> None:
+        """Test that a partially written package, without its manifest, is not served."""
+        (tmp_path / "hash").mkdir()
+        (tmp_path / "hash" / "tool.py").write_text("x = 1")
+        cache = ToolCache(str(tmp_path))
+        assert cache.get("hash") is None
+        cache.put("hash", {"tool.py": "x = 2"})
+        assert cache.get("hash") == {"tool.py": "x = 2"}
+
+    @pytest.mark.parametrize(
+        "relative_path", ["../escaped.py", "tool/../../escaped.py", "/tmp/escaped.py"]
+    )
+    def test_paths_outside_the_package_are_rejected(
+        self, tmp_path: Path, relative_path: str
+    ) -> None:
+        """Test that a package cannot write outside of its directory."""
+        cache = ToolCache(str(tmp_path / "cache"))
+        with pytest.raises(ValueError):
+            cache.put("hash", {relative_path: "x = 1"})
+        assert not (tmp_path / "escaped.py").exists()
+        assert cache.get("hash") is None
+
+    def test_empty_package(self, tmp_path: Path) -> None:
+        """Test that an empty package is cached."""
+        cache = ToolCache(str(tmp_path))
+        cache.put("hash", {})
+        assert cache.get("hash") == {}
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the pool of worker processes."""
+
+import os
+import time
+from concurrent.futures import CancelledError, Future
+from typing import Any, List
+
+import pytest
+
+from packages.valory.skills.task_execution.utils.worker_pool import (
+    WorkerDiedError,
+    WorkerPool,
+)
+
+
+TIMEOUT = 10.0
+
+
+def _double(value: int) -> int:
+    """Double a value."""
+    return value * 2
+
+
+def _fail() -> None:
+    """Raise an error."""
+    raise ValueError("failed")
+
+
+def _die() -> None:
+    """Kill the worker executing the task."""
+    os._exit(1)  # pylint: disable=protected-access
+
+
+def _sleep() -> None:
+    """Sleep for longer than the tests wait."""
+    time.sleep(TIMEOUT * 10)
+
+
+def _wait(pool: WorkerPool, futures: List[Future]) -> None:
+    """Poll the pool until the futures are done."""
+    deadline = time.time() + TIMEOUT
+    while not all(future.done() for future in futures):
+        assert time.time() < deadline, "the tasks did not complete in time"
+        pool.poll()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool() -> Any:
+    """Get a pool of two workers."""
+    pool = WorkerPool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+class TestWorkerPool:
+    """Test the pool of worker processes."""
+
+    def test_results(self, pool: WorkerPool) -> None:
+        """Test that the results and the exceptions of the tasks are collected."""
+        futures = [pool.submit(_double, value) for value in range(4)]
+        failed = pool.submit(_fail)
+        _wait(pool, futures + [failed])
+        assert [future.result() for future in futures] == [0, 2, 4, 6]
+        with pytest.raises(ValueError, match="failed"):
+            failed.result()
+
+    def test_dead_worker_is_replaced(self, pool: WorkerPool) -> None:
+        """Test that a worker dying fails only its task, and that it is replaced."""
+        died = pool.submit(_die)
+        _wait(pool, [died])
+        with pytest.raises(WorkerDiedError):
+            died.result()
+        future = pool.submit(_double, 1)
+        _wait(pool, [future])
+        assert future.result() == 2
+
+    def test_cancel_running_task(self, pool: WorkerPool) -> None:
+        """Test that cancelling a running task kills only the worker executing it."""
+        running = pool.submit(_sleep)
+        other = pool.submit(_double, 2)
+        _wait(pool, [other])
+        assert pool.cancel(running)
+        with pytest.raises(CancelledError):
+            running.result(timeout=0)
+        future = pool.submit(_double, 3)
+        _wait(pool, [future])
+        assert future.result() == 6
+
+    def test_cancel_queued_task(self) -> None:
+        """Test that a queued task is cancelled without killing any worker."""
+        pool = WorkerPool(max_workers=1)
+        try:
+            running = pool.submit(_sleep)
+            queued = pool.submit(_double, 1)
+            assert not pool.cancel(queued)
+            assert queued.cancelled()
+            assert pool.cancel(running)
+        finally:
+            pool.shutdown()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the store of the done tasks, shared with the task submission skill."""
+
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+
+# the mech address and the request id of a task
+TaskKey = Tuple[str, Any]
+
+
+class DoneTaskStore:
+    """
+    The done tasks, i.e., the tasks whose results are stored and wait to be delivered.
+
+    The tasks are added by the task execution skill and removed by the task submission skill,
+    possibly from different threads. Every change bumps the version of the store, so that
+    the readers can notice it without comparing the tasks. The tasks are not modified
+    once added, so the snapshots of the store are shared instead of copied.
+
+    The tasks are indexed by their mech and their request id, in the order they were added,
+    so that the removal of the delivered tasks does not depend on the size of the backlog.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the store."""
+        self.lock = threading.RLock()
+        self._tasks: Dict[TaskKey, Dict[str, Any]] = {}
+        self._version = 0
+        self._snapshot: Tuple[Dict[str, Any], ...] = ()
+        self._snapshot_version = 0
+
+    def __len__(self) -> int:
+        """Get the number of the done tasks."""
+        return len(self._tasks)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over a snapshot of the done tasks."""
+        return iter(self.snapshot())
+
+    def __contains__(self, key: TaskKey) -> bool:
+        """Check whether a task is done, given its mech address and its request id."""
+        return key in self._tasks
+
+    @staticmethod
+    def key(task: Dict[str, Any]) -> TaskKey:
+        """Get the key of a task."""
+        return task["mech_address"], task["request_id"]
+
+    def get(self, key: TaskKey) -> Optional[Dict[str, Any]]:
+        """Get a done task, given its mech address and its request id."""
+        return self._tasks.get(key, None)
+
+    @property
+    def version(self) -> int:
+        """Get the version of the store, increased on every change."""
+        return self._version
+
+    def append(self, task: Dict[str, Any]) -> None:
+        """Add a done task."""
+        with self.lock:
+            self._tasks[self.key(task)] = task
+            self._version += 1
+
+    def extend(self, tasks: Iterable[Dict[str, Any]]) -> None:
+        """Add some done tasks."""
+        with self.lock:
+            for task in tasks:
+                self._tasks[self.key(task)] = task
+            self._version += 1
+
+    def remove(self, tasks: Iterable[Dict[str, Any]]) -> int:
+        """
+        Remove some done tasks, e.g., once they have been delivered.
+
+        :param tasks: the tasks to remove, identified by their mech address and their request id
+        :return: the number of the removed tasks
+        """
+        keys = [self.key(task) for task in tasks]
+        removed = 0
+        with self.lock:
+            for key in keys:
+                if self._tasks.pop(key, None) is not None:
+                    removed += 1
+            if removed > 0:
+                self._version += 1
+        return removed
+
+    def snapshot(self) -> Tuple[Dict[str, Any], ...]:
+        """Get the done tasks, as of the current version of the store."""
+        with self.lock:
+            if self._snapshot_version != self._version:
+                self._snapshot = tuple(self._tasks.values())
+                self._snapshot_version = self._version
+            return self._snapshot
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""This module contains a reorg-safe store of the Request and Deliver events of the mechs."""
+
+import dataclasses
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+
+REQUEST = "request"
+DELIVER = "deliver"
+# the number of the latest final blocks whose hash and events are kept, to recover from deep reorgs
+MAX_FINAL_HISTORY = 128
+
+
+@dataclasses.dataclass
+class EventsDelta:
+    """The changes in the events of the scanned blocks, since the previous scan."""
+
+    requests: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    delivers: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    # the events of the provisional blocks which disappeared because of a reorg
+    reverted_requests: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    reverted_delivers: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+
+
+class EventStore:
+    """
+    A store of the events of the scanned blocks, safe against chain reorgs.
+
+    The events of the last `confirmation_depth` blocks are provisional: these blocks are scanned
+    again on every poll, and the events that are no longer there are rolled back. The events of
+    older blocks are final, and the hash of the last final block is checked against the parent
+    hash of the next scan. On a mismatch, i.e., a reorg deeper than the confirmation depth,
+    the store rewinds to an older final block whose hash is known, so that the check still runs
+    on the next scan, and the events finalized after that block become provisional again,
+    so that they are reconciled with the blocks scanned again.
+    """
+
+    def __init__(
+        self,
+        confirmation_depth: int,
+        final_block: Optional[int] = None,
+        final_hash: Optional[str] = None,
+    ) -> None:
+        """Initialize the store."""
+        self._confirmation_depth = confirmation_depth
+        self.final_block = final_block
+        self.final_hash = final_hash
+        self._last_block: Optional[int] = None
+        # the events of the provisional blocks, keyed by their type, contract and request
+        self._provisional: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        # the hashes of the latest final blocks, and the events finalized after the oldest of them
+        self._final_hashes: Dict[int, str] = {}
+        self._finalized: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Get the next block to scan, i.e., the first provisional block."""
+        if self.final_block is None:
+            return None
+        return self.final_block + 1
+
+    @staticmethod
+    def _key(kind: str, event: Dict[str, Any]) -> Tuple[str, str, int]:
+        """Get the key of an event."""
+        return kind, event["contract_address"], event["requestId"]
+
+    def apply(self, scan: Dict[str, Any]) -> Optional[EventsDelta]:
+        """
+        Apply a scan of the blocks from the cursor up to the latest one.
+
+        :param scan: the scan, as returned by the `get_events_from_block` method of the mech contract.
+        :return: the changes in the events, or None if the scan has been discarded.
+        """
+        if scan["from_block"] != self.cursor or (
+            self._last_block is not None and scan["to_block"] < self._last_block
+        ):
+            # the scan is outdated, or the rpc is lagging behind
+            return None
+        if self.final_hash is not None and scan["parent_hash"] != self.final_hash:
+            # a reorg deeper than the confirmation depth, scan the previous blocks again
+            self._rewind()
+            return None
+
+        if self.final_block is not None and self.final_block >= 0:
+            # the hash of a restored final block, or the one taken from the chain after a rewind
+            final_hash = self.final_hash or scan["parent_hash"]
+            if final_hash is not None:
+                self._final_hashes.setdefault(self.final_block, final_hash)
+
+        scanned = {self._key(REQUEST, event): event for event in scan["requests"]}
+        scanned.update({self._key(DELIVER, event): event for event in scan["delivers"]})
+        delta = EventsDelta()
+        for key, event in scanned.items():
+            if key not in self._provisional:
+                events = delta.requests if key[0] == REQUEST else delta.delivers
+                events.append(event)
+        for key, event in self._provisional.items():
+            if key not in scanned:
+                events = (
+                    delta.reverted_requests
+                    if key[0] == REQUEST
+                    else delta.reverted_delivers
+                )
+                events.append(event)
+
+        self.final_block = scan["final_block"]
+        self.final_hash = scan["final_hash"]
+        self._last_block = scan["to_block"]
+        self._provisional = {}
+        for key, event in scanned.items():
+            if event["block_number"] > cast(int, self.final_block):
+                self._provisional[key] = event
+            else:
+                self._finalized[key] = event
+        self._record_final_hash()
+        return delta
+
+    def _record_final_hash(self) -> None:
+        """Record the hash of the final block, forgetting the oldest ones."""
+        if self.final_block is None or self.final_hash is None:
+            return
+        self._final_hashes[self.final_block] = self.final_hash
+        if len(self._final_hashes) <= MAX_FINAL_HISTORY:
+            return
+        del self._final_hashes[min(self._final_hashes)]
+        oldest_block = min(self._final_hashes)
+        self._finalized = {
+            key: event
+            for key, event in self._finalized.items()
+            if event["block_number"] > oldest_block
+        }
+
+    def _rewind(self) -> None:
+        """Rewind to a final block older than the confirmation depth, whose hash is known if possible."""
+        self._final_hashes.pop(cast(int, self.final_block), None)
+        target_block = max(cast(int, self.final_block) - self._confirmation_depth, -1)
+        known_blocks = [block for block in self._final_hashes if block <= target_block]
+        if len(known_blocks) > 0:
+            self.final_block = max(known_blocks)
+            self.final_hash = self._final_hashes[self.final_block]
+        else:
+            # no older hash is known, e.g., right after a restart,
+            # the hash of the block is taken from the chain on the next scan
+            self.final_block = target_block
+            self.final_hash = None
+        for block in [
+            block for block in self._final_hashes if block > self.final_block
+        ]:
+            del self._final_hashes[block]
+
+        # the events finalized after the block are reconciled with the next scan
+        reopened = {
+            key: event
+            for key, event in self._finalized.items()
+            if event["block_number"] > self.final_block
+        }
+        for key in reopened:
+            del self._finalized[key]
+        self._provisional.update(reopened)
+        self._last_block = None
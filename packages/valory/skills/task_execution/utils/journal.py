@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a durable journal of the state transitions of the tasks."""
+
+import dataclasses
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+FROM_BLOCK = "from_block"
+FINAL_BLOCK = "final_block"
+PENDING = "pending"
+TIMEOUT = "timeout"
+STORED = "stored"
+DELIVERED = "delivered"
+REQUEST_INDEX = "request_index"
+
+BYTES_MARKER = "__bytes__"
+
+
+def _encode(obj: Any) -> Any:
+    """Encode the objects that json does not support."""
+    if isinstance(obj, (bytes, bytearray)):
+        return {BYTES_MARKER: bytes(obj).hex()}
+    return str(obj)
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    """Decode the objects encoded by `_encode`."""
+    if len(obj) == 1 and BYTES_MARKER in obj:
+        return bytes.fromhex(obj[BYTES_MARKER])
+    return obj
+
+
+@dataclasses.dataclass
+class JournalState:
+    """The state of the tasks, as recorded in the journal."""
+
+    from_block: Optional[int] = None
+    # the last block whose events are final, and its hash
+    final_block: Optional[int] = None
+    final_hash: Optional[str] = None
+    # the tasks that have been received, but whose result has not been stored yet
+    pending: Dict[int, Dict[str, Any]] = dataclasses.field(default_factory=dict)
+    # the number of times each request has timed out
+    timeouts: Dict[int, int] = dataclasses.field(default_factory=dict)
+    # the tasks whose result has been stored on IPFS, but which have not been delivered yet
+    stored: Dict[int, Dict[str, Any]] = dataclasses.field(default_factory=dict)
+    # the snapshot of the index of the open and the delivered requests
+    request_index: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+    def apply(self, kind: str, data: Any) -> None:
+        """Apply a state transition."""
+        if kind == FROM_BLOCK:
+            self.from_block = data
+            return
+        if kind == FINAL_BLOCK:
+            self.final_block, self.final_hash = data["block"], data["hash"]
+            return
+        if kind == REQUEST_INDEX:
+            self.request_index = data
+            return
+        req_id = data["request_id"]
+        if kind == PENDING:
+            self.pending[req_id] = data["task"]
+        elif kind == TIMEOUT:
+            self.timeouts[req_id] = data["count"]
+        elif kind == STORED:
+            self.pending.pop(req_id, None)
+            self.stored[req_id] = data["task"]
+        elif kind == DELIVERED:
+            self.pending.pop(req_id, None)
+            self.stored.pop(req_id, None)
+            self.timeouts.pop(req_id, None)
+
+    def transitions(self) -> Iterator[Tuple[str, Any]]:
+        """Get the transitions that lead to this state."""
+        if self.from_block is not None:
+            yield FROM_BLOCK, self.from_block
+        if self.final_block is not None:
+            yield FINAL_BLOCK, {"block": self.final_block, "hash": self.final_hash}
+        if self.request_index is not None:
+            yield REQUEST_INDEX, self.request_index
+        for req_id, task in self.pending.items():
+            yield PENDING, {"request_id": req_id, "task": task}
+        for req_id, count in self.timeouts.items():
+            yield TIMEOUT, {"request_id": req_id, "count": count}
+        for req_id, task in self.stored.items():
+            yield STORED, {"request_id": req_id, "task": task}
+
+
+class TaskJournal:
+    """
+    An append-only journal of the state transitions of the tasks, stored in SQLite.
+
+    The journal is replayed on startup, so that the agent resumes where it stopped,
+    and it is compacted into a snapshot of the current state once it grows too long.
+    """
+
+    def __init__(self, path: str, compaction_threshold: int = 10_000) -> None:
+        """Open the journal, creating it if it does not exist."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._compaction_threshold = compaction_threshold
+        self._num_entries = 0
+        self.state = JournalState()
+
+    def load(self) -> JournalState:
+        """Replay the journal, compact it and get the recorded state."""
+        state = JournalState()
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, data FROM journal ORDER BY seq")
+            for kind, data in rows:
+                state.apply(kind, json.loads(data, object_hook=_decode))
+        self.state = state
+        self.compact()
+        return state
+
+    def compact(self) -> None:
+        """Replace the journal with the transitions leading to the current state."""
+        rows = self._to_rows(self.state.transitions())
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM journal")
+                self._conn.executemany(
+                    "INSERT INTO journal (kind, data) VALUES (?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._num_entries = len(rows)
+
+    @staticmethod
+    def _to_rows(transitions: Iterator[Tuple[str, Any]]) -> List[Tuple[str, str]]:
+        """Serialize transitions."""
+        return [(kind, json.dumps(data, default=_encode)) for kind, data in transitions]
+
+    def _append(self, kind: str, data: Any) -> None:
+        """Append a transition."""
+        serialized = json.dumps(data, default=_encode)
+        self.state.apply(kind, data)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (kind, data) VALUES (?, ?)", (kind, serialized)
+            )
+            self._num_entries += 1
+        if self._num_entries > self._compaction_threshold:
+            self.compact()
+
+    def _replace(self, kind: str, data: Any) -> None:
+        """Record a transition which supersedes the previous ones of its kind."""
+        serialized = json.dumps(data, default=_encode)
+        self.state.apply(kind, data)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._conn.execute(
+                    "DELETE FROM journal WHERE kind = ?", (kind,)
+                ).rowcount
+                self._conn.execute(
+                    "INSERT INTO journal (kind, data) VALUES (?, ?)", (kind, serialized)
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._num_entries += 1 - removed
+
+    def record_from_block(self, from_block: int) -> None:
+        """Record the block from which to monitor for new requests."""
+        self._append(FROM_BLOCK, from_block)
+
+    def record_final_block(self, final_block: int, final_hash: Optional[str]) -> None:
+        """Record the last block whose events of the mechs are final, and its hash."""
+        self._append(FINAL_BLOCK, {"block": final_block, "hash": final_hash})
+
+    def record_request_index(self, snapshot: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Record the snapshot of the index of the requests, replacing the previous one."""
+        self._replace(REQUEST_INDEX, snapshot)
+
+    def record_pending(self, req_id: int, task: Dict[str, Any]) -> None:
+        """Record a new pending task."""
+        self._append(PENDING, {"request_id": req_id, "task": task})
+
+    def record_timeout(self, req_id: int, count: int) -> None:
+        """Record the number of times a task has timed out."""
+        self._append(TIMEOUT, {"request_id": req_id, "count": count})
+
+    def record_stored(self, req_id: int, done_task: Dict[str, Any]) -> None:
+        """Record that the result of a task has been stored, and it is ready to be delivered."""
+        self._append(STORED, {"request_id": req_id, "task": done_task})
+
+    def record_delivered(self, req_id: int) -> None:
+        """Record that a task has been delivered, or that it no longer needs to be."""
+        self._append(DELIVERED, {"request_id": req_id})
+
+    def close(self) -> None:
+        """Close the journal."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a registry for the models shared by the tools of a worker."""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from packages.valory.skills.task_execution import PUBLIC_ID
+
+
+SPACY = "spacy"
+SENTENCE_TRANSFORMERS = "sentence_transformers"
+
+_logger = logging.getLogger(
+    f"aea.packages.{PUBLIC_ID.author}.skills.{PUBLIC_ID.name}.utils.model_registry"
+)
+
+
+def _load_spacy_model(name: str) -> Any:
+    """Load a spaCy model, downloading it if it is not already available."""
+    import spacy  # pylint: disable=import-outside-toplevel
+
+    try:
+        return spacy.load(name)
+    except OSError:
+        from spacy.cli import download  # pylint: disable=import-outside-toplevel
+
+        download(name)
+        return spacy.load(name)
+
+
+def _load_sentence_transformer(name: str) -> Any:
+    """Load a sentence transformers model."""
+    from sentence_transformers import (  # pylint: disable=import-outside-toplevel
+        SentenceTransformer,
+    )
+
+    return SentenceTransformer(name)
+
+
+class ModelRegistry:
+    """
+    A registry of the models loaded in a (worker) process.
+
+    Models are loaded once, on first use or when preloaded, and are then shared
+    read-only by all the tasks that the process executes.
+    """
+
+    loaders: Dict[str, Callable[[str], Any]] = {
+        SPACY: _load_spacy_model,
+        SENTENCE_TRANSFORMERS: _load_sentence_transformer,
+    }
+
+    def __init__(self) -> None:
+        """Initialize the registry."""
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_models(self) -> List[Tuple[str, str]]:
+        """Get the (type, name) pairs of the loaded models."""
+        return list(self._models.keys())
+
+    def get(self, model_type: str, name: str) -> Any:
+        """Get a model, loading it if it has not been loaded yet."""
+        key = (model_type, name)
+        with self._lock:
+            if key not in self._models:
+                if model_type not in self.loaders:
+                    raise ValueError(f"Unsupported model type {model_type!r}.")
+                self._models[key] = self.loaders[model_type](name)
+            return self._models[key]
+
+    def get_spacy(self, name: str) -> Any:
+        """Get a spaCy model."""
+        return self.get(SPACY, name)
+
+    def get_sentence_transformer(self, name: str) -> Any:
+        """Get a sentence transformers model."""
+        return self.get(SENTENCE_TRANSFORMERS, name)
+
+    def preload(self, model_specs: Iterable[Dict[str, str]]) -> None:
+        """Load the given models, each specified by its `type` and `name`."""
+        for spec in model_specs:
+            self.get(spec["type"], spec["name"])
+
+
+# the registry of the models loaded in this (worker) process
+model_registry = ModelRegistry()
+
+
+def preload_models(model_specs: List[Dict[str, str]]) -> None:
+    """
+    Preload the given models in the current process; meant to be used as a worker initializer.
+
+    A model that fails to load is skipped, with a warning, so that it gets loaded on first use
+    instead of breaking the worker.
+
+    :param model_specs: the models to load, each specified by its `type` and `name`.
+    """
+    for spec in model_specs:
+        try:
+            model_registry.preload([spec])
+        except Exception as e:  # pylint: disable=broad-except
+            _logger.warning(f"Could not preload model {spec}: {e}")
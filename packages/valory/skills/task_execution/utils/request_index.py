@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""This module contains an incremental index of the undelivered requests."""
+
+from typing import Any, Dict, List, Tuple
+
+
+class RequestIndex:
+    """
+    An index of the undelivered requests, kept up to date incrementally.
+
+    Instead of rescanning a range of blocks on every poll, only the new Request and Deliver
+    events are applied as deltas to the set of open requests. Open requests older than
+    `max_age` blocks are dropped. The delivered requests are kept for as long, so that they
+    can be opened again if their delivery is rolled back by a reorg.
+
+    Every change bumps the version of the index, so that its snapshots are only persisted
+    when they differ.
+    """
+
+    def __init__(self, max_age: int) -> None:
+        """Initialize the index."""
+        self._max_age = max_age
+        # maps the contract address and the id of each open request to the request
+        self._open: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        # maps the contract address and the id of each delivered request to the request
+        self._delivered: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        """Get the number of open requests."""
+        return len(self._open)
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        """Check whether a request, identified by its contract address and id, is open."""
+        return key in self._open
+
+    @staticmethod
+    def _key(event: Dict[str, Any]) -> Tuple[str, int]:
+        """Get the key of the request of an event."""
+        return event["contract_address"], event["requestId"]
+
+    def apply(
+        self,
+        requests: List[Dict[str, Any]],
+        delivers: List[Dict[str, Any]],
+        to_block: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply the new events of the blocks up to a block.
+
+        :param requests: the Request events.
+        :param delivers: the Deliver events.
+        :param to_block: the last block scanned.
+        :return: the new requests which have not been delivered yet.
+        """
+        new_requests = {self._key(request): request for request in requests}
+        changed = len(new_requests) > 0
+        for deliver in delivers:
+            key = self._key(deliver)
+            request = new_requests.pop(key, None) or self._open.pop(key, None)
+            if request is not None:
+                self._delivered[key] = request
+                changed = True
+        self._open.update(new_requests)
+        min_block = to_block - self._max_age
+        for index in (self._open, self._delivered):
+            for key in [
+                k for k, req in index.items() if req["block_number"] < min_block
+            ]:
+                del index[key]
+                changed = True
+        if changed:
+            self.version += 1
+        return list(new_requests.values())
+
+    def revert(self, requests: List[Dict[str, Any]]) -> None:
+        """Remove the requests whose events have been rolled back by a reorg."""
+        for request in requests:
+            self._open.pop(self._key(request), None)
+            self._delivered.pop(self._key(request), None)
+        if requests:
+            self.version += 1
+
+    def reopen(self, delivers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Open the requests again, whose Deliver events have been rolled back by a reorg.
+
+        :param delivers: the Deliver events which have been rolled back.
+        :return: the requests which are open again; those not known to the index are skipped.
+        """
+        reopened = []
+        for deliver in delivers:
+            key = self._key(deliver)
+            request = self._delivered.pop(key, None)
+            if request is not None:
+                self._open[key] = request
+                reopened.append(request)
+        if reopened:
+            self.version += 1
+        return reopened
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the open and the delivered requests, e.g., to persist them."""
+        return {
+            "open": list(self._open.values()),
+            "delivered": list(self._delivered.values()),
+        }
+
+    def restore(self, snapshot: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Restore the open and the delivered requests of a snapshot."""
+        self._open = {self._key(request): request for request in snapshot["open"]}
+        self._delivered = {
+            self._key(request): request for request in snapshot["delivered"]
+        }
+        self.version += 1
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a cache of the results of the tools."""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+# the keys of the request data which do not affect the result of a tool
+NON_PARAM_KEYS = frozenset(("prompt", "tool", "model", "nonce"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt, so that prompts differing only in whitespace are considered the same."""
+    return " ".join(prompt.split())
+
+
+def get_cache_key(
+    tool_hash: str, model: Optional[str], task_data: Dict[str, Any]
+) -> str:
+    """
+    Get the cache key of a request.
+
+    :param tool_hash: the IPFS hash of the tool's package.
+    :param model: the model used by the tool.
+    :param task_data: the data of the request.
+    :return: the cache key.
+    """
+    params = {
+        key: value for key, value in task_data.items() if key not in NON_PARAM_KEYS
+    }
+    key_data = [tool_hash, model, normalize_prompt(task_data["prompt"]), params]
+    serialized = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class ResultCache:
+    """An LRU cache of tool results, whose entries expire after a TTL."""
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize the cache."""
+        self._max_size = max_size
+        # maps each key to the expiry time of its result and the result itself
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get the number of cached results."""
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a result, if it is cached and has not expired."""
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+        expiry, result = entry
+        if expiry <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: Any, ttl: float) -> None:
+        """Cache a result for ttl seconds, evicting the least recently used results if full."""
+        if self._max_size <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (time.time() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains the scheduler of the pending tasks."""
+
+import heapq
+import itertools
+import math
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+DEFAULT_LANE = ""
+
+# the priority and the payment (the higher the sooner), and the deadline (the lower the sooner) of a task
+PriorityFn = Callable[[Dict[str, Any]], Tuple[int, int, float]]
+
+
+def default_priority(task: Dict[str, Any]) -> Tuple[int, int, float]:
+    """Get the priority of a task, using its payment, if known, and the block of the request as its deadline."""
+    return 0, task.get("payment", 0), task.get("block_number", math.inf)
+
+
+class _Entry:
+    """An entry of the scheduler."""
+
+    __slots__ = ("key", "req_id", "lane", "task")
+
+    def __init__(
+        self,
+        key: Tuple[int, int, float, int],
+        req_id: Any,
+        lane: str,
+        task: Optional[Dict[str, Any]],
+    ) -> None:
+        """Initialize the entry."""
+        self.key = key
+        self.req_id = req_id
+        self.lane = lane
+        # None once the entry has been removed
+        self.task = task
+
+    def __lt__(self, other: "_Entry") -> bool:
+        """Compare the entries by their key."""
+        return self.key < other.key
+
+
+class TaskScheduler:
+    """
+    A priority queue of pending tasks.
+
+    Tasks are ordered by their priority, then by their payment, then by their
+    deadline, then by arrival. They are deduplicated by their `requestId`. Each
+    lane (e.g., a tool) has its own heap, and among the lanes whose next tasks
+    share the highest priority, the lane that was served least recently goes
+    first, so that a burst of tasks for one tool cannot starve the others.
+    Pushing and popping are O(log n), plus a scan of the, few, lanes on pop.
+
+    The `append` and `extend` methods allow the scheduler to be used in place of
+    the list of pending tasks by the skills that enqueue tasks.
+    """
+
+    def __init__(self, get_priority: PriorityFn = default_priority) -> None:
+        """Initialize the scheduler."""
+        self._get_priority = get_priority
+        self._lanes: Dict[str, List[_Entry]] = {}
+        self._entries: Dict[Any, _Entry] = {}
+        self._counter = itertools.count()
+        # maps each lane to the number of pops when it was last served
+        self._last_served: Dict[str, int] = {}
+        self._num_pops = 0
+
+    def __len__(self) -> int:
+        """Get the number of pending tasks."""
+        return len(self._entries)
+
+    def __contains__(self, req_id: Any) -> bool:
+        """Check whether a request is pending."""
+        return req_id in self._entries
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the pending tasks, in no particular order."""
+        return iter([entry.task for entry in self._entries.values()])  # type: ignore
+
+    def push(self, task: Dict[str, Any], lane: Optional[str] = None) -> bool:
+        """
+        Push a task.
+
+        :param task: the task, identified by its `requestId`.
+        :param lane: the lane of the task; defaults to the task's tool, if known.
+        :return: whether the task was pushed, i.e., it was not already pending.
+        """
+        req_id = task["requestId"]
+        if req_id in self._entries:
+            return False
+        if lane is None:
+            lane = task.get("tool", None) or DEFAULT_LANE
+        priority, payment, deadline = self._get_priority(task)
+        key = (-priority, -payment, deadline, next(self._counter))
+        entry = _Entry(key, req_id, lane, task)
+        self._entries[req_id] = entry
+        heapq.heappush(self._lanes.setdefault(lane, []), entry)
+        return True
+
+    def append(self, task: Dict[str, Any]) -> None:
+        """Push a task, like appending it to a list."""
+        self.push(task)
+
+    def extend(self, tasks: Iterable[Dict[str, Any]]) -> None:
+        """Push several tasks, like extending a list with them."""
+        for task in tasks:
+            self.push(task)
+
+    def remove(self, req_id: Any) -> Optional[Dict[str, Any]]:
+        """Remove a pending task, if present, and return it."""
+        entry = self._entries.pop(req_id, None)
+        if entry is None:
+            return None
+        task, entry.task = entry.task, None
+        return task
+
+    def set_lane(self, req_id: Any, lane: str) -> None:
+        """Move a pending task to another lane, keeping its position in the order."""
+        entry = self._entries.get(req_id, None)
+        if entry is None or entry.lane == lane:
+            return
+        task, entry.task = entry.task, None
+        moved = _Entry(entry.key, req_id, lane, task)
+        self._entries[req_id] = moved
+        heapq.heappush(self._lanes.setdefault(lane, []), moved)
+
+    def _head(self, lane: str) -> Optional[_Entry]:
+        """Get the next task of a lane, dropping the removed ones."""
+        heap = self._lanes[lane]
+        while heap and heap[0].task is None:
+            heapq.heappop(heap)
+        if not heap:
+            del self._lanes[lane]
+            return None
+        return heap[0]
+
+    @staticmethod
+    def _select(heads: Dict[str, _Entry], last_served: Dict[str, int]) -> str:
+        """Select the lane to serve next."""
+        best_priority = min(entry.key[0] for entry in heads.values())
+        return min(
+            (lane for lane, entry in heads.items() if entry.key[0] == best_priority),
+            key=lambda lane: (last_served.get(lane, -1), heads[lane].key),
+        )
+
+    def pop(self) -> Dict[str, Any]:
+        """Pop the next task."""
+        heads = {}
+        for lane in list(self._lanes):
+            head = self._head(lane)
+            if head is not None:
+                heads[lane] = head
+        if not heads:
+            raise IndexError("pop from an empty scheduler")
+        lane = self._select(heads, self._last_served)
+        entry = heapq.heappop(self._lanes[lane])
+        del self._entries[entry.req_id]
+        self._last_served[lane] = self._num_pops
+        self._num_pops += 1
+        return entry.task  # type: ignore
+
+    @staticmethod
+    def _iter_sorted(heap: List[_Entry]) -> Iterator[_Entry]:
+        """Iterate over the tasks of a heap in order, lazily and without modifying the heap."""
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, index = heapq.heappop(frontier)
+            if entry.task is not None:
+                yield entry
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def peek(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Get the next n tasks, in the order in which they would be popped.
+
+        The lanes are merged lazily, starting from their heads, so that only the
+        tasks that are peeked, and their neighbours in the heaps, are visited.
+        """
+        lanes = {lane: self._iter_sorted(heap) for lane, heap in self._lanes.items()}
+        heads = {}
+        for lane, entries in lanes.items():
+            head = next(entries, None)
+            if head is not None:
+                heads[lane] = head
+        last_served = dict(self._last_served)
+        tasks: List[Dict[str, Any]] = []
+        for num_pops in range(self._num_pops, self._num_pops + n):
+            if not heads:
+                break
+            lane = self._select(heads, last_served)
+            tasks.append(heads[lane].task)  # type: ignore
+            last_served[lane] = num_pops
+            head = next(lanes[lane], None)
+            if head is None:
+                del heads[lane]
+            else:
+                heads[lane] = head
+        return tasks
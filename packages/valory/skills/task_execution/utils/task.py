@@ -19,7 +19,22 @@
 
 """This package contains a custom Loader for the ipfs connection."""
 
-from typing import Any
+import os
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from packages.valory.skills.task_execution.utils.model_registry import model_registry
+
+
+# the namespaces of the tools loaded in this (worker) process, keyed by the tool's file hash
+_loaded_tools: Dict[str, Dict[str, Any]] = {}
+# the load statistics of this (worker) process
+_worker_stats: Dict[str, Any] = {
+    "cold_starts": 0,
+    "warm_starts": 0,
+    "cold_start_time": 0.0,
+    "warm_start_time": 0.0,
+}
 
 
 class AnyToolAsTask:
@@ -29,7 +44,53 @@ class AnyToolAsTask:
         """Execute the task."""
         tool_py = kwargs.pop("tool_py")
         callable_method = kwargs.pop("callable_method")
+        kwargs.setdefault("model_registry", model_registry)
         local_namespace: Any = {}
         exec(tool_py, local_namespace)  # pylint: disable=W0122  # nosec
         method = local_namespace[callable_method]
         return method(*args, **kwargs)
+
+    def execute_warm(self, *args: Any, **kwargs: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Execute the task, reusing the tool if it has already been loaded by this worker.
+
+        The tool's source is compiled and executed once per worker process,
+        subsequent tasks for the same tool file hash reuse the loaded namespace.
+
+        :param args: the positional arguments of the tool.
+        :param kwargs: the keyword arguments of the tool.
+        :return: the result of the tool and the load statistics of the worker.
+        """
+        tool_py = kwargs.pop("tool_py")
+        callable_method = kwargs.pop("callable_method")
+        tool_hash = kwargs.pop("tool_hash")
+        kwargs.setdefault("model_registry", model_registry)
+        method, load_stats = self._load_tool(tool_py, callable_method, tool_hash)
+        return method(*args, **kwargs), load_stats
+
+    @staticmethod
+    def _load_tool(
+        tool_py: str, callable_method: str, tool_hash: str
+    ) -> Tuple[Callable, Dict[str, Any]]:
+        """Load a tool, or get it from the ones already loaded by this worker."""
+        start = time.perf_counter()
+        is_warm = tool_hash in _loaded_tools
+        if not is_warm:
+            code = compile(tool_py, f"<tool {tool_hash}>", "exec")
+            namespace: Dict[str, Any] = {}
+            exec(code, namespace)  # pylint: disable=W0122  # nosec
+            _loaded_tools[tool_hash] = namespace
+        method = _loaded_tools[tool_hash][callable_method]
+        load_time = time.perf_counter() - start
+
+        start_type = "warm" if is_warm else "cold"
+        _worker_stats[f"{start_type}_starts"] += 1
+        _worker_stats[f"{start_type}_start_time"] += load_time
+        load_stats = {
+            "pid": os.getpid(),
+            "tool_hash": tool_hash,
+            "is_warm": is_warm,
+            "load_time": load_time,
+            **_worker_stats,
+        }
+        return method, load_stats
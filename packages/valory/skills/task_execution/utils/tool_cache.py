@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains an on-disk cache of the tool packages, keyed by their IPFS hash."""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# the file of a cached package listing the digests of its files, written last
+MANIFEST_FILENAME = ".tool_cache_manifest.json"
+
+
+def _digest(content: str) -> str:
+    """Get the digest of the content of a file."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ToolCache:
+    """
+    A content-addressed cache of tool packages.
+
+    Each package is stored in a directory named after its IPFS hash, along with a manifest
+    of the digests of its files. Since the hash identifies the content, a cached package
+    never needs to be invalidated; a package whose files do not match its manifest, e.g.,
+    because it was corrupted on the disk, is dropped instead of being served.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        """Initialize the cache."""
+        self._cache_dir = Path(cache_dir)
+
+    def _package_dir(self, file_hash: str) -> Path:
+        """Get the directory of a package."""
+        return self._cache_dir / file_hash
+
+    def get(self, file_hash: str) -> Optional[Dict[str, str]]:
+        """
+        Get the files of a cached package.
+
+        :param file_hash: the IPFS hash of the package.
+        :return: the files of the package, mapping their relative paths to their contents, or None if not cached.
+        """
+        package_dir = self._package_dir(file_hash)
+        if not package_dir.is_dir():
+            return None
+        try:
+            manifest = json.loads(
+                (package_dir / MANIFEST_FILENAME).read_text(encoding="utf-8")
+            )
+            files = {
+                relative_path: (package_dir / relative_path).read_text(encoding="utf-8")
+                for relative_path in manifest
+            }
+        except (OSError, ValueError):
+            files = None
+        if files is None or any(
+            _digest(content) != manifest[relative_path]
+            for relative_path, content in files.items()
+        ):
+            # the package is incomplete or corrupted, it is downloaded again
+            shutil.rmtree(package_dir, ignore_errors=True)
+            return None
+        return files
+
+    def put(self, file_hash: str, files: Dict[str, str]) -> None:
+        """
+        Store a package in the cache.
+
+        The package is first written to a temporary directory, its manifest last, and then moved
+        into place, so that a partially written package is never read from the cache.
+
+        :param file_hash: the IPFS hash of the package.
+        :param files: the files of the package, mapping their relative paths to their contents.
+        :raises ValueError: if a path of the package is not inside the package.
+        """
+        package_dir = self._package_dir(file_hash)
+        if (package_dir / MANIFEST_FILENAME).is_file():
+            return
+        tmp_dir = self._cache_dir / f".{file_hash}.{uuid.uuid4().hex}"
+        root = tmp_dir.resolve()
+        paths = {}
+        for relative_path in files:
+            path = (tmp_dir / relative_path).resolve()
+            if root not in path.parents or relative_path == MANIFEST_FILENAME:
+                raise ValueError(
+                    f"Invalid path {relative_path!r} in tool package {file_hash}."
+                )
+            paths[relative_path] = path
+        try:
+            tmp_dir.mkdir(parents=True)
+            for relative_path, content in files.items():
+                path = paths[relative_path]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(content, encoding="utf-8")
+            manifest = {
+                relative_path: _digest(content)
+                for relative_path, content in files.items()
+            }
+            (tmp_dir / MANIFEST_FILENAME).write_text(
+                json.dumps(manifest), encoding="utf-8"
+            )
+            # a package left without its manifest, e.g., by a previous version, is replaced
+            shutil.rmtree(package_dir, ignore_errors=True)
+            os.replace(tmp_dir, package_dir)
+        except OSError:
+            # the package may have been stored concurrently, in which case there is nothing to do
+            if not (package_dir / MANIFEST_FILENAME).is_file():
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
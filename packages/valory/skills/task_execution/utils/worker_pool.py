@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""This module contains a pool of individually supervised worker processes."""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+
+# a task to be executed: the future of its result, the function and its arguments
+_Task = Tuple[Future, Callable, Tuple, dict]
+
+
+class WorkerDiedError(Exception):
+    """A worker died while executing a task."""
+
+
+def _run_worker(
+    conn: Connection, initializer: Optional[Callable], initargs: Tuple
+) -> None:
+    """Run a worker, executing the tasks received through the connection until it is closed."""
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        fn, args, kwargs = task
+        try:
+            result: Tuple[bool, Any] = (True, fn(*args, **kwargs))
+        except BaseException as e:  # pylint: disable=broad-except
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:  # pylint: disable=broad-except
+            # the result or the exception could not be pickled
+            conn.send((False, RuntimeError(f"Could not send the result: {e!r}")))
+
+
+class _Worker:
+    """A worker process with a dedicated connection, executing one task at a time."""
+
+    def __init__(self, initializer: Optional[Callable], initargs: Tuple) -> None:
+        """Start the worker."""
+        ctx = multiprocessing.get_context()
+        self.conn, child_conn = ctx.Pipe()
+        self.process: BaseProcess = ctx.Process(  # type: ignore
+            target=_run_worker, args=(child_conn, initializer, initargs), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.future: Optional[Future] = None
+
+    @property
+    def is_idle(self) -> bool:
+        """Whether the worker is not executing a task."""
+        return self.future is None
+
+    def run(self, task: _Task) -> None:
+        """Send a task to the worker."""
+        future, fn, args, kwargs = task
+        try:
+            self.conn.send((fn, args, kwargs))
+        except Exception as e:  # pylint: disable=broad-except
+            # the task could not be pickled, the worker is left idle
+            future.set_exception(e)
+            return
+        self.future = future
+
+    def collect(self) -> bool:
+        """Set the result of the task if it is ready, returning whether the worker is usable."""
+        future = self.future
+        if future is None:
+            return self.process.is_alive()
+        try:
+            if not self.conn.poll():
+                if self.process.is_alive():
+                    return True
+                raise EOFError()
+            is_success, result = self.conn.recv()
+        except (EOFError, OSError):
+            future.set_exception(
+                WorkerDiedError(
+                    f"Worker {self.process.pid} died with exit code {self.process.exitcode}."
+                )
+            )
+            self.future = None
+            return False
+        if is_success:
+            future.set_result(result)
+        else:
+            future.set_exception(result)
+        self.future = None
+        return True
+
+    def stop(self, kill: bool = False) -> None:
+        """Stop the worker, killing it if it is executing a task or if requested."""
+        if kill or self.future is not None:
+            self.process.kill()
+            self.process.join(timeout=1)
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                self.process.kill()
+        self.conn.close()
+        if self.future is not None:
+            self.future.set_exception(CancelledError())
+            self.future = None
+
+
+class WorkerPool:
+    """
+    A pool of worker processes, one per slot.
+
+    Unlike a process pool executor, each worker is supervised on its own:
+    a task can be cancelled by killing only the worker executing it, and a worker that dies
+    is replaced without affecting the others, which keep their state (e.g., loaded tools and models).
+    The results of the tasks are collected by calling `poll`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+    ) -> None:
+        """Initialize the pool; the workers are started lazily."""
+        self._max_workers = max_workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self._workers: List[_Worker] = []
+        self._backlog: Deque[_Task] = deque()
+
+    def _spawn(self) -> _Worker:
+        """Spawn a worker."""
+        worker = _Worker(self._initializer, self._initargs)
+        self._workers.append(worker)
+        return worker
+
+    def start(self) -> None:
+        """Start all the workers, instead of waiting for the first tasks to do so."""
+        while len(self._workers) < self._max_workers:
+            self._spawn()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """Submit a task, which is queued if all the workers are busy."""
+        future: Future = Future()
+        self._backlog.append((future, fn, args, kwargs))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        """Send the queued tasks to the idle workers."""
+        while self._backlog:
+            worker = next((w for w in self._workers if w.is_idle), None)
+            if worker is None and len(self._workers) < self._max_workers:
+                worker = self._spawn()
+            if worker is None:
+                return
+            task = self._backlog.popleft()
+            if not task[0].set_running_or_notify_cancel():
+                # the task was cancelled while it was queued
+                continue
+            worker.run(task)
+
+    def poll(self) -> None:
+        """Collect the results of the finished tasks and replace the workers that died."""
+        for worker in list(self._workers):
+            if not worker.collect():
+                self._replace(worker)
+        self._dispatch()
+
+    def _replace(self, worker: _Worker, kill: bool = False) -> None:
+        """Stop a worker and start a new one in its place."""
+        worker.stop(kill)
+        self._workers.remove(worker)
+        self._spawn()
+
+    def cancel(self, future: Future) -> bool:
+        """
+        Cancel a task, killing and replacing the worker executing it, if any.
+
+        :param future: the future of the task.
+        :return: whether a worker had to be killed.
+        """
+        if future.cancel():
+            # the task was still queued
+            return False
+        for worker in self._workers:
+            if worker.future is future:
+                self._replace(worker, kill=True)
+                self._dispatch()
+                return True
+        return False
+
+    def shutdown(self) -> None:
+        """Stop all the workers, killing the ones that are executing a task."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        while self._backlog:
+            self._backlog.popleft()[0].cancel()
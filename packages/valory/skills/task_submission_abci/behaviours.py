@@ -19,11 +19,22 @@
 
 """This package contains round behaviours of TaskExecutionAbciApp."""
 import json
-import threading
+import math
+import os
 import time
 from abc import ABC
-from copy import deepcopy
-from typing import Any, Dict, Generator, List, Optional, Set, Type, cast
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    cast,
+)
 
 import openai  # noqa
 from aea.helpers.cid import CID, to_v1
@@ -40,7 +51,6 @@ from packages.valory.contracts.gnosis_safe.contract import (
     SafeOperation,
 )
 from packages.valory.contracts.hash_checkpoint.contract import HashCheckpointContract
-from packages.valory.contracts.mech_marketplace.contract import MechMarketplaceContract
 from packages.valory.contracts.multisend.contract import (
     MultiSendContract,
     MultiSendOperation,
@@ -55,7 +65,12 @@ from packages.valory.skills.abstract_round_abci.behaviours import (
 )
 from packages.valory.skills.abstract_round_abci.io_.store import SupportedFiletype
 from packages.valory.skills.task_submission_abci.models import Params
-from packages.valory.skills.task_submission_abci.payloads import TransactionPayload
+from packages.valory.skills.task_submission_abci.payloads import (
+    TRANSACTION_REF,
+    TransactionPayload,
+    encode_done_tasks,
+    get_task_key,
+)
 from packages.valory.skills.task_submission_abci.rounds import (
     SynchronizedData,
     TaskPoolingPayload,
@@ -71,13 +86,30 @@ from packages.valory.skills.transaction_settlement_abci.payload_tools import (
 ZERO_ETHER_VALUE = 0
 AUTO_GAS = SAFE_GAS = 0
 DONE_TASKS = "ready_tasks"
-DONE_TASKS_LOCK = "lock"
 NO_DATA = b""
 ZERO_IPFS_HASH = (
     "f017012200000000000000000000000000000000000000000000000000000000000000000"
 )
+# the prefix of the checkpointed hashes, i.e., of the base16 CIDv1 of the usage files
+CHECKPOINT_HASH_PREFIX = "f01701220"
 FILENAME = "usage"
+USAGE_DELTA_FILENAME = "usage_delta"
+USAGE_MANIFEST_FILENAME = "usage_manifest"
+TRANSACTIONS_FILENAME = "transactions"
+# the number of the latest checkpoints whose usage is kept materialized locally
+MAX_USAGE_VIEWS = 4
+USAGE_VIEW_EXTENSION = ".json"
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+# the gas accounted for each tx of the multisend whose gas cannot be estimated
+DEFAULT_TX_GAS = 100_000
+# the estimated gas of each tx of the multisend is rounded up to a multiple of this, so that the agents,
+# whose estimates are made at slightly different blocks, still select the same delivers
+GAS_ESTIMATE_STEP = 10_000
+# the gas of the safe tx and of the multisend themselves, on top of the gas of the txs they execute
+MULTISEND_GAS_OVERHEAD = 100_000
+# the hash the usage update is estimated with, before the usage of the delivered tasks is known;
+# the gas of the update does not depend on the hash
+USAGE_HASH_PLACEHOLDER = "ff" * 32
 
 
 class TaskExecutionBaseBehaviour(BaseBehaviour, ABC):
@@ -94,20 +126,15 @@ class TaskExecutionBaseBehaviour(BaseBehaviour, ABC):
         return cast(Params, super().params)
 
     @property
-    def done_tasks(self) -> List[Dict[str, Any]]:
+    def done_tasks(self) -> Any:
         """
-        Return the done (ready) tasks from shared state.
+        Return the store of the done (ready) tasks from shared state.
 
-        Use with care, the returned data here is NOT synchronized with the rest of the agents.
+        Use with care, the data here is NOT synchronized with the rest of the agents.
 
-        :returns: the tasks
+        :returns: the store of the tasks, shared with the task execution skill
         """
-        done_tasks = deepcopy(self.context.shared_state.get(DONE_TASKS, []))
-        return cast(List[Dict[str, Any]], done_tasks)
-
-    def done_tasks_lock(self) -> threading.Lock:
-        """Get done_tasks_lock."""
-        return self.context.shared_state[DONE_TASKS_LOCK]
+        return self.context.shared_state[DONE_TASKS]
 
     def remove_tasks(self, submitted_tasks: List[Dict[str, Any]]) -> None:
         """
@@ -115,21 +142,7 @@ class TaskExecutionBaseBehaviour(BaseBehaviour, ABC):
 
         :param submitted_tasks: the done tasks that have already been submitted
         """
-        # run this in a lock
-        # the amount of done tasks will always be relatively low (<<20)
-        # we can afford to do this in a lock
-        with self.done_tasks_lock():
-            done_tasks = self.done_tasks
-            not_submitted = []
-            for done_task in done_tasks:
-                is_submitted = False
-                for submitted_task in submitted_tasks:
-                    if submitted_task["request_id"] == done_task["request_id"]:
-                        is_submitted = True
-                        break
-                if not is_submitted:
-                    not_submitted.append(done_task)
-            self.context.shared_state[DONE_TASKS] = not_submitted
+        self.done_tasks.remove(submitted_tasks)
 
     @property
     def mech_addresses(self) -> List[str]:
@@ -170,18 +183,45 @@ class TaskPoolingBehaviour(TaskExecutionBaseBehaviour, ABC):
     def get_payload_content(self) -> Generator[None, None, str]:
         """Get the payload content."""
         done_tasks = yield from self.get_done_tasks(self.params.task_wait_timeout)
-        return json.dumps(done_tasks)
-
-    def get_done_tasks(self, timeout: float) -> Generator[None, None, List[Dict]]:
+        # the transactions of the tasks are bulky, only a reference to them goes through consensus
+        transactions = {
+            get_task_key(task): task["transaction"]
+            for task in done_tasks
+            if task.get("transaction", None) is not None
+        }
+        transactions_hash = None
+        if len(transactions) > 0:
+            transactions_hash = yield from self.send_to_ipfs(
+                TRANSACTIONS_FILENAME, transactions, filetype=SupportedFiletype.JSON
+            )
+            if transactions_hash is None:
+                self.context.logger.warning(
+                    "Could not save the transactions of the done tasks to IPFS. "
+                    "The tasks with a transaction are left to the next periods."
+                )
+                done_tasks = [
+                    task for task in done_tasks if task.get("transaction", None) is None
+                ]
+        return encode_done_tasks(done_tasks, transactions_hash)
+
+    def get_done_tasks(
+        self, timeout: float
+    ) -> Generator[None, None, Sequence[Dict[str, Any]]]:
         """Wait for tasks to get done in the specified timeout."""
         deadline = time.time() + timeout
+        done_tasks = self.done_tasks
+        seen_version: Optional[int] = None
         while time.time() < deadline:
-            if len(self.done_tasks) == 0:
-                one_second = 1.0
-                yield from self.sleep(one_second)
-                continue
-            # there are done tasks, return all of them
-            return self.done_tasks
+            # the store is only read again once its version changes, so that
+            # any change is noticed, even a removal followed by an addition
+            version = done_tasks.version
+            if version != seen_version:
+                seen_version = version
+                snapshot = done_tasks.snapshot()
+                if len(snapshot) > 0:
+                    # there are done tasks, return all of them
+                    return snapshot
+            yield
 
         # no tasks are ready for this agent
         self.context.logger.info("No tasks were ready within the timeout")
@@ -200,10 +240,26 @@ class TaskPoolingBehaviour(TaskExecutionBaseBehaviour, ABC):
 class DeliverBehaviour(TaskExecutionBaseBehaviour, ABC):
     """Behaviour for tracking task delivery by the agents."""
 
-    def _get_current_delivery_report(
-        self,
-    ) -> Generator[None, None, Optional[Dict[str, Any]]]:
-        """Get the current ."""
+    @property
+    def delivered_tasks(self) -> List[Dict[str, Any]]:
+        """Get the tasks that are being delivered on-chain in the current period."""
+        return self.synchronized_data.done_tasks
+
+    def _get_latest_checkpoint(self) -> Generator[None, None, Optional[str]]:
+        """
+        Get the hash of the latest usage checkpointed on-chain.
+
+        The checkpoint only changes once the tx of a period is settled,
+        so it is fetched once per period.
+
+        :return: the checkpointed hash
+        :yield: None
+        """
+        period_count = self.synchronized_data.period_count
+        latest_checkpoint = self.params.task_mutable_params.latest_checkpoint
+        if latest_checkpoint is not None and latest_checkpoint[0] == period_count:
+            return latest_checkpoint[1]
+
         contract_api_msg = yield from self.get_contract_api_response(
             performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
             contract_address=self.params.hash_checkpoint_address,
@@ -218,19 +274,174 @@ class DeliverBehaviour(TaskExecutionBaseBehaviour, ABC):
             return None
         latest_ipfs_hash = cast(str, contract_api_msg.state.body["data"])
         self.context.logger.debug(f"Latest IPFS hash: {latest_ipfs_hash}")
-        if latest_ipfs_hash == ZERO_IPFS_HASH:
-            return {}
+        self.params.task_mutable_params.latest_checkpoint = (
+            period_count,
+            latest_ipfs_hash,
+        )
+        return latest_ipfs_hash
+
+    @staticmethod
+    def _is_usage_manifest(usage_data: Dict[str, Any]) -> bool:
+        """Check whether a checkpointed file is a manifest, or a whole usage report checkpointed before the deltas."""
+        return set(usage_data.keys()) == {"base", "deltas"}
+
+    @staticmethod
+    def _add_usage(usage: Dict[str, Any], delta: Dict[str, Any]) -> None:
+        """Add the usage of a delta to a usage report, in place."""
+        for agent, tool_usage in delta.items():
+            agent_usage = usage.setdefault(agent, {})
+            for tool, num_reqs in tool_usage.items():
+                agent_usage[tool] = agent_usage.get(tool, 0) + num_reqs
+
+    @staticmethod
+    def _copy_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a usage report, sorting it so that all the agents upload the same file."""
+        return {
+            agent: dict(sorted(usage[agent].items())) for agent in sorted(usage.keys())
+        }
+
+    def _load_usage_view(
+        self, checkpoint: str
+    ) -> Generator[None, None, Optional[Dict[str, Any]]]:
+        """
+        Load the usage of a checkpoint from IPFS.
+
+        The checkpoint is a manifest of a base report and of the deltas uploaded since then,
+        which are folded into the materialized usage.
+
+        :param checkpoint: the checkpointed hash
+        :return: the manifest and the usage of the checkpoint
+        :yield: None
+        """
+        if checkpoint == ZERO_IPFS_HASH:
+            return {"manifest": {"base": None, "deltas": []}, "usage": {}}
         # format the hash
-        ipfs_hash = str(CID.from_string(latest_ipfs_hash))
+        ipfs_hash = str(CID.from_string(checkpoint))
         usage_data = yield from self.get_from_ipfs(
             ipfs_hash, filetype=SupportedFiletype.JSON
         )
         if usage_data is None:
             self.context.logger.warning(
-                f"Could not get usage data from IPFS: {latest_ipfs_hash}"
+                f"Could not get usage data from IPFS: {checkpoint}"
             )
             return None
-        return cast(Dict[str, Any], usage_data)
+        usage_data = cast(Dict[str, Any], usage_data)
+        if not self._is_usage_manifest(usage_data):
+            # the whole usage, it becomes the base of the next deltas
+            manifest = {"base": ipfs_hash, "deltas": []}
+            return {"manifest": manifest, "usage": usage_data}
+
+        manifest = usage_data
+        usage: Dict[str, Any] = {}
+        file_hashes = [] if manifest["base"] is None else [manifest["base"]]
+        for file_hash in file_hashes + manifest["deltas"]:
+            usage_file = yield from self.get_from_ipfs(
+                file_hash, filetype=SupportedFiletype.JSON
+            )
+            if usage_file is None:
+                self.context.logger.warning(
+                    f"Could not get usage file {file_hash} of {checkpoint} from IPFS."
+                )
+                return None
+            self._add_usage(usage, cast(Dict[str, Any], usage_file))
+        return {"manifest": manifest, "usage": usage}
+
+    @property
+    def usage_cache_dir(self) -> Optional[str]:
+        """Get the directory in which the usage views are persisted, if any."""
+        if self.params.usage_cache_dir is None:
+            return None
+        return os.path.join(self.context.data_dir, self.params.usage_cache_dir)
+
+    def _read_usage_view(self, checkpoint: str) -> Optional[Dict[str, Any]]:
+        """Read the usage of a checkpoint from the disk, if it has been persisted."""
+        cache_dir = self.usage_cache_dir
+        if cache_dir is None:
+            return None
+        path = os.path.join(cache_dir, checkpoint + USAGE_VIEW_EXTENSION)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as file:
+                usage_view = json.load(file)
+        except (OSError, ValueError) as e:
+            self.context.logger.warning(f"Could not read usage view {path}: {e}")
+            return None
+        if (
+            not isinstance(usage_view, dict)
+            or usage_view.get("checkpoint") != checkpoint
+        ):
+            self.context.logger.warning(f"Ignoring invalid usage view {path}.")
+            return None
+        return {"manifest": usage_view["manifest"], "usage": usage_view["usage"]}
+
+    def _write_usage_view(self, checkpoint: str, usage_view: Dict[str, Any]) -> None:
+        """Persist the usage of a checkpoint, keeping only the latest ones on the disk."""
+        cache_dir = self.usage_cache_dir
+        if cache_dir is None:
+            return
+        path = os.path.join(cache_dir, checkpoint + USAGE_VIEW_EXTENSION)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"checkpoint": checkpoint, **usage_view}, file)
+            os.replace(tmp_path, path)
+            paths = [
+                os.path.join(cache_dir, filename)
+                for filename in os.listdir(cache_dir)
+                if filename.endswith(USAGE_VIEW_EXTENSION)
+            ]
+            paths.sort(key=os.path.getmtime, reverse=True)
+            for stale_path in paths[MAX_USAGE_VIEWS:]:
+                os.remove(stale_path)
+        except OSError as e:
+            self.context.logger.warning(f"Could not persist usage view {path}: {e}")
+
+    def _store_usage_view(
+        self, checkpoint: str, usage_view: Dict[str, Any], persist: bool = True
+    ) -> None:
+        """Keep the usage of a checkpoint materialized locally."""
+        usage_views = self.params.task_mutable_params.usage_views
+        usage_views.pop(checkpoint, None)
+        usage_views[checkpoint] = usage_view
+        while len(usage_views) > MAX_USAGE_VIEWS:
+            usage_views.pop(next(iter(usage_views)))
+        if persist:
+            self._write_usage_view(checkpoint, usage_view)
+
+    def _get_usage_view(
+        self,
+    ) -> Generator[None, None, Optional[Tuple[str, Dict[str, Any]]]]:
+        """Get the latest checkpoint, along with its manifest and its usage, materialized locally."""
+        checkpoint = yield from self._get_latest_checkpoint()
+        if checkpoint is None:
+            return None
+        usage_view = self.params.task_mutable_params.usage_views.get(checkpoint, None)
+        if usage_view is not None:
+            return checkpoint, usage_view
+
+        # the usage persisted before a restart
+        usage_view = self._read_usage_view(checkpoint)
+        if usage_view is not None:
+            self._store_usage_view(checkpoint, usage_view, persist=False)
+            return checkpoint, usage_view
+
+        usage_view = yield from self._load_usage_view(checkpoint)
+        if usage_view is None:
+            return None
+        self._store_usage_view(checkpoint, usage_view)
+        return checkpoint, usage_view
+
+    def _get_current_delivery_report(
+        self,
+    ) -> Generator[None, None, Optional[Dict[str, Any]]]:
+        """Get the current usage, i.e., the one of the latest checkpoint."""
+        latest = yield from self._get_usage_view()
+        if latest is None:
+            return None
+        _checkpoint, usage_view = latest
+        return self._copy_usage(usage_view["usage"])
 
     def _update_current_delivery_report(
         self,
@@ -269,8 +480,9 @@ class DeliverBehaviour(TaskExecutionBaseBehaviour, ABC):
             self.context.logger.warning("Could not get current usage.")
             return None
 
-        done_tasks = self.synchronized_data.done_tasks
-        updated_usage = self._update_current_delivery_report(current_usage, done_tasks)
+        updated_usage = self._update_current_delivery_report(
+            current_usage, self.delivered_tasks
+        )
         return updated_usage
 
 
@@ -631,26 +843,76 @@ class TrackingBehaviour(DeliverBehaviour, ABC):
         }
 
     def _save_usage_to_ipfs(
-        self, current_usage: Dict[str, Any]
+        self, current_usage: Dict[str, Any], filename: str = FILENAME
     ) -> Generator[None, None, Optional[str]]:
         """Save usage to ipfs."""
         ipfs_hash = yield from self.send_to_ipfs(
-            FILENAME, current_usage, filetype=SupportedFiletype.JSON
+            filename, current_usage, filetype=SupportedFiletype.JSON
         )
         if ipfs_hash is None:
             self.context.logger.warning("Could not update usage.")
             return None
         return ipfs_hash
 
+    def _get_updated_manifest(
+        self,
+        manifest: Dict[str, Any],
+        delta: Dict[str, Any],
+        updated_usage: Dict[str, Any],
+    ) -> Generator[None, None, Optional[Dict[str, Any]]]:
+        """
+        Get the manifest of the usage, once updated with the delta of the current period.
+
+        Only the delta is uploaded, unless the manifest is due for compaction.
+        In that case, the whole usage is uploaded as the new base, and the deltas are dropped.
+
+        :param manifest: the manifest of the latest checkpoint
+        :param delta: the usage of the tasks delivered in the current period
+        :param updated_usage: the usage, including the delta
+        :return: the updated manifest
+        :yield: None
+        """
+        if len(delta) == 0:
+            return manifest
+
+        num_deltas = len(manifest["deltas"]) + 1
+        if num_deltas >= self.params.usage_compaction_interval:
+            base_hash = yield from self._save_usage_to_ipfs(updated_usage)
+            if base_hash is None:
+                return None
+            self.context.logger.info(f"Compacted {num_deltas} usage deltas.")
+            return {"base": base_hash, "deltas": []}
+
+        delta_hash = yield from self._save_usage_to_ipfs(delta, USAGE_DELTA_FILENAME)
+        if delta_hash is None:
+            return None
+        return {"base": manifest["base"], "deltas": manifest["deltas"] + [delta_hash]}
+
     def get_update_usage_tx(self) -> Generator:
         """Get a tx to update the usage."""
-        updated_usage = yield from self.get_delivery_report()
-        if updated_usage is None:
+        latest = yield from self._get_usage_view()
+        if latest is None:
             # something went wrong
             self.context.logger.warning("Could not get current usage.")
             return None
 
-        ipfs_hash = yield from self._save_usage_to_ipfs(updated_usage)
+        _checkpoint, usage_view = latest
+        delta = self._copy_usage(
+            self._update_current_delivery_report({}, self.delivered_tasks)
+        )
+        updated_usage = self._copy_usage(usage_view["usage"])
+        self._add_usage(updated_usage, delta)
+        updated_manifest = yield from self._get_updated_manifest(
+            usage_view["manifest"], delta, updated_usage
+        )
+        if updated_manifest is None:
+            # something went wrong
+            self.context.logger.warning("Could not save usage to IPFS.")
+            return None
+
+        ipfs_hash = yield from self._save_usage_to_ipfs(
+            updated_manifest, USAGE_MANIFEST_FILENAME
+        )
         if ipfs_hash is None:
             # something went wrong
             self.context.logger.warning("Could not save usage to IPFS.")
@@ -658,6 +920,11 @@ class TrackingBehaviour(DeliverBehaviour, ABC):
 
         self.context.logger.info(f"Saved updated usage to IPFS: {ipfs_hash}")
         ipfs_hash = self.to_multihash(to_v1(ipfs_hash))
+        # the usage is known in advance, in case the checkpoint gets settled
+        self._store_usage_view(
+            CHECKPOINT_HASH_PREFIX + ipfs_hash,
+            {"manifest": updated_manifest, "usage": updated_usage},
+        )
         tx = yield from self._get_checkpoint_tx(
             self.params.hash_checkpoint_address, ipfs_hash
         )
@@ -755,44 +1022,105 @@ class TransactionPreparationBehaviour(
             yield from self.wait_until_round_end()
         self.set_done()
 
+    def __init__(self, **kwargs: Any) -> None:
+        """Initialize the behaviour."""
+        super().__init__(**kwargs)
+        self._delivered_tasks: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def delivered_tasks(self) -> List[Dict[str, Any]]:
+        """Get the tasks that are being delivered on-chain in the current period."""
+        if self._delivered_tasks is None:
+            return super().delivered_tasks
+        return self._delivered_tasks
+
     def get_payload_content(self) -> Generator[None, None, str]:
         """Prepare the transaction"""
-        all_txs = []
+        done_tasks = self.synchronized_data.done_tasks
+        deliver_txs = yield from self._get_deliver_txs(done_tasks)
+        if deliver_txs is None:
+            # something went wrong, respond with ERROR payload for now
+            # nothing should proceed if this happens
+            return TransactionPreparationRound.ERROR_PAYLOAD
+
+        delivers = []
+        for task, deliver_tx in zip(done_tasks, deliver_txs):
+            simulation_ok = deliver_tx.pop("simulation_ok", False)
+            if not simulation_ok:
+                # the simulation failed, log a warning and skip this deliver
+                self.context.logger.warning(
+                    f"Deliver tx simulation failed for task {task}. Skipping this deliver."
+                )
+                # remove the task from the list of done tasks
+                self.remove_tasks([task])
+                continue
+            delivers.append((task, deliver_tx))
+
+        # the txs of the tasks are needed, so that all the agents build the same multisend
+        transactions = yield from self._get_transactions([task for task, _ in delivers])
+        if transactions is None:
+            return TransactionPreparationRound.ERROR_PAYLOAD
+
+        fixed_txs = []
         update_hash_tx = yield from self.get_mech_update_hash_tx()
         if update_hash_tx is not None:
             # in case of None, the agent should not update the hash
             # if this is caused by an error, the agent should still proceed with the rest
             # of the txs. The error will be logged.
-            all_txs.append(update_hash_tx)
+            fixed_txs.append(update_hash_tx)
 
         split_profit_txs = yield from self.get_split_profit_txs()
         if split_profit_txs is not None:
             # in case of None, the agent should not update the hash
             # if this is caused by an error, the agent should still proceed with the rest
             # of the txs. The error will be logged.
-            all_txs.extend(split_profit_txs)
+            fixed_txs.extend(split_profit_txs)
 
-        for task in self.synchronized_data.done_tasks:
-            deliver_tx = yield from self._get_deliver_tx(task)
-            if deliver_tx is None:
-                # something went wrong, respond with ERROR payload for now
-                # nothing should proceed if this happens
-                return TransactionPreparationRound.ERROR_PAYLOAD
+        usage_placeholder_tx = yield from self._get_checkpoint_tx(
+            self.params.hash_checkpoint_address, USAGE_HASH_PLACEHOLDER
+        )
+        if usage_placeholder_tx is None:
+            return TransactionPreparationRound.ERROR_PAYLOAD
 
-            simulation_ok = deliver_tx.pop("simulation_ok", False)
-            if not simulation_ok:
-                # the simulation failed, log a warning and skip this deliver
-                self.context.logger.warning(
-                    f"Deliver tx simulation failed for task {task}. Skipping this deliver."
+        # the txs of each deliver, i.e., the deliver itself and the tx of its task, if any
+        deliver_txs_by_task = []
+        for task, deliver_tx in delivers:
+            response_tx = transactions.get(get_task_key(task), None)
+            txs = [deliver_tx] if response_tx is None else [deliver_tx, response_tx]
+            deliver_txs_by_task.append(txs)
+        gas = yield from self._estimate_gas(
+            fixed_txs
+            + [usage_placeholder_tx]
+            + [tx for txs in deliver_txs_by_task for tx in txs]
+        )
+        if gas is None:
+            return TransactionPreparationRound.ERROR_PAYLOAD
+
+        num_fixed = len(fixed_txs) + 1
+        fixed_gas = sum(gas[:num_fixed])
+        gas_by_task = []
+        offset = num_fixed
+        for txs in deliver_txs_by_task:
+            gas_by_task.append(sum(gas[offset : offset + len(txs)]))
+            offset += len(txs)
+        selected, total_gas = self._select_delivers(
+            [
+                (task, txs, task_gas)
+                for (task, _), txs, task_gas in zip(
+                    delivers, deliver_txs_by_task, gas_by_task
                 )
-                # remove the task from the list of done tasks
-                self.remove_tasks([task])
-                continue
+            ],
+            fixed_gas,
+        )
+        self._delivered_tasks = [task for task, _, _ in selected]
 
-            all_txs.append(deliver_tx)
-            response_tx = task.get("transaction", None)
-            if response_tx is not None:
-                all_txs.append(response_tx)
+        all_txs = list(fixed_txs)
+        for task, txs, _ in selected:
+            if task.get("is_marketplace_mech", False):
+                self.context.logger.info(
+                    f"Delivering reqId {task['request_id']} to marketplace mech contract."
+                )
+            all_txs.extend(txs)
 
         update_usage_tx = yield from self.get_update_usage_tx()
         if update_usage_tx is None:
@@ -801,17 +1129,152 @@ class TransactionPreparationBehaviour(
             return TransactionPreparationRound.ERROR_PAYLOAD
 
         all_txs.append(update_usage_tx)
-        multisend_tx_str = yield from self._to_multisend(all_txs)
+        multisend_tx_str = yield from self._to_multisend(
+            all_txs, total_gas + MULTISEND_GAS_OVERHEAD
+        )
         if multisend_tx_str is None:
             # something went wrong, respond with ERROR payload for now
             return TransactionPreparationRound.ERROR_PAYLOAD
 
-        return multisend_tx_str
+        # the mech address is part of the key, since the request ids of different mechs may clash
+        request_ids = [
+            [task["mech_address"], task["request_id"]] for task in self.delivered_tasks
+        ]
+        return json.dumps({"tx_hash": multisend_tx_str, "request_ids": request_ids})
+
+    def _get_transactions(
+        self, tasks: List[Dict[str, Any]]
+    ) -> Generator[None, None, Optional[Dict[str, Any]]]:
+        """
+        Get the transactions of the done tasks, which are referenced by the tasks.
+
+        The transactions of the tasks executed by this agent are known locally,
+        those of the other agents are fetched from IPFS, once per agent.
+
+        :param tasks: the done tasks
+        :return: the transactions of the tasks, keyed by `get_task_key`
+        :yield: None
+        """
+        transactions: Dict[str, Any] = {}
+        transaction_files: Dict[str, Dict[str, Any]] = {}
+        for task in tasks:
+            transactions_hash = task.get(TRANSACTION_REF, None)
+            if transactions_hash is None:
+                continue
+            key = get_task_key(task)
+            local_task = self.done_tasks.get((task["mech_address"], task["request_id"]))
+            if (
+                local_task is not None
+                and local_task["task_executor_address"] == self.context.agent_address
+                and local_task["task_result"] == task["task_result"]
+            ):
+                transactions[key] = local_task["transaction"]
+                continue
+
+            if transactions_hash not in transaction_files:
+                transaction_file = yield from self.get_from_ipfs(
+                    transactions_hash, filetype=SupportedFiletype.JSON
+                )
+                if transaction_file is None:
+                    self.context.logger.warning(
+                        f"Could not get the transactions {transactions_hash} from IPFS."
+                    )
+                    return None
+                transaction_files[transactions_hash] = cast(
+                    Dict[str, Any], transaction_file
+                )
+            transaction = transaction_files[transactions_hash].get(key, None)
+            if transaction is None:
+                self.context.logger.warning(
+                    f"The transaction of task {key} is missing from {transactions_hash}."
+                )
+                return None
+            transactions[key] = transaction
+        return transactions
+
+    def _estimate_gas(
+        self, txs: List[Dict[str, Any]]
+    ) -> Generator[None, None, Optional[List[int]]]:
+        """
+        Estimate the gas of the txs of the multisend, as sent by the safe.
+
+        The estimates are rounded up to a multiple of `GAS_ESTIMATE_STEP`, so that all the agents
+        build the same multisend. The txs whose gas cannot be estimated are accounted for with
+        `DEFAULT_TX_GAS`. Each estimate includes the intrinsic gas of a standalone tx,
+        which serves as a margin, since the txs are executed as calls of the multisend.
+
+        :param txs: the txs
+        :return: the gas of each tx
+        :yield: None
+        """
+        contract_api_msg = yield from self.get_contract_api_response(
+            performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
+            contract_address=self.synchronized_data.safe_contract_address,
+            contract_id=str(AgentMechContract.contract_id),
+            contract_callable="estimate_txs_gas",
+            txs=txs,
+        )
+        if (
+            contract_api_msg.performative != ContractApiMessage.Performative.STATE
+        ):  # pragma: nocover
+            self.context.logger.warning(
+                f"estimate_txs_gas unsuccessful!: {contract_api_msg}"
+            )
+            return None
+
+        estimates = cast(List[Optional[int]], contract_api_msg.state.body["data"])
+        return [
+            DEFAULT_TX_GAS
+            if estimate is None
+            else math.ceil(estimate / GAS_ESTIMATE_STEP) * GAS_ESTIMATE_STEP
+            for estimate in estimates
+        ]
+
+    def _select_delivers(
+        self,
+        delivers: List[Tuple[Dict[str, Any], List[Dict[str, Any]], int]],
+        fixed_gas: int,
+    ) -> Tuple[List[Tuple[Dict[str, Any], List[Dict[str, Any]], int]], int]:
+        """
+        Select the delivers of the current period, so that the multisend stays under the gas budget.
+
+        The most valuable delivers are selected first. The rest of them stay in the done tasks,
+        and they are delivered in the next periods.
+
+        :param delivers: the done tasks, along with their txs and the gas of these txs.
+        :param fixed_gas: the gas of the rest of the txs of the multisend, e.g., the usage update.
+        :return: the selected delivers, and the gas of all the txs of the multisend.
+        """
+        total_gas = fixed_gas
+        selected = []
+        # the order only depends on the synchronized tasks, so all the agents agree on it
+        by_value = sorted(
+            delivers,
+            key=lambda deliver: (
+                -(deliver[0].get("cost", None) or 0),
+                deliver[0]["mech_address"],
+                str(deliver[0]["request_id"]),
+            ),
+        )
+        for task, txs, gas in by_value:
+            # at least one deliver is always selected, so that the tasks keep being delivered
+            if selected and total_gas + gas > self.params.multisend_gas_budget:
+                continue
+            total_gas += gas
+            selected.append((task, txs, gas))
+
+        if len(selected) < len(delivers):
+            self.context.logger.info(
+                f"Delivering {len(selected)} out of {len(delivers)} tasks in this period, "
+                f"to stay under the gas budget of {self.params.multisend_gas_budget}. "
+                f"The rest of them will be delivered in the next periods."
+            )
+        return selected, total_gas
 
     def _to_multisend(
-        self, transactions: List[Dict]
+        self, transactions: List[Dict], gas_limit: int
     ) -> Generator[None, None, Optional[str]]:
-        """Transform payload to MultiSend."""
+        """Transform payload to MultiSend, with the given gas limit."""
         multi_send_txs = []
         for transaction in transactions:
             transaction = {
@@ -852,7 +1315,7 @@ class TransactionPreparationBehaviour(
             operation=SafeOperation.DELEGATE_CALL.value,
             to_address=self.params.multisend_address,
             data=tx_data,
-            gas_limit=self.params.manual_gas_limit,
+            gas_limit=gas_limit,
         )
         return payload_data
 
@@ -890,51 +1353,20 @@ class TransactionPreparationBehaviour(
         tx_hash = cast(str, response.state.body["tx_hash"])[2:]
         return tx_hash
 
-    def _get_agent_mech_deliver_tx(
-        self,
-        task_data: Dict[str, Any],
-    ) -> Generator[None, None, Optional[Dict]]:
-        """Get the deliver tx for the mech delivery."""
-        contract_api_msg = yield from self.get_contract_api_response(
-            performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
-            contract_address=task_data["mech_address"],
-            contract_id=str(AgentMechContract.contract_id),
-            contract_callable="get_deliver_data",
-            sender_address=self.synchronized_data.safe_contract_address,
-            request_id=task_data["request_id"],
-            data=task_data["task_result"],
-            request_id_nonce=task_data["request_id_nonce"],
-        )
-        if (
-            contract_api_msg.performative != ContractApiMessage.Performative.STATE
-        ):  # pragma: nocover
-            self.context.logger.warning(
-                f"get_deliver_data unsuccessful!: {contract_api_msg}"
-            )
-            return None
-
-        data = cast(bytes, contract_api_msg.state.body["data"])
-        simulation_ok = cast(bool, contract_api_msg.state.body["simulation_ok"])
-        return {
-            "to": task_data["mech_address"],
-            "value": ZERO_ETHER_VALUE,
-            "data": data,
-            "simulation_ok": simulation_ok,
-        }
+    def _get_deliver_txs(
+        self, tasks: List[Dict[str, Any]]
+    ) -> Generator[None, None, Optional[List[Dict[str, Any]]]]:
+        """Get the deliver txs of the tasks, simulated all at once."""
+        if len(tasks) == 0:
+            return []
 
-    def _get_deliver_marketplace_tx(
-        self,
-        task_data: Dict[str, Any],
-    ) -> Generator[None, None, Optional[Dict]]:
-        """Get the deliver tx for the marketplace delivery."""
         contract_api_msg = yield from self.get_contract_api_response(
             performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
-            contract_address=self.params.mech_marketplace_address,
-            contract_id=str(MechMarketplaceContract.contract_id),
-            contract_callable="get_deliver_data",
-            sender_address=task_data["mech_address"],
-            request_id=task_data["request_id"],
-            data=task_data["task_result"],
+            contract_address=self.synchronized_data.safe_contract_address,
+            contract_id=str(AgentMechContract.contract_id),
+            contract_callable="get_batch_deliver_data",
+            tasks=tasks,
+            mech_marketplace_address=self.params.mech_marketplace_address,
             delivery_mech_staking_instance=self.params.mech_staking_instance_address,
             delivery_mech_service_id=self.params.on_chain_service_id,
         )
@@ -942,53 +1374,11 @@ class TransactionPreparationBehaviour(
             contract_api_msg.performative != ContractApiMessage.Performative.STATE
         ):  # pragma: nocover
             self.context.logger.warning(
-                f"get_deliver_data unsuccessful!: {contract_api_msg}"
-            )
-            return None
-
-        data = cast(bytes, contract_api_msg.state.body["data"])
-        simulation_ok = cast(bool, contract_api_msg.state.body["simulation_ok"])
-
-        contract_api_msg = yield from self.get_contract_api_response(
-            performative=ContractApiMessage.Performative.GET_STATE,  # type: ignore
-            contract_address=task_data["mech_address"],
-            contract_id=str(AgentMechContract.contract_id),
-            contract_callable="get_exec_tx_data",
-            to=self.params.mech_marketplace_address,
-            value=ZERO_ETHER_VALUE,
-            data=data,
-            tx_gas=AUTO_GAS,
-            operation=MechOperation.CALL.value,
-        )
-        if (
-            contract_api_msg.performative != ContractApiMessage.Performative.STATE
-        ):  # pragma: nocover
-            self.context.logger.warning(
-                f"get_deliver_data unsuccessful!: {contract_api_msg}"
+                f"get_batch_deliver_data unsuccessful!: {contract_api_msg}"
             )
             return None
 
-        data = cast(bytes, contract_api_msg.state.body["data"])
-        return {
-            "to": task_data["mech_address"],
-            "value": ZERO_ETHER_VALUE,
-            "data": data,
-            "simulation_ok": simulation_ok,
-        }
-
-    def _get_deliver_tx(
-        self, task_data: Dict[str, Any]
-    ) -> Generator[None, None, Optional[Dict]]:
-        """Get the deliver tx."""
-        is_marketplace_mech = task_data.get("is_marketplace_mech", False)
-        request_id = task_data["request_id"]
-        if is_marketplace_mech:
-            self.context.logger.info(
-                f"Delivering reqId {request_id} to marketplace mech contract."
-            )
-            return self._get_deliver_marketplace_tx(task_data)
-
-        return self._get_agent_mech_deliver_tx(task_data)
+        return cast(List[Dict[str, Any]], contract_api_msg.state.body["data"])
 
 
 class TaskSubmissionRoundBehaviour(AbstractRoundBehaviour):
@@ -18,8 +18,8 @@
 # ------------------------------------------------------------------------------
 
 """This module contains the shared state for the abci skill of TaskExecutionAbciApp."""
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, Type
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple, Type
 
 from aea.exceptions import enforce
 
@@ -48,6 +48,10 @@ class MutableParams(TypeCheckMixin):
     """Collection for the mutable parameters."""
 
     latest_metadata_hash: Optional[bytes] = None
+    # the period in which the latest checkpoint of the usage was fetched, and the checkpoint
+    latest_checkpoint: Optional[Tuple[int, str]] = None
+    # the materialized views of the usage reports, keyed by their checkpoint hash
+    usage_views: Dict[str, Dict[str, Any]] = field(default_factory=dict)
 
 
 class Params(BaseParams):
@@ -66,6 +70,20 @@ class Params(BaseParams):
         self.metadata_hash: str = self._ensure("metadata_hash", kwargs, str)
         self.task_mutable_params = MutableParams()
         self.manual_gas_limit = self._ensure_get("manual_gas_limit", kwargs, int)
+        self.multisend_gas_budget = self._ensure("multisend_gas_budget", kwargs, int)
+        enforce(
+            self.multisend_gas_budget > 0,
+            "`multisend_gas_budget` must be a positive number of gas units.",
+        )
+        self.usage_compaction_interval = self._ensure(
+            "usage_compaction_interval", kwargs, int
+        )
+        enforce(
+            self.usage_compaction_interval > 0,
+            "`usage_compaction_interval` must be a positive number of updates.",
+        )
+        # the directory of the persisted usage views, relative to the data dir; if None, they are not persisted
+        self.usage_cache_dir = self._ensure("usage_cache_dir", kwargs, Optional[str])
         self.service_owner_share = self._ensure("service_owner_share", kwargs, float)
         self.profit_split_freq = self._ensure("profit_split_freq", kwargs, int)
         self.agent_mech_contract_addresses = self._ensure(
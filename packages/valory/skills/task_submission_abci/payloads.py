@@ -19,11 +19,72 @@
 
 """This module contains the transaction payloads of the TaskExecutionAbciApp."""
 
+import json
 from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
 
 from packages.valory.skills.abstract_round_abci.base import BaseTxPayload
 
 
+# the fields of the done tasks that go through consensus, the rest of them are referenced
+TASK_FIELDS = (
+    "request_id",
+    "mech_address",
+    "task_executor_address",
+    "tool",
+    "request_id_nonce",
+    "is_marketplace_mech",
+    "task_result",
+    "cost",
+)
+# the ipfs hash of the file with the transaction of a task, keyed by `get_task_key`
+TRANSACTION_REF = "transaction_ref"
+
+
+def get_task_key(task: Dict[str, Any]) -> str:
+    """Get the key of a done task in the file with the transactions of the tasks."""
+    return f"{task['mech_address']}/{task['request_id']}"
+
+
+def encode_done_tasks(
+    done_tasks: Sequence[Dict[str, Any]], transactions_hash: Optional[str]
+) -> str:
+    """
+    Encode the done tasks in the content of a `TaskPoolingPayload`.
+
+    Each task is encoded as the list of the values of its `TASK_FIELDS`,
+    along with whether its transaction is in the file of the transactions.
+
+    :param done_tasks: the done tasks
+    :param transactions_hash: the ipfs hash of the file with the transactions of the tasks, if any
+    :return: the content of the payload
+    """
+    tasks = [
+        [task.get(field, None) for field in TASK_FIELDS]
+        + [int(task.get("transaction", None) is not None)]
+        for task in done_tasks
+    ]
+    content = {"tasks": tasks, "transactions": transactions_hash}
+    return json.dumps(content, separators=(",", ":"))
+
+
+def decode_done_tasks(content: str) -> List[Dict[str, Any]]:
+    """Decode the done tasks from the content of a `TaskPoolingPayload`."""
+    decoded = json.loads(content)
+    done_tasks = []
+    for values in decoded["tasks"]:
+        # the fields which the task does not have are encoded as None
+        task = {
+            field: value
+            for field, value in zip(TASK_FIELDS, values)
+            if value is not None
+        }
+        if values[len(TASK_FIELDS)]:
+            task[TRANSACTION_REF] = decoded["transactions"]
+        done_tasks.append(task)
+    return done_tasks
+
+
 @dataclass(frozen=True)
 class TaskPoolingPayload(BaseTxPayload):
     """Represent a transaction payload for the TaskPoolingRound."""
@@ -36,6 +36,7 @@ from packages.valory.skills.abstract_round_abci.base import (
 from packages.valory.skills.task_submission_abci.payloads import (
     TaskPoolingPayload,
     TransactionPayload,
+    decode_done_tasks,
 )
 
 
@@ -91,21 +92,23 @@ class TaskPoolingRound(CollectionRound):
             all_done_tasks = []
             for payload in self.collection.values():
                 done_tasks_str = cast(TaskPoolingPayload, payload).content
-                done_tasks = json.loads(done_tasks_str)
+                done_tasks = decode_done_tasks(done_tasks_str)
                 all_done_tasks.extend(done_tasks)
 
-            # Set to store unique request_ids
-            unique_ids = set()
+            # Set to store unique (mech_address, request_id) keys
+            unique_keys = set()
             unique_objects = []
 
-            # filter out the tasks that have duplicate ids
+            # filter out the tasks that have duplicate keys
             for obj in all_done_tasks:
-                request_id = obj.get("request_id")
-                if request_id not in unique_ids:
-                    unique_ids.add(request_id)
+                key = (obj.get("mech_address"), obj.get("request_id"))
+                if key not in unique_keys:
+                    unique_keys.add(key)
                     unique_objects.append(obj)
 
-            unique_done_tasks = sorted(unique_objects, key=lambda x: x["request_id"])
+            unique_done_tasks = sorted(
+                unique_objects, key=lambda x: (x["request_id"], x["mech_address"])
+            )
             synchronized_data = self.synchronized_data.update(
                 synchronized_data_class=SynchronizedData,
                 **{
@@ -142,12 +145,22 @@ class TransactionPreparationRound(CollectSameUntilThresholdRound):
                     Event.ERROR,
                 )
 
+            payload = json.loads(self.most_voted_payload)
+            # the tasks that are not delivered in this period are left to the next ones
+            delivered_keys = {
+                (mech_address, request_id)
+                for mech_address, request_id in payload["request_ids"]
+            }
+            delivered_tasks = [
+                task
+                for task in self.synchronized_data.done_tasks
+                if (task["mech_address"], task["request_id"]) in delivered_keys
+            ]
             state = self.synchronized_data.update(
                 synchronized_data_class=self.synchronized_data_class,
                 **{
-                    get_name(
-                        SynchronizedData.most_voted_tx_hash
-                    ): self.most_voted_payload,
+                    get_name(SynchronizedData.most_voted_tx_hash): payload["tx_hash"],
+                    get_name(SynchronizedData.done_tasks): delivered_tasks,
                 }
             )
             return state, Event.DONE
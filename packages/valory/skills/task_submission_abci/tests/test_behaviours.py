@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the behaviours of the task submission skill."""
+
+# pylint: disable=protected-access
+
+import hashlib
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from unittest import mock
+
+import pytest
+
+from packages.valory.skills.task_submission_abci import behaviours
+from packages.valory.skills.task_submission_abci.behaviours import (
+    DEFAULT_TX_GAS,
+    GAS_ESTIMATE_STEP,
+    TrackingBehaviour,
+    TransactionPreparationBehaviour,
+)
+
+
+def _run(generator: Generator) -> Any:
+    """Run a generator of a behaviour, returning its result."""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as e:
+        return e.value
+
+
+def _deliver(
+    mech_address: str, request_id: int, cost: Optional[int], gas: int = 150_000
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], int]:
+    """Get a done task, along with its txs and their gas."""
+    task = {"mech_address": mech_address, "request_id": request_id, "cost": cost}
+    return task, [{"to": mech_address, "data": b""}], gas
+
+
+def _select(
+    budget: int,
+    delivers: List[Tuple[Dict[str, Any], List[Dict[str, Any]], int]],
+    fixed_gas: int = 0,
+) -> Tuple[List[Tuple[str, int]], int]:
+    """Select the delivers under a budget, returning their keys and their total gas."""
+    behaviour = SimpleNamespace(
+        params=SimpleNamespace(multisend_gas_budget=budget),
+        context=mock.MagicMock(),
+    )
+    selected, total_gas = TransactionPreparationBehaviour._select_delivers(  # type: ignore
+        behaviour, delivers, fixed_gas
+    )
+    return [
+        (task["mech_address"], task["request_id"]) for task, _, _ in selected
+    ], total_gas
+
+
+class TestSelectDelivers:
+    """Test the selection of the delivers of a period."""
+
+    def test_all_delivers_under_budget(self) -> None:
+        """Test that all the delivers are selected when they fit in the budget, the most valuable first."""
+        delivers = [
+            _deliver("0xa", 1, 1),
+            _deliver("0xa", 2, 5),
+            _deliver("0xb", 1, None),
+        ]
+        assert _select(10**7, delivers, 200_000) == (
+            [("0xa", 2), ("0xa", 1), ("0xb", 1)],
+            650_000,
+        )
+
+    def test_selection_is_deterministic(self) -> None:
+        """Test that the selection does not depend on the order of the delivers."""
+        delivers = [
+            _deliver(mech, request_id, 1)
+            for mech in ("0xb", "0xa")
+            for request_id in (2, 1)
+        ]
+        expected = ([("0xa", 1), ("0xa", 2), ("0xb", 1)], 550_000)
+        assert _select(550_000, delivers, 100_000) == expected
+        assert _select(550_000, list(reversed(delivers)), 100_000) == expected
+
+    def test_fixed_gas_takes_budget(self) -> None:
+        """Test that the rest of the txs of the multisend take part of the budget."""
+        delivers = [_deliver("0xa", 1, 5), _deliver("0xa", 2, 1)]
+        assert _select(300_000, delivers) == ([("0xa", 1), ("0xa", 2)], 300_000)
+        assert _select(300_000, delivers, 1) == ([("0xa", 1)], 150_001)
+
+    def test_estimated_gas_is_used(self) -> None:
+        """Test that the delivers which take more gas take more of the budget."""
+        delivers = [
+            _deliver("0xa", 1, 5, gas=400_000),
+            _deliver("0xa", 2, 3, gas=500_000),
+            _deliver("0xa", 3, 1, gas=100_000),
+        ]
+        assert _select(600_000, delivers) == ([("0xa", 1), ("0xa", 3)], 500_000)
+
+    def test_at_least_one_deliver(self) -> None:
+        """Test that a deliver is selected even if it does not fit in the budget."""
+        delivers = [_deliver("0xa", 1, 1), _deliver("0xa", 2, 2)]
+        assert _select(1, delivers, 100) == ([("0xa", 2)], 150_100)
+
+
+class TestEstimateGas:
+    """Test the estimation of the gas of the txs of a multisend."""
+
+    @staticmethod
+    def _estimate(estimates: List[Optional[int]], ok: bool = True) -> Any:
+        """Estimate the gas, given the estimates of the contract."""
+        performative = SimpleNamespace(
+            GET_STATE="get_state", STATE="state", ERROR="error"
+        )
+        message = SimpleNamespace(
+            performative=performative.STATE if ok else performative.ERROR,
+            state=SimpleNamespace(body={"data": estimates}),
+        )
+
+        def get_contract_api_response(
+            **_: Any,
+        ) -> Generator[None, None, SimpleNamespace]:
+            """Get the response of the contract API."""
+            yield
+            return message
+
+        behaviour = SimpleNamespace(
+            get_contract_api_response=get_contract_api_response,
+            synchronized_data=SimpleNamespace(safe_contract_address="0xsafe"),
+            context=mock.MagicMock(),
+        )
+        with mock.patch.object(
+            behaviours.ContractApiMessage, "Performative", performative
+        ):
+            return _run(
+                TransactionPreparationBehaviour._estimate_gas(  # type: ignore
+                    behaviour, [{}] * len(estimates)
+                )
+            )
+
+    def test_estimates_are_quantized(self) -> None:
+        """Test that the estimates are rounded up, so that the agents agree on them."""
+        assert self._estimate([1, GAS_ESTIMATE_STEP, GAS_ESTIMATE_STEP + 1]) == [
+            GAS_ESTIMATE_STEP,
+            GAS_ESTIMATE_STEP,
+            2 * GAS_ESTIMATE_STEP,
+        ]
+
+    def test_failed_estimate(self) -> None:
+        """Test that the txs whose gas cannot be estimated take the default gas."""
+        assert self._estimate([None, 21_000]) == [DEFAULT_TX_GAS, 30_000]
+
+    def test_failed_call(self) -> None:
+        """Test that no gas is returned when the contract cannot be called."""
+        assert self._estimate([21_000], ok=False) is None
+
+
+class _UsageBehaviour:  # pylint: disable=too-few-public-methods
+    """A tracking behaviour, whose IPFS is kept in memory."""
+
+    _is_usage_manifest = staticmethod(TrackingBehaviour._is_usage_manifest)
+    _add_usage = staticmethod(TrackingBehaviour._add_usage)
+    _load_usage_view = TrackingBehaviour._load_usage_view
+    _save_usage_to_ipfs = TrackingBehaviour._save_usage_to_ipfs
+    _get_updated_manifest = TrackingBehaviour._get_updated_manifest
+
+    def __init__(self, compaction_interval: int) -> None:
+        """Initialize the behaviour."""
+        self.params = SimpleNamespace(usage_compaction_interval=compaction_interval)
+        self.context = mock.MagicMock()
+        self.files: Dict[str, Any] = {}
+
+    def send_to_ipfs(
+        self, filename: str, obj: Any, filetype: Any = None
+    ) -> Generator[None, None, Optional[str]]:
+        """Store a file."""
+        content = json.dumps(obj, sort_keys=True)
+        ipfs_hash = hashlib.sha256(content.encode()).hexdigest()
+        self.files[ipfs_hash] = json.loads(content)
+        yield
+        return ipfs_hash
+
+    def get_from_ipfs(
+        self, ipfs_hash: str, filetype: Any = None
+    ) -> Generator[None, None, Optional[Any]]:
+        """Get a file."""
+        yield
+        return self.files.get(ipfs_hash, None)
+
+
+class TestUsageCompaction:
+    """Test the deltas of the usage, and their compaction."""
+
+    @pytest.mark.parametrize("compaction_interval", [1, 3, 100])
+    def test_round_trip(self, compaction_interval: int) -> None:
+        """Test that the usage of a manifest is the sum of its deltas, whenever it is compacted."""
+        behaviour = _UsageBehaviour(compaction_interval)
+        manifest: Dict[str, Any] = {"base": None, "deltas": []}
+        usage: Dict[str, Any] = {}
+        for period in range(7):
+            delta = {f"agent{period % 2}": {"tool": 1, f"tool{period}": period}}
+            behaviour._add_usage(usage, delta)
+            manifest = _run(behaviour._get_updated_manifest(manifest, delta, usage))
+            assert len(manifest["deltas"]) < compaction_interval
+            checkpoint = _run(behaviour.send_to_ipfs("usage_manifest", manifest))
+
+            with mock.patch.object(
+                behaviours, "CID", SimpleNamespace(from_string=lambda value: value)
+            ):
+                usage_view = _run(behaviour._load_usage_view(checkpoint))
+            assert usage_view == {"manifest": manifest, "usage": usage}
+
+    def test_empty_delta(self) -> None:
+        """Test that the manifest is unchanged when nothing has been delivered."""
+        behaviour = _UsageBehaviour(1)
+        manifest = {"base": "base", "deltas": ["delta"]}
+        assert _run(behaviour._get_updated_manifest(manifest, {}, {})) is manifest
+        assert behaviour.files == {}
+
+    def test_whole_usage_becomes_the_base(self) -> None:
+        """Test that a usage checkpointed before the deltas becomes the base of the manifest."""
+        behaviour = _UsageBehaviour(3)
+        usage = {"agent": {"tool": 2}}
+        checkpoint = _run(behaviour.send_to_ipfs("usage", usage))
+        with mock.patch.object(
+            behaviours, "CID", SimpleNamespace(from_string=lambda value: value)
+        ):
+            usage_view = _run(behaviour._load_usage_view(checkpoint))
+        assert usage_view == {
+            "manifest": {"base": checkpoint, "deltas": []},
+            "usage": usage,
+        }
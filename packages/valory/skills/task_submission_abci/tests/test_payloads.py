@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for the payloads of the task submission skill."""
+
+import json
+from typing import Any, Dict
+
+from packages.valory.skills.task_submission_abci.payloads import (
+    TASK_FIELDS,
+    TRANSACTION_REF,
+    decode_done_tasks,
+    encode_done_tasks,
+    get_task_key,
+)
+
+
+TRANSACTIONS_HASH = "bafybeitransactions"
+
+
+def _task(request_id: int, **kwargs: Any) -> Dict[str, Any]:
+    """Get a done task."""
+    return {
+        "request_id": request_id,
+        "mech_address": "0xmech",
+        "task_executor_address": "0xagent",
+        "tool": "tool",
+        "is_marketplace_mech": False,
+        "task_result": "ab" * 32,
+        "cost": 1,
+        **kwargs,
+    }
+
+
+class TestDoneTasksEncoding:
+    """Test the encoding of the done tasks in the payloads."""
+
+    def test_round_trip(self) -> None:
+        """Test that the fields of the tasks which go through consensus are decoded back."""
+        tasks = [
+            _task(1, request_id_nonce="0x01", transaction={"to": "0x1", "data": "0x"}),
+            _task(2, is_marketplace_mech=True, cost=0),
+        ]
+        decoded = decode_done_tasks(encode_done_tasks(tasks, TRANSACTIONS_HASH))
+        assert decoded == [
+            {**_task(1, request_id_nonce="0x01"), TRANSACTION_REF: TRANSACTIONS_HASH},
+            _task(2, is_marketplace_mech=True, cost=0),
+        ]
+
+    def test_only_task_fields_are_encoded(self) -> None:
+        """Test that the transactions are referenced, instead of being encoded."""
+        task = _task(1, transaction={"data": "0x" + "00" * 1000}, local_field=True)
+        content = encode_done_tasks([task], TRANSACTIONS_HASH)
+        assert len(content) < len(json.dumps(task))
+        decoded = decode_done_tasks(content)[0]
+        assert set(decoded) <= set(TASK_FIELDS) | {TRANSACTION_REF}
+
+    def test_empty(self) -> None:
+        """Test that no done tasks are decoded back."""
+        assert decode_done_tasks(encode_done_tasks([], None)) == []
+
+    def test_encoding_is_deterministic(self) -> None:
+        """Test that the same tasks are encoded the same way, whatever the order of their fields."""
+        task = _task(1)
+        reordered = dict(reversed(list(task.items())))
+        assert encode_done_tasks([task], None) == encode_done_tasks([reordered], None)
+
+    def test_task_key(self) -> None:
+        """Test that the tasks are keyed by their mech and their request id."""
+        assert get_task_key(_task(1)) == "0xmech/1"
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+
+"""
+Benchmark the matching of the requests with their delivers, up to 10^6 events.
+
+Run from the root of the repository with `python -m scripts.benchmark_undelivered_reqs`.
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from packages.valory.contracts.agent_mech.contract import (
+    get_undelivered as get_undelivered_mech,
+)
+from packages.valory.contracts.mech_marketplace.contract import (
+    get_undelivered as get_undelivered_marketplace,
+)
+
+
+Events = List[Dict[str, Any]]
+
+CONTRACT_ADDRESSES = [f"0x{i:040x}" for i in range(1, 5)]
+# the share of the requests which are delivered
+DELIVERED_SHARE = 0.9
+
+
+def make_events(num_events: int, seed: int = 0) -> Tuple[Events, Events]:
+    """Make requests and delivers, for a total of about `num_events` events."""
+    rng = random.Random(seed)
+    num_requests = int(num_events / (1 + DELIVERED_SHARE))
+    requests = [
+        {
+            "requestId": rng.getrandbits(256),
+            "contract_address": rng.choice(CONTRACT_ADDRESSES),
+            "block_number": block_number,
+        }
+        for block_number in range(num_requests)
+    ]
+    delivers = [
+        {
+            "requestId": request["requestId"],
+            "contract_address": request["contract_address"],
+        }
+        for request in requests
+        if rng.random() < DELIVERED_SHARE
+    ]
+    rng.shuffle(delivers)
+    return requests, delivers
+
+
+def get_undelivered_quadratic(requests: Events, delivers: Events) -> Events:
+    """The former matching, which rebuilds the list of the delivered ids for every request."""
+    return [
+        request
+        for request in requests
+        if request["requestId"] not in [deliver["requestId"] for deliver in delivers]
+    ]
+
+
+def measure(fn: Callable[[Events, Events], Events], num_events: int) -> float:
+    """Measure the time it takes to match the requests with their delivers."""
+    requests, delivers = make_events(num_events)
+    start = time.perf_counter()
+    fn(requests, delivers)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-events", type=int, default=10**6)
+    parser.add_argument(
+        "--max-quadratic-events",
+        type=int,
+        default=10**4,
+        help="the maximum number of events for the former, quadratic, matching",
+    )
+    args = parser.parse_args()
+
+    implementations = {
+        "agent_mech": get_undelivered_mech,
+        "mech_marketplace": get_undelivered_marketplace,
+        "quadratic": get_undelivered_quadratic,
+    }
+    print(f"{'events':>10} " + " ".join(f"{name:>18}" for name in implementations))
+    num_events = 10**3
+    while num_events <= args.max_events:
+        timings = []
+        for name, fn in implementations.items():
+            if name == "quadratic" and num_events > args.max_quadratic_events:
+                timings.append(f"{'-':>18}")
+                continue
+            elapsed = measure(fn, num_events)
+            timings.append(
+                f"{elapsed * 1e3:>10.1f}ms {elapsed / num_events * 1e9:>4.0f}ns"
+            )
+        print(f"{num_events:>10} " + " ".join(timings))
+        num_events *= 10
+
+
+if __name__ == "__main__":
+    main()